@@ -13,13 +13,12 @@
 import argparse
 import socket
 
-from oslo_serialization import jsonutils
-
 from dragonflow.cli import utils as cli_utils
 from dragonflow.common import exceptions as df_exceptions
 from dragonflow.common import utils as df_utils
 from dragonflow import conf as cfg
 from dragonflow.db import model_framework
+from dragonflow.db import model_serializer
 from dragonflow.db import models
 from dragonflow.db.models import all  # noqa
 
@@ -72,7 +71,8 @@ def print_whole_table(db_driver, table):
         return
 
     raw_values = [db_driver.get_key(table, key) for key in keys]
-    values = [jsonutils.loads(value) for value in raw_values if value]
+    values = [model_serializer.load_value(value)
+              for value in raw_values if value]
     if isinstance(values[0], dict):
         columns = values[0].keys()
         labels, formatters = \
@@ -97,7 +97,7 @@ def print_key(db_driver, table, key):
         print('Key not found: ' + table)
         return
 
-    value = jsonutils.loads(value)
+    value = model_serializer.load_value(value)
     # It will be too difficult to print all type of data in table
     # therefore using print dict for dictionary type otherwise
     # using old approach for print.
@@ -109,11 +109,12 @@ def print_key(db_driver, table, key):
 
 def bind_port_to_localhost(db_driver, port_id):
     lport_str = db_driver.get_key(models.LogicalPort.table_name, port_id)
-    lport = jsonutils.loads(lport_str)
+    lport = model_serializer.load_struct(lport_str)
     chassis_name = socket.gethostname()
     lport['chassis'] = chassis_name
-    lport_json = jsonutils.dumps(lport)
-    db_driver.set_key(models.LogicalPort.table_name, port_id, lport_json)
+    lport_value = model_serializer.dump_struct(lport,
+                                               cfg.CONF.df.nb_db_serializer)
+    db_driver.set_key(models.LogicalPort.table_name, port_id, lport_value)
 
 
 def clean_whole_table(db_driver, table):
@@ -64,6 +64,14 @@ class UnsupportedTransportException(DragonflowException):
     message = _("Transport protocol is not supported: %(transport)s")
 
 
+class UnsupportedPublisherSharding(DragonflowException):
+    message = _("Publisher sharding is enabled, but the pub/sub driver "
+                "%(driver)s cannot relay events to sharded publishers. Set "
+                "pub_sub_multiproc_driver to a driver supporting relays, "
+                "e.g. zmq_pubsub_multiproc_driver, or disable "
+                "enable_publisher_sharding.")
+
+
 class DBLockFailed(DragonflowException):
     message = _("The DB Lock cannot be acquired for object=%(oid)s in"
                 "the session=%(sid)s.")
@@ -0,0 +1,205 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lightweight in-process metrics of the controller pipeline.
+
+Histograms are keyed by a name and an optional label. Labels may be any
+hashable object, e.g. a callback or a table id, and are only formatted when
+a snapshot is taken, so that recording a value is cheap. When metrics are
+disabled (the default), recording is a no-op.
+"""
+
+import contextlib
+import math
+import os
+import socket
+import time
+
+import eventlet
+from oslo_log import log
+from oslo_serialization import jsonutils
+from oslo_service import loopingcall
+from oslo_utils import reflection
+
+from dragonflow import conf as cfg
+
+LOG = log.getLogger(__name__)
+
+QUEUE_WAIT = 'nb_api.queue_wait'
+DECODE = 'nb_api.decode'
+CONTROLLER_UPDATE = 'controller.update'
+MODEL_EVENT_CALLBACK = 'model.event_callback'
+APP_DISPATCH = 'app.dispatch'
+FLOW_MODS_PER_EVENT = 'openflow.flow_mods_per_event'
+PACKET_IN = 'openflow.packet_in'
+PACKET_IN_DROPPED = 'openflow.packet_in_dropped'
+
+_QUANTILES = (0.5, 0.9, 0.99)
+
+_enabled = False
+_histograms = {}
+
+
+class Histogram(object):
+    '''A histogram with power of 2 buckets.
+
+    Quantiles are estimated by the upper bound of their bucket, i.e. within
+    a factor of 2 of the actual value.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self._zeros = 0
+        # Bucket exponent -> count, for values in (2 ** (e - 1), 2 ** e]
+        self._buckets = {}
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self._zeros += 1
+            return
+        mantissa, exponent = math.frexp(value)
+        if mantissa == 0.5:
+            exponent -= 1
+        self._buckets[exponent] = self._buckets.get(exponent, 0) + 1
+
+    def get_quantile(self, quantile):
+        rank = quantile * self.count
+        seen = self._zeros
+        if seen >= rank:
+            return 0
+        for exponent in sorted(self._buckets):
+            seen += self._buckets[exponent]
+            if seen >= rank:
+                return min(2.0 ** exponent, self.max)
+        return self.max
+
+    def to_dict(self):
+        result = {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'avg': self.sum / float(self.count) if self.count else 0,
+        }
+        for quantile in _QUANTILES:
+            result['p%d' % (quantile * 100)] = self.get_quantile(quantile)
+        return result
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _histograms.clear()
+
+
+def observe(name, value, label=None):
+    '''Record a value in the histogram of name and label'''
+    if not _enabled:
+        return
+    key = (name, label)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(value)
+
+
+@contextlib.contextmanager
+def _timer(name, label):
+    start = time.time()
+    try:
+        yield
+    finally:
+        observe(name, time.time() - start, label)
+
+
+@contextlib.contextmanager
+def _null_timer():
+    yield
+
+
+def timer(name, label=None):
+    '''Return a context manager recording its duration, in seconds'''
+    if not _enabled:
+        return _null_timer()
+    return _timer(name, label)
+
+
+def _format_label(label):
+    if callable(label):
+        return reflection.get_callable_name(label)
+    return str(label)
+
+
+def get_snapshot():
+    '''Return the histograms, as a dict of name -> {label -> histogram dict}
+    '''
+    snapshot = {}
+    for (name, label), histogram in list(_histograms.items()):
+        labels = snapshot.setdefault(name, {})
+        labels[_format_label(label)] = histogram.to_dict()
+    return snapshot
+
+
+def _log_snapshot():
+    snapshot = get_snapshot()
+    if snapshot:
+        LOG.info('Pipeline metrics: %s', jsonutils.dumps(snapshot,
+                                                         sort_keys=True))
+
+
+def _serve(server):
+    while True:
+        conn, _ = server.accept()
+        try:
+            conn.sendall(jsonutils.dump_as_bytes(get_snapshot(),
+                                                 sort_keys=True))
+        except Exception:
+            LOG.exception('Failed to send metrics')
+        finally:
+            conn.close()
+
+
+def _listen(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    server = eventlet.listen(path, family=socket.AF_UNIX)
+    eventlet.spawn_n(_serve, server)
+    LOG.info('Serving pipeline metrics on %s', path)
+
+
+def setup():
+    '''Enable metrics if configured, and start the configured endpoints:
+    the periodic log dump, and a Unix socket returning a JSON snapshot to
+    each connection.
+    '''
+    if not cfg.CONF.df.enable_metrics:
+        return
+    enable()
+    if cfg.CONF.df.metrics_log_interval:
+        dump = loopingcall.FixedIntervalLoopingCall(_log_snapshot)
+        dump.start(interval=cfg.CONF.df.metrics_log_interval,
+                   initial_delay=cfg.CONF.df.metrics_log_interval)
+    if cfg.CONF.df.metrics_socket_path:
+        _listen(cfg.CONF.df.metrics_socket_path)
@@ -0,0 +1,110 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracing of NB updates from the Neutron server to the controllers.
+
+A trace ID is started when the Neutron server writes an object, carried in
+the DbUpdate events published for it, and made current again while a
+controller applies the event. Each stage the update goes through is written
+as a JSON line to the local trace sink (df.trace_sink_path), e.g.:
+
+    {"trace_id": "...", "stage": "nb_write", "time": 1508312345.12,
+     "host": "compute1", "table": "lport", "key": "..."}
+
+Merging the sinks of all hosts gives the latency of each stage. Hosts are
+expected to have synchronized clocks.
+"""
+
+import contextlib
+import socket
+import threading
+import time
+
+from oslo_log import log
+from oslo_serialization import jsonutils
+from oslo_utils import uuidutils
+
+from dragonflow import conf as cfg
+
+LOG = log.getLogger(__name__)
+
+PORT_POSTCOMMIT = 'port_postcommit'
+NB_WRITE = 'nb_write'
+RECEIVED = 'received'
+APPLIED = 'applied'
+LOCAL_CREATED = 'local_created'
+
+_context = threading.local()
+_sink = None
+_sink_path = None
+
+
+def is_enabled():
+    return bool(cfg.CONF.df.trace_sink_path)
+
+
+def new_trace_id():
+    '''Return a new trace ID, or None if tracing is disabled'''
+    if not is_enabled():
+        return None
+    return uuidutils.generate_uuid()
+
+
+def get_trace_id():
+    '''Return the trace ID of the current context, if any'''
+    return getattr(_context, 'trace_id', None)
+
+
+@contextlib.contextmanager
+def trace(trace_id):
+    '''Make trace_id current in this context. trace_id may be None.'''
+    previous = get_trace_id()
+    _context.trace_id = trace_id
+    try:
+        yield trace_id
+    finally:
+        _context.trace_id = previous
+
+
+def _get_sink():
+    global _sink, _sink_path
+    path = cfg.CONF.df.trace_sink_path
+    if path != _sink_path:
+        if _sink is not None:
+            _sink.close()
+        _sink = open(path, 'a')
+        _sink_path = path
+    return _sink
+
+
+def record(stage, trace_id=None, table=None, key=None):
+    '''Write a stage of a trace to the sink. trace_id defaults to the
+    current one. Nothing is written if there is no trace.
+    '''
+    trace_id = trace_id or get_trace_id()
+    if trace_id is None or not is_enabled():
+        return
+    entry = {
+        'trace_id': trace_id,
+        'stage': stage,
+        'time': time.time(),
+        'table': table,
+        'key': key,
+        'host': socket.gethostname(),
+    }
+    try:
+        sink = _get_sink()
+        sink.write(jsonutils.dumps(entry, sort_keys=True) + '\n')
+        sink.flush()
+    except Exception:
+        LOG.exception('Failed to record trace %s', entry)
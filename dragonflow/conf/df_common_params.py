@@ -126,9 +126,72 @@ df_opts = [
             'this many times per $publisher_rate_limit_timeout seconds.'
         )
     ),
+    cfg.IntOpt(
+        'publisher_batch_size',
+        default=1,
+        min=1,
+        help=_(
+            'Maximal number of events to the same topic that a publisher '
+            'sends in a single batch message. The publisher service waits '
+            'up to $publisher_batch_timeout seconds to fill a batch. 1 '
+            'disables batching. All subscribers must support batches before '
+            'it is enabled.'
+        )
+    ),
+    cfg.FloatOpt(
+        'publisher_batch_timeout',
+        default=0.005,
+        min=0,
+        help=_(
+            'Maximal time, in seconds, the publisher service waits for '
+            'further events to add to a batch.'
+        )
+    ),
+    cfg.StrOpt(
+        'publisher_batch_compression',
+        default='none',
+        choices=['none', 'zlib'],
+        help=_('Compression of batches of events sent by publishers')
+    ),
+    cfg.BoolOpt(
+        'enable_publisher_sharding',
+        default=False,
+        help=_(
+            'Shard topics between the publishers by consistent hashing over '
+            'the publisher table. Neutron servers push each event to the '
+            'publisher owning its topic, and controllers connect only to '
+            'the owners of the topics they subscribe to. Requires selective '
+            'topology distribution to be effective, and must be enabled on '
+            'all nodes. Events are relayed over pub_sub_multiproc_driver, '
+            'which must support relays, e.g. zmq_pubsub_multiproc_driver.'
+        )
+    ),
+    cfg.PortOpt(
+        'publisher_relay_port',
+        default=8867,
+        help=_('Port on which a sharded publisher service receives the '
+               'events of the topics it owns')
+    ),
+    cfg.BoolOpt(
+        'enable_flow_reconciliation',
+        default=False,
+        help=_('When connecting to the switch, compute the desired flows '
+               'and install only the difference from the flows already '
+               'installed, instead of re-installing all flows and aging '
+               'the old ones by cookie. If the synchronization fails, '
+               'the desired flows are installed without deleting the old '
+               'ones.')
+    ),
     cfg.FloatOpt('monitor_table_poll_time',
                  default=30,
                  help=_('Poll monitored tables every this number of seconds')),
+    cfg.FloatOpt('monitor_table_resync_time',
+                 default=300,
+                 help=_('When the NB DB driver can watch the monitored '
+                        'tables, their changes are published as they are '
+                        'notified, and the tables are polled only every '
+                        'this number of seconds, to recover lost '
+                        'notifications')),
     cfg.BoolOpt('enable_selective_topology_distribution',
                 default=False,
                 help=_('When enabled, each controller will get only the part '
@@ -175,7 +238,106 @@ df_opts = [
                help=_('The max delay in seconds for Neutron to report heart'
                       'beat to df-db')),
     cfg.StrOpt('external_host_ip',
-               help=_("Compute node external IP"))
+               help=_("Compute node external IP")),
+    cfg.BoolOpt('enable_db_update_coalescing',
+                default=False,
+                help=_('When enabled, the controller drains pending DB '
+                       'updates in batches, keeps only the newest update per '
+                       'object, and applies the batch in model dependency '
+                       'order.')),
+    cfg.IntOpt('db_update_coalescing_batch_size',
+               default=1000,
+               min=1,
+               help=_('Maximal number of DB updates to drain from the event '
+                      'queue into a single coalesced batch')),
+    cfg.BoolOpt('enable_event_queue_lanes',
+                default=False,
+                help=_('Schedule the controller event queue by lanes. '
+                       'Control events (sync, DB restart) are handled '
+                       'first. Events of the local OVSDB and of the logical '
+                       'ports bound on this chassis are handled ahead of '
+                       'the other events, and events of different topics '
+                       'are handled round-robin, so that bulk updates of one '
+                       'tenant do not delay the others. An event never '
+                       'overtakes an earlier event of the same object, or of '
+                       'an object it depends on or that depends on it.')),
+    cfg.IntOpt('event_queue_local_lane_weight',
+               default=4,
+               min=1,
+               help=_('Number of local lane events handled for each remote '
+                      'lane event, when both are queued')),
+    cfg.IntOpt('event_queue_topic_quantum',
+               default=4,
+               min=1,
+               help=_('Number of events of a topic handled in a row, before '
+                      'moving on to the next topic in the same lane')),
+    cfg.BoolOpt('enable_db_changelog',
+                default=False,
+                help=_('When enabled, every NB DB write is stamped with a '
+                       'per-table generation and recorded in a bounded change '
+                       'log, so controllers re-sync by fetching only the '
+                       'changes since their last-seen generation.')),
+    cfg.IntOpt('db_changelog_size',
+               default=10000,
+               min=1,
+               help=_('Number of changes kept in the change log of each '
+                      'table. Controllers that fall further behind perform '
+                      'a full table pull.')),
+    cfg.BoolOpt('enable_compact_db_store',
+                default=False,
+                help=_('Keep NB objects cached by the controller in a compact '
+                       'form, and build full model instances only when they '
+                       'are retrieved. Reduces the controller memory '
+                       'footprint at the cost of CPU on retrieval.')),
+    cfg.StrOpt('nb_db_serializer',
+               default='json',
+               choices=['json', 'msgpack'],
+               help=_('Format in which NB objects are written to the NB '
+                      'database. With msgpack, objects are stored in binary '
+                      'form and embedded as is in pub/sub events. Objects '
+                      'are read in any format, so existing JSON entries '
+                      'remain readable. Requires a DB driver that supports '
+                      'binary values.')),
+    cfg.StrOpt('conntrack_flush_driver',
+               default='cli',
+               choices=['cli', 'netlink'],
+               help=_('How conntrack entries are deleted when security '
+                      'groups change. The deletions of an event are '
+                      'collected and deduplicated in any case. With cli, '
+                      'the conntrack tool is run once per remaining filter. '
+                      'With netlink, the entries of each zone are dumped and '
+                      'the matching ones deleted in one pass through '
+                      'netlink, in the neutron.privileged.default privsep '
+                      'context of neutron. The controller must be allowed '
+                      'to start privsep-helper, see the [privsep] '
+                      'helper_command option. Filters netlink cannot match '
+                      '(without a protocol, or of a protocol other than tcp, '
+                      'udp, icmp and icmpv6), or fails to delete, are run '
+                      'with the conntrack tool.')),
+    cfg.BoolOpt('enable_metrics',
+                default=False,
+                help=_('Record latency histograms and counters of the '
+                       'controller pipeline: event queue wait, decoding, '
+                       'update handling, application callbacks, flow mods '
+                       'per event, and packet-in handling per table.')),
+    cfg.IntOpt('metrics_log_interval',
+               default=300,
+               min=0,
+               help=_('Interval, in seconds, at which the metrics are '
+                      'logged. 0 disables logging.')),
+    cfg.StrOpt('metrics_socket_path',
+               default='',
+               help=_('Path of a Unix socket on which the controller serves '
+                      'a JSON snapshot of the metrics to each connection. '
+                      'Empty disables the socket.')),
+    cfg.StrOpt('trace_sink_path',
+               default='',
+               help=_('File to which the stages of traced NB updates are '
+                      'appended, as JSON lines. When set on the Neutron '
+                      'server, port writes are given a trace ID, which is '
+                      'carried in their events. When set on controllers, '
+                      'the reception and application of traced events are '
+                      'recorded. Empty disables tracing.')),
 ]
 
 
@@ -24,6 +24,30 @@ df_l3_app_opts = [
     cfg.IntOpt('router_port_unreach_max_rate', default=3,
                help=_('Max rate to reply ICMP unreachable message per '
                       'second for router port.')),
+    cfg.StrOpt('proactive_derived_mac_prefix', default='',
+               help=_('The first two bytes (e.g. fa:16) of the MAC '
+                      'addresses derived from IPv4 addresses, as '
+                      '<prefix>:<the 4 bytes of the IP address>. When set, '
+                      'the proactive L3 application routes to each IPv4 '
+                      'subnet with a single flow, which derives the '
+                      'destination MAC from the destination IP and goes to '
+                      'the L2 lookup. Per host flows are only installed for '
+                      'ports whose MAC is not derived from their IP.')),
+    cfg.IntOpt('reactive_negative_cache_timeout', default=5, min=0,
+               help=_('Seconds during which the reactive L3 application '
+                      'drops the packets routed to an IP address that is '
+                      'not of a known port, instead of sending each of them '
+                      'to the controller. 0 disables negative caching.')),
+    cfg.IntOpt('reactive_prewarm_routes', default=0, min=0,
+               help=_('Number of the most frequent destinations of routed '
+                      'packets, counted from the packets sent to the '
+                      'controller and the packets matched by route flows, '
+                      'for which the reactive L3 application installs '
+                      'routes again every reactive_prewarm_interval '
+                      'seconds. 0 disables pre-warming.')),
+    cfg.IntOpt('reactive_prewarm_interval', default=60, min=1,
+               help=_('Interval, in seconds, at which routes are pre-warmed '
+                      'for the most frequent destinations.')),
 ]
 
 
@@ -34,7 +34,21 @@ df_metadata_opts = [
         'metadata_interface',
         default='tap-metadata',
         help=_('The name of the interface to bind the metadata'
-               'service proxy'))
+               'service proxy')),
+    cfg.IntOpt(
+        'lport_cache_ttl',
+        default=30,
+        min=0,
+        help=_('Number of seconds a logical port looked up by the metadata '
+               'service proxy is used before it is read again from the '
+               'database')),
+    cfg.IntOpt(
+        'nova_client_pool_size',
+        default=16,
+        min=0,
+        help=_('Maximal number of idle HTTP clients (and keep-alive '
+               'connections) kept by the metadata service proxy towards '
+               'the Nova metadata server')),
 ]
 
 
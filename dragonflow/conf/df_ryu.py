@@ -22,7 +22,36 @@ df_ryu_opts = [
     cfg.IPOpt('of_listen_address', default='127.0.0.1',
               help=_("Address to listen on for OpenFlow connections.")),
     cfg.PortOpt('of_listen_port', default=ofproto_common.OFP_TCP_PORT,
-                help=_("Port to listen on for OpenFlow connections."))
+                help=_("Port to listen on for OpenFlow connections.")),
+    cfg.IntOpt('of_batch_size', default=1000, min=0,
+               help=_("Maximal number of OpenFlow messages buffered while "
+                      "processing an event, before they are written to the "
+                      "switch together, followed by a barrier. 0 disables "
+                      "buffering.")),
+    cfg.IntOpt('packet_in_meter_rate', default=0, min=0,
+               help=_("Rate, in packets per second, of the OpenFlow meter "
+                      "limiting the packets sent to the controller by each "
+                      "table handled by the controller (e.g. DHCP, L3, "
+                      "DNAT). Packets over the rate are dropped by the "
+                      "switch. 0 disables the meters, unless set for a "
+                      "table in packet_in_meter_rates. Meters are installed "
+                      "only if the meter features of the switch support "
+                      "them.")),
+    cfg.DictOpt('packet_in_meter_rates', default={},
+                help=_("Meter rates, in packets per second, of specific "
+                       "tables, as table_id:rate pairs, overriding "
+                       "packet_in_meter_rate. A rate of 0 disables the "
+                       "meter of the table.")),
+    cfg.IntOpt('packet_in_queue_size', default=0, min=0,
+               help=_("Maximal number of packet-in events queued for the "
+                      "applications. When the queue is full, events of the "
+                      "lowest priority are dropped. 0 disables the queue, "
+                      "packet-ins are then handled as they are received.")),
+    cfg.DictOpt('packet_in_priorities', default={},
+                help=_("Priorities of the packet-in events of tables, as "
+                       "table_id:priority pairs. Events of higher priority "
+                       "are handled first, and dropped last. The default "
+                       "priority is 0.")),
 ]
 
 
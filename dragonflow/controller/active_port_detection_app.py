@@ -19,11 +19,11 @@ from neutron_lib import constants as n_const
 from oslo_log import log
 from oslo_service import loopingcall
 from ryu.lib.packet import arp
-from ryu.lib.packet import packet
 from ryu.ofproto import ether
 
 from dragonflow import conf as cfg
 from dragonflow.controller.common import constants as controller_const
+from dragonflow.controller.common import packet_headers
 from dragonflow.controller import df_base_app
 from dragonflow.db.models import l2
 
@@ -54,20 +54,20 @@ class ActivePortDetectionApp(df_base_app.DFlowApp):
 
     def packet_in_handler(self, event):
         msg = event.msg
-        pkt = packet.Packet(msg.data)
-        arp_pkt = pkt.get_protocol(arp.arp)
-        if arp_pkt is None:
+        headers = packet_headers.PacketHeaders(msg.data)
+        if not headers.is_arp:
             LOG.error("No support for non ARP protocol")
             return
 
-        if (arp_pkt.opcode == arp.ARP_REQUEST and
-            arp_pkt.src_ip == arp_pkt.dst_ip) or \
-                arp_pkt.opcode == arp.ARP_REPLY:
+        opcode = headers.arp_opcode
+        if (opcode == arp.ARP_REQUEST and
+            headers.arp_src_ip == headers.arp_dst_ip) or \
+                opcode == arp.ARP_REPLY:
             match = msg.match
             in_port = match.get('in_port', None)
             if in_port:
                 self._update_active_port_in_db(
-                    arp_pkt.src_ip, arp_pkt.src_mac, in_port)
+                    headers.arp_src_ip, headers.arp_src_mac, in_port)
 
     def _get_ips_in_allowed_address_pairs(self, lport):
         ips = set()
@@ -15,6 +15,7 @@
 
 from oslo_log import log
 
+from dragonflow import conf as cfg
 from dragonflow.controller.common import constants as const
 from dragonflow.controller.common import cookies
 from dragonflow.controller.common import utils as cookie
@@ -50,6 +51,12 @@ class Aging(df_base_app.DFlowApp, ofswitch.OpenFlowSwitchMixin):
     be called
     """
     def ovs_sync_started(self):
+        if cfg.CONF.df.enable_flow_reconciliation:
+            # Stale flows are removed by flow reconciliation instead, which
+            # requires the cookies to stay the same
+            self.do_aging = False
+            LOG.info("flow reconciliation is enabled, don't do aging")
+            return
         LOG.info("start aging")
         canary_flow = self.get_canary_flow()
         if not canary_flow:
@@ -0,0 +1,199 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import contextlib
+
+import netaddr
+from neutron_lib import constants as n_const
+from oslo_log import log
+
+from dragonflow import conf as cfg
+from dragonflow.controller.common import utils
+
+LOG = log.getLogger(__name__)
+
+DRIVER_CLI = 'cli'
+DRIVER_NETLINK = 'netlink'
+
+_FILTER_FIELDS = ('ethertype', 'protocol', 'nw_src', 'nw_dst', 'zone')
+
+ConntrackFilter = collections.namedtuple('ConntrackFilter', _FILTER_FIELDS)
+
+
+def _protocol_number(protocol):
+    return n_const.IP_PROTOCOL_MAP.get(protocol) or int(protocol)
+
+
+def _make_filter(ethertype='IPv4', protocol=None, nw_src=None, nw_dst=None,
+                 zone=None):
+    return ConntrackFilter(
+        ethertype=ethertype,
+        protocol=str(protocol) if protocol else None,
+        nw_src=str(nw_src) if nw_src else None,
+        nw_dst=str(nw_dst) if nw_dst else None,
+        zone=zone or None,
+    )
+
+
+def _subsumes(filter_, other):
+    '''Return True if all the entries matched by other are matched by filter_
+    '''
+    return all(value is None or value == other_value
+               for value, other_value in zip(filter_, other))
+
+
+def _remove_subsumed(filters):
+    filters = list(collections.OrderedDict.fromkeys(filters))
+    return [filter_ for filter_ in filters
+            if not any(other != filter_ and _subsumes(other, filter_)
+                       for other in filters)]
+
+
+def _import_netlink_lib():
+    # netlink_lib runs in neutron's privsep daemon, so it is imported only
+    # when the netlink driver is selected
+    from neutron.privileged.agent.linux import netlink_lib
+    return netlink_lib
+
+
+def _is_netlink_filter(netlink_lib, filter_):
+    # Entries are dumped per zone, and only the protocols parsed by
+    # netlink_lib can be matched. Entries of other protocols are not listed,
+    # so filters without a protocol are left to the CLI.
+    if filter_.zone is None or filter_.protocol is None:
+        return False
+    protocol = _protocol_number(filter_.protocol)
+    return any(protocol == _protocol_number(name)
+               for name in netlink_lib.ATTR_POSITIONS)
+
+
+def _entry_fields(netlink_lib, entry):
+    '''Return the fields of an entry returned by netlink_lib.list_entries'''
+    protocol = entry[1]
+    names = [name for name, _ in netlink_lib.ATTR_POSITIONS[protocol]]
+    fields = dict(zip(names, entry[2:]))
+    fields['ip_version'] = entry[0]
+    fields['protocol'] = _protocol_number(protocol)
+    return fields
+
+
+def _filter_matches_entry(filter_, fields):
+    if utils.ethertype_to_ip_version(filter_.ethertype) != \
+            fields['ip_version']:
+        return False
+    if (filter_.protocol is not None and
+            _protocol_number(filter_.protocol) != fields['protocol']):
+        return False
+    if (filter_.nw_src is not None and
+            netaddr.IPAddress(filter_.nw_src) !=
+            netaddr.IPAddress(fields['src'])):
+        return False
+    if (filter_.nw_dst is not None and
+            netaddr.IPAddress(filter_.nw_dst) !=
+            netaddr.IPAddress(fields['dst'])):
+        return False
+    return True
+
+
+class ConntrackFlusher(object):
+    '''Deletes conntrack entries by filters.
+
+    Deletions requested inside a batch() are collected, deduplicated, and
+    executed when the outermost batch exits. Filters matching a subset of the
+    entries of another filter are dropped.
+
+    With the netlink driver, filters that netlink cannot match, and filters
+    whose netlink deletion failed, are executed with the conntrack tool.
+    '''
+
+    def __init__(self, driver=None):
+        self._driver = driver or cfg.CONF.df.conntrack_flush_driver
+        self._netlink_lib = None
+        self._batch_depth = 0
+        self._filters = []
+        if self._driver == DRIVER_NETLINK:
+            try:
+                self._netlink_lib = _import_netlink_lib()
+            except ImportError:
+                LOG.warning("Failed to import neutron netlink_lib, using "
+                            "the conntrack tool to delete conntrack entries")
+                self._driver = DRIVER_CLI
+
+    @contextlib.contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                filters = self._filters
+                self._filters = []
+                self._flush(filters)
+
+    def delete_entries(self, **kwargs):
+        '''Delete the conntrack entries matching the filter. The arguments
+        are those of utils.delete_conntrack_entries_by_filter.
+        '''
+        filter_ = _make_filter(**kwargs)
+        if self._batch_depth:
+            self._filters.append(filter_)
+        else:
+            self._flush([filter_])
+
+    def _flush(self, filters):
+        if not filters:
+            return
+        filters = _remove_subsumed(filters)
+        cli_filters = filters
+        if self._driver == DRIVER_NETLINK:
+            netlink_filters = [f for f in filters
+                               if _is_netlink_filter(self._netlink_lib, f)]
+            cli_filters = [f for f in filters
+                           if not _is_netlink_filter(self._netlink_lib, f)]
+            if not self._flush_netlink(netlink_filters):
+                cli_filters = filters
+        for filter_ in cli_filters:
+            utils.delete_conntrack_entries_by_filter(**filter_._asdict())
+
+    def _flush_netlink(self, filters):
+        '''Delete the entries matching filters through netlink. Return
+        False if the deletion failed.
+        '''
+        if not filters:
+            return True
+        netlink_lib = self._netlink_lib
+        filters_by_zone = collections.defaultdict(list)
+        for filter_ in filters:
+            filters_by_zone[filter_.zone].append(filter_)
+
+        entries = []
+        try:
+            for zone, zone_filters in filters_by_zone.items():
+                for entry in netlink_lib.list_entries(zone):
+                    fields = _entry_fields(netlink_lib, entry)
+                    if any(_filter_matches_entry(filter_, fields)
+                           for filter_ in zone_filters):
+                        entries.append(entry)
+            if entries:
+                netlink_lib.delete_entries(entries)
+            LOG.debug("Deleted %(entries)d conntrack entries matching "
+                      "%(filters)d filters",
+                      {'entries': len(entries), 'filters': len(filters)})
+        except Exception:
+            LOG.exception("Failed to delete conntrack entries by filters %s "
+                          "through netlink, falling back to the conntrack "
+                          "tool", filters)
+            return False
+        return True
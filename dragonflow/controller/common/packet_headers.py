@@ -0,0 +1,208 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import struct
+
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import packet
+from ryu.ofproto import ether
+
+ETH_HEADER_LEN = 14
+VLAN_HEADER_LEN = 4
+IPV4_MIN_HEADER_LEN = 20
+IPV6_HEADER_LEN = 40
+ARP_IPV4_LEN = 28
+
+_VLAN_TYPES = (ether.ETH_TYPE_8021Q, ether.ETH_TYPE_8021AD)
+_MAC_FORMAT = ':'.join(['%02x'] * 6)
+_IPV4_FORMAT = '.'.join(['%d'] * 4)
+
+
+class PacketHeaders(object):
+    '''Header fields of a packet, read at fixed offsets of its data.
+
+    This is a cheap alternative to ryu's Packet for packet-in handlers that
+    only look at a few header fields, e.g. to drop or rate limit a packet
+    before handling it. Fields are read from a memoryview of the data when
+    accessed, and are None if the packet is not of the matching protocol.
+    Addresses are formatted as in ryu's protocol classes. The full ryu
+    Packet is parsed only if the packet property is accessed.
+
+    Only untagged or single tagged Ethernet frames are recognized, and L4
+    fields of IPv6 packets with extension headers are not.
+    '''
+
+    def __init__(self, data):
+        self.data = data
+        self._view = memoryview(data)
+        self._packet = None
+        self.eth_type = None
+        self._l3_offset = None
+        if len(self._view) >= ETH_HEADER_LEN:
+            self._parse_ethernet()
+
+    def _parse_ethernet(self):
+        offset = ETH_HEADER_LEN - 2
+        eth_type, = struct.unpack_from('!H', self._view, offset)
+        if eth_type in _VLAN_TYPES:
+            offset += VLAN_HEADER_LEN
+            if len(self._view) < offset + 2:
+                return
+            eth_type, = struct.unpack_from('!H', self._view, offset)
+        self.eth_type = eth_type
+        self._l3_offset = offset + 2
+
+    @property
+    def packet(self):
+        '''The packet, fully parsed by ryu'''
+        if self._packet is None:
+            self._packet = packet.Packet(self.data)
+        return self._packet
+
+    def _has(self, offset, length):
+        return len(self._view) >= offset + length
+
+    def _get_mac(self, offset):
+        return _MAC_FORMAT % struct.unpack_from('!6B', self._view, offset)
+
+    def _get_ipv4(self, offset):
+        return _IPV4_FORMAT % struct.unpack_from('!4B', self._view, offset)
+
+    def _get_ipv6(self, offset):
+        return socket.inet_ntop(socket.AF_INET6,
+                                self._view[offset:offset + 16].tobytes())
+
+    @property
+    def eth_dst(self):
+        if self.eth_type is None:
+            return None
+        return self._get_mac(0)
+
+    @property
+    def eth_src(self):
+        if self.eth_type is None:
+            return None
+        return self._get_mac(6)
+
+    @property
+    def is_ipv4(self):
+        return (self.eth_type == ether.ETH_TYPE_IP and
+                self._has(self._l3_offset, IPV4_MIN_HEADER_LEN))
+
+    @property
+    def is_ipv6(self):
+        return (self.eth_type == ether.ETH_TYPE_IPV6 and
+                self._has(self._l3_offset, IPV6_HEADER_LEN))
+
+    @property
+    def is_arp(self):
+        return (self.eth_type == ether.ETH_TYPE_ARP and
+                self._has(self._l3_offset, ARP_IPV4_LEN))
+
+    @property
+    def ip_proto(self):
+        '''The IPv4 protocol, or the IPv6 next header'''
+        if self.is_ipv4:
+            return struct.unpack_from('!B', self._view,
+                                      self._l3_offset + 9)[0]
+        if self.is_ipv6:
+            return struct.unpack_from('!B', self._view,
+                                      self._l3_offset + 6)[0]
+        return None
+
+    @property
+    def ip_src(self):
+        if self.is_ipv4:
+            return self._get_ipv4(self._l3_offset + 12)
+        if self.is_ipv6:
+            return self._get_ipv6(self._l3_offset + 8)
+        return None
+
+    @property
+    def ip_dst(self):
+        if self.is_ipv4:
+            return self._get_ipv4(self._l3_offset + 16)
+        if self.is_ipv6:
+            return self._get_ipv6(self._l3_offset + 24)
+        return None
+
+    def _get_l4_offset(self):
+        if self.is_ipv4:
+            version_ihl, = struct.unpack_from('!B', self._view,
+                                              self._l3_offset)
+            return self._l3_offset + (version_ihl & 0xf) * 4
+        if self.is_ipv6:
+            return self._l3_offset + IPV6_HEADER_LEN
+        return None
+
+    def _get_l4_ports(self):
+        if self.ip_proto not in (in_proto.IPPROTO_TCP, in_proto.IPPROTO_UDP):
+            return None
+        offset = self._get_l4_offset()
+        if not self._has(offset, 4):
+            return None
+        return struct.unpack_from('!HH', self._view, offset)
+
+    @property
+    def l4_src_port(self):
+        '''The TCP or UDP source port'''
+        ports = self._get_l4_ports()
+        return ports and ports[0]
+
+    @property
+    def l4_dst_port(self):
+        '''The TCP or UDP destination port'''
+        ports = self._get_l4_ports()
+        return ports and ports[1]
+
+    def _get_icmp(self):
+        if not self.is_ipv4 or self.ip_proto != in_proto.IPPROTO_ICMP:
+            return None
+        offset = self._get_l4_offset()
+        if not self._has(offset, 2):
+            return None
+        return struct.unpack_from('!BB', self._view, offset)
+
+    @property
+    def icmp_type(self):
+        icmp = self._get_icmp()
+        return icmp and icmp[0]
+
+    @property
+    def icmp_code(self):
+        icmp = self._get_icmp()
+        return icmp and icmp[1]
+
+    @property
+    def arp_opcode(self):
+        if not self.is_arp:
+            return None
+        return struct.unpack_from('!H', self._view, self._l3_offset + 6)[0]
+
+    @property
+    def arp_src_mac(self):
+        if not self.is_arp:
+            return None
+        return self._get_mac(self._l3_offset + 8)
+
+    @property
+    def arp_src_ip(self):
+        if not self.is_arp:
+            return None
+        return self._get_ipv4(self._l3_offset + 14)
+
+    @property
+    def arp_dst_ip(self):
+        if not self.is_arp:
+            return None
+        return self._get_ipv4(self._l3_offset + 24)
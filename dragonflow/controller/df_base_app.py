@@ -131,7 +131,7 @@ class DFlowApp(object):
                                                      match,
                                                      inst)
 
-        datapath.send_msg(message)
+        self.api.send_msg(message)
 
     def add_group(self, group_id, group_type, buckets):
         """Add an entry to the groups table:
@@ -163,7 +163,7 @@ class DFlowApp(object):
 
     def _mod_group(self, command, group_id, group_type, buckets=None):
         """Convenince function that sends a group modification message"""
-        self.datapath.send_msg(
+        self.api.send_msg(
             self.parser.OFPGroupMod(
                 datapath=self.datapath,
                 command=command,
@@ -183,7 +183,7 @@ class DFlowApp(object):
                                   in_port=ofproto.OFPP_CONTROLLER,
                                   actions=actions,
                                   data=pkt)
-        datapath.send_msg(out)
+        self.api.send_msg(out)
 
     def dispatch_packet(self, pkt, unique_key):
         datapath = self.datapath
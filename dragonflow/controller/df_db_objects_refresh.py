@@ -60,6 +60,146 @@ class DfObjectRefresher(object):
             self.cache_delete_id_callback(curr_id)
         self.object_ids_to_remove.clear()
 
+    def start_sync(self, topics=None):
+        """Called once before each sync, i.e. before the read, update and
+        delete of each synced topic.
+
+        @param topics: The topics about to be synced. None for all topics.
+        """
+        pass
+
+    def reset(self, topic=None):
+        """Called when the objects of the topic (or all objects, if topic
+        is None) were removed from the cache.
+        """
+        pass
+
+
+class DfDeltaObjectRefresher(DfObjectRefresher):
+    """Refreshes objects using the NB DB change log.
+
+    Instead of reading the full table on every sync, only the objects that
+    changed since the generation at which their topic was last synced are
+    read. The generation is kept per topic, so that syncing some topics does
+    not skip the changes of the others. If the change log cannot provide the
+    changes (e.g. on the first sync, or after it was truncated), the full
+    table is read, as in DfObjectRefresher. The full table is also read for
+    a topic that is synced for the first time, or after it was cleared from
+    the cache.
+    """
+
+    def __init__(self,
+                 obj_type,
+                 cache_read_ids_callback,
+                 db_read_objects_callback,
+                 cache_update_object_callback,
+                 cache_delete_id_callback,
+                 db_read_generation_callback,
+                 db_read_changes_callback,
+                 db_read_object_callback):
+        super(DfDeltaObjectRefresher, self).__init__(
+            obj_type,
+            cache_read_ids_callback,
+            db_read_objects_callback,
+            cache_update_object_callback,
+            cache_delete_id_callback,
+        )
+        self.db_read_generation_callback = db_read_generation_callback
+        self.db_read_changes_callback = db_read_changes_callback
+        self.db_read_object_callback = db_read_object_callback
+        # The generation of the current sync
+        self.generation = None
+        # The changes read by start_sync, as (generation, change) pairs
+        self.changes = None
+        # topic -> generation at which the topic was last synced, None if
+        # it must be fully read. The None topic stands for all topics.
+        self._generations = {}
+
+    def reset(self, topic=None):
+        if topic is None:
+            self.generation = None
+            self.changes = None
+            self._generations.clear()
+        else:
+            self._generations[topic] = None
+
+    def _get_topic_generation(self, topic):
+        if topic in self._generations:
+            return self._generations[topic]
+        return self._generations.get(None)
+
+    def start_sync(self, topics=None):
+        """Fetch the changes since the oldest generation of the synced topics.
+
+        The generation is read here, before any object is read, so that
+        changes made during the sync are fetched again on the next one.
+        """
+        self.changes = None
+        if topics is None:
+            generations = [self._generations.get(None)]
+        else:
+            generations = [self._get_topic_generation(topic)
+                           for topic in topics]
+        generations = [gen for gen in generations if gen is not None]
+        if generations:
+            res = self.db_read_changes_callback(min(generations))
+            if res is not None:
+                self.generation, changes = res
+                self.changes = [(change['generation'], change)
+                                for change in changes]
+                return
+        self.generation = self.db_read_generation_callback()
+
+    def _get_changes(self, topic):
+        """Return the last change of each object of the topic, made after
+        the topic was last synced
+        """
+        generation = self._get_topic_generation(topic)
+        changes = {}
+        for change_generation, change in self.changes:
+            if change_generation <= generation:
+                continue
+            if topic is None or change['topic'] == topic:
+                changes[change['key']] = change
+        return changes
+
+    def _has_changes(self, topic):
+        if self.changes is None:
+            return False
+        if topic is None:
+            # Topics reset since the last sync of all topics are fully read
+            return None not in self._generations.values()
+        return self._get_topic_generation(topic) is not None
+
+    def read(self, topic=None):
+        if not self._has_changes(topic):
+            return super(DfDeltaObjectRefresher, self).read(topic)
+        self.object_ids_to_remove = set(
+            key for key, change in self._get_changes(topic).items()
+            if change['action'] == 'delete')
+
+    def update(self, topic=None):
+        if self._has_changes(topic):
+            self._update_changes(topic)
+        else:
+            super(DfDeltaObjectRefresher, self).update(topic)
+
+        if topic is None:
+            self._generations = {None: self.generation}
+        else:
+            self._generations[topic] = self.generation
+
+    def _update_changes(self, topic):
+        for key, change in self._get_changes(topic).items():
+            if change['action'] == 'delete':
+                continue
+            obj = self.db_read_object_callback(key, change['topic'])
+            if obj is None:
+                # Removed after the change log was read
+                self.object_ids_to_remove.add(key)
+            else:
+                self.cache_update_object_callback(obj)
+
 
 # List of DfObjectRefresher.
 items = []
@@ -86,6 +226,9 @@ def sync_local_cache_from_nb_db(topics=None):
         for item in reversed(items):
             item.delete()
 
+    for item in items:
+        item.start_sync(topics)
+
     if topics is None:
         _refresh_items()
     else:
@@ -93,6 +236,22 @@ def sync_local_cache_from_nb_db(topics=None):
             _refresh_items(topic)
 
 
+def reset_local_cache(topics=None):
+    """Force the next sync of the topics to read all their objects, e.g.
+    after they were removed from the local db store.
+
+    @param topics: The topics that were removed. If empty or None, all
+                   topics were removed.
+    @return : None
+    """
+    for item in items:
+        if topics is None:
+            item.reset()
+        else:
+            for topic in topics:
+                item.reset(topic)
+
+
 def clear_local_cache(topics=None):
     """Clear local db store and clear local OpenFlow
 
@@ -104,6 +263,7 @@ def clear_local_cache(topics=None):
         for item in reversed(items):
             item.read(topic)
             item.delete()
+            item.reset(topic)
 
     if topics is None:
         _delete_items()
@@ -23,6 +23,7 @@ from ryu.base import app_manager
 from ryu import cfg as ryu_cfg
 
 from dragonflow.common import constants
+from dragonflow.common import metrics
 from dragonflow.common import utils as df_utils
 from dragonflow import conf as cfg
 from dragonflow.controller import df_db_objects_refresh
@@ -50,6 +51,8 @@ class DfLocalController(object):
     def __init__(self, chassis_name, nb_api):
         self.db_store = db_store.DbStore()
         self.db_store2 = db_store2.get_instance()
+        if cfg.CONF.df.enable_compact_db_store:
+            self.db_store2.enable_compact_storage()
 
         self.chassis_name = chassis_name
         self.nb_api = nb_api
@@ -149,20 +152,35 @@ class DfLocalController(object):
         for handler in handlers:
             self.db_consistency_manager.add_handler(handler)
 
+    def _create_model_refresher(self, model):
+        args = (
+            model.__name__,
+            functools.partial(self.db_store2.get_keys_by_topic, model),
+            functools.partial(self.nb_api.get_all, model, lazy=True),
+            self.update_from_envelope,
+            functools.partial(self.delete_by_id, model),
+        )
+        if not cfg.CONF.df.enable_db_changelog:
+            return df_db_objects_refresh.DfObjectRefresher(*args)
+
+        def db_read_object(obj_id, topic):
+            return self.nb_api.get(model(id=obj_id, topic=topic), lazy=True)
+
+        return df_db_objects_refresh.DfDeltaObjectRefresher(
+            *args,
+            db_read_generation_callback=functools.partial(
+                self.nb_api.get_generation, model),
+            db_read_changes_callback=functools.partial(
+                self.nb_api.get_changes_since, model),
+            db_read_object_callback=db_read_object
+        )
+
     def _register_models(self):
         for model in model_framework.iter_models_by_dependency_order():
             # FIXME (dimak) do not register topicless models for now
             if issubclass(model, mixins.Topic):
                 df_db_objects_refresh.add_refresher(
-                    df_db_objects_refresh.DfObjectRefresher(
-                        model.__name__,
-                        functools.partial(self.db_store2.get_keys_by_topic,
-                                          model),
-                        functools.partial(self.nb_api.get_all, model),
-                        self.update,
-                        functools.partial(self.delete_by_id, model),
-                    ),
-                )
+                    self._create_model_refresher(model))
 
                 if (self.enable_db_consistency and
                         issubclass(model, mixins.Version)):
@@ -192,6 +210,7 @@ class DfLocalController(object):
             # applied to local.
             self.db_store.clear()
             self.db_store2.clear()
+            df_db_objects_refresh.reset_local_cache()
         while True:
             time.sleep(1)
             self.run_db_poll()
@@ -203,12 +222,16 @@ class DfLocalController(object):
             self.register_chassis()
 
             topics = self.topology.get_subscribed_topics()
-            df_db_objects_refresh.sync_local_cache_from_nb_db(topics)
+            with self.open_flow_app.batch():
+                df_db_objects_refresh.sync_local_cache_from_nb_db(topics)
+            self.open_flow_app.reconcile_flows()
             self.sync_finished = True
         except Exception as e:
             self.sync_finished = False
             LOG.warning("run_db_poll - suppressing exception")
             LOG.exception(e)
+            # The flows of a partial sync cannot be reconciled
+            self.open_flow_app.cancel_reconciliation()
 
     def update_chassis(self, chassis):
         self.db_store2.update(chassis)
@@ -454,7 +477,12 @@ class DfLocalController(object):
 
     def delete_publisher(self, publisher):
         LOG.info('Deleting publisher: %s', str(publisher))
-        self.nb_api.subscriber.unregister_listen_address(publisher.uri)
+        # Deletions may carry only the ID of the publisher
+        cached_publisher = self.db_store2.get_one(publisher)
+        if cached_publisher is not None:
+            publisher = cached_publisher
+        if publisher.uri is not None:
+            self.nb_api.subscriber.unregister_listen_address(publisher.uri)
         self.db_store2.delete(publisher)
 
     def _associate_floatingip(self, floatingip):
@@ -572,30 +600,59 @@ class DfLocalController(object):
         method_name = 'delete_{0}'.format(table)
         return getattr(self, method_name, self.delete_model_object)
 
+    def is_outdated(self, envelope):
+        '''Check whether an NB object is not newer than its cached copy,
+        using only the header fields of its envelope, i.e. without
+        instantiating it.
+
+        Only versioned models can be checked, other objects are assumed to be
+        newer, as in _is_newer.
+        '''
+        if not issubclass(envelope.model, mixins.Version):
+            return False
+        if envelope.version is None:
+            return False
+        cached_obj = self.db_store2.get_one(envelope.model(id=envelope.id))
+        if cached_obj is None or cached_obj.version is None:
+            return False
+        return envelope.version <= cached_obj.version
+
+    def update_from_envelope(self, envelope):
+        if self.is_outdated(envelope):
+            LOG.debug('Dropping outdated update of %r', envelope)
+            return
+        with metrics.timer(metrics.DECODE, envelope.model.table_name):
+            obj = envelope.decode()
+        self.update(obj)
+
     def update(self, obj):
         handler = getattr(
             self,
             'update_{0}'.format(obj.table_name),
             self.update_model_object,
         )
-        return handler(obj)
+        with metrics.timer(metrics.CONTROLLER_UPDATE, obj.table_name), \
+                self.open_flow_app.batch():
+            return handler(obj)
 
     def delete(self, obj):
         handler = self._get_delete_handler(obj.table_name)
 
-        if isinstance(obj, models.NbDbObject):
-            return handler(obj.id)
-        else:
-            return handler(obj)
+        with self.open_flow_app.batch():
+            if isinstance(obj, models.NbDbObject):
+                return handler(obj.id)
+            else:
+                return handler(obj)
 
     def delete_by_id(self, model, obj_id):
         # FIXME (dimak) Probably won't be needed once we're done porting
         handler = self._get_delete_handler(model.table_name)
 
-        if issubclass(model, models.NbObject):
-            return handler(obj_id)
-        else:
-            return handler(model(id=obj_id))
+        with self.open_flow_app.batch():
+            if issubclass(model, models.NbObject):
+                return handler(obj_id)
+            else:
+                return handler(model(id=obj_id))
 
 
 def init_ryu_config():
@@ -612,6 +669,7 @@ def main():
     common_config.init(sys.argv[1:])
     common_config.setup_logging()
     init_ryu_config()
+    metrics.setup()
     nb_api = api_nb.NbApi.get_instance(False)
     controller = DfLocalController(chassis_name, nb_api)
     service.register_service('df-local-controller', nb_api, controller)
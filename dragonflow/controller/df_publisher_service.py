@@ -51,12 +51,18 @@ class PublisherService(object):
             cfg.CONF.df.publisher_rate_limit_count,
             cfg.CONF.df.publisher_rate_limit_timeout,
         )
+        self._batch_size = cfg.CONF.df.publisher_batch_size
+        self._batch_timeout = cfg.CONF.df.publisher_batch_timeout
 
     def _get_multiproc_subscriber(self):
         """
         Return the subscriber for inter-process communication. If multi-proc
         communication is not use (i.e. disabled from config), return None.
+        With publisher sharding, the subscriber also receives the events
+        relayed by Neutron servers.
         """
+        if cfg.CONF.df.enable_publisher_sharding:
+            return pub_sub_api.load_relay_driver().get_subscriber()
         if not cfg.CONF.df.pub_sub_use_multiproc:
             return None
         pub_sub_driver = df_utils.load_driver(
@@ -69,8 +75,10 @@ class PublisherService(object):
             self.multiproc_subscriber.initialize(self._append_event_to_queue)
         self.publisher.initialize()
 
-    def _append_event_to_queue(self, table, key, action, value, topic):
-        event = db_common.DbUpdate(table, key, action, value, topic=topic)
+    def _append_event_to_queue(self, table, key, action, value, topic,
+                               trace_id=None):
+        event = db_common.DbUpdate(table, key, action, value, topic=topic,
+                                   trace_id=trace_id)
         self._queue.put(event)
         eventlet.sleep(0)
 
@@ -81,9 +89,10 @@ class PublisherService(object):
         self._start_db_table_monitors()
         while True:
             try:
-                event = self._queue.get()
-                self.publisher.send_event(event)
-                if event.table != core.Publisher.table_name:
+                events = self._get_events()
+                self.publisher.send_events(events)
+                if any(event.table != core.Publisher.table_name
+                       for event in events):
                     self._update_timestamp_in_db()
                 eventlet.sleep(0)
             except Exception as e:
@@ -91,6 +100,22 @@ class PublisherService(object):
                     e, traceback.format_exc())
                 # Ignore
 
+    def _get_events(self):
+        """Wait for an event, then keep gathering events until the batch is
+        full or the batch timeout expires.
+        """
+        events = [self._queue.get()]
+        deadline = time.time() + self._batch_timeout
+        while len(events) < self._batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                events.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return events
+
     def _update_timestamp_in_db(self):
         if self._rate_limit():
             return
@@ -105,24 +130,37 @@ class PublisherService(object):
             self._register_as_publisher()
 
     def _register_as_publisher(self):
+        relay_uri = None
+        if cfg.CONF.df.enable_publisher_sharding:
+            relay_uri = self._get_relay_uri()
         self.nb_api.create(
             core.Publisher(
                 id=self.uuid,
                 uri=self._get_uri(),
+                relay_uri=relay_uri,
                 last_activity_timestamp=time.time(),
             ),
         )
 
-    def _get_uri(self):
+    def _get_ip(self):
         ip = cfg.CONF.df.publisher_bind_address
         if ip == '*' or ip == '127.0.0.1':
             ip = cfg.CONF.df.management_ip
+        return ip
+
+    def _get_uri(self):
         return "{}://{}:{}".format(
             cfg.CONF.df.publisher_transport,
-            ip,
+            self._get_ip(),
             cfg.CONF.df.publisher_port,
         )
 
+    def _get_relay_uri(self):
+        return "tcp://{}:{}".format(
+            self._get_ip(),
+            cfg.CONF.df.publisher_relay_port,
+        )
+
     def _start_db_table_monitor(self, table_name):
         if table_name == 'publisher':
             table_monitor = pub_sub_api.StalePublisherMonitor(
@@ -137,6 +175,7 @@ class PublisherService(object):
                 self.db,
                 self.publisher,
                 cfg.CONF.df.monitor_table_poll_time,
+                cfg.CONF.df.monitor_table_resync_time,
             )
         table_monitor.daemonize()
         return table_monitor
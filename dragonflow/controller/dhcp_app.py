@@ -33,6 +33,7 @@ from ryu.ofproto import ether
 from dragonflow.common import utils as df_utils
 from dragonflow import conf as cfg
 from dragonflow.controller.common import constants as const
+from dragonflow.controller.common import packet_headers
 from dragonflow.controller import df_base_app
 from dragonflow.db.models import constants as model_constants
 from dragonflow.db.models import host_route
@@ -78,10 +79,11 @@ class DHCPApp(df_base_app.DFlowApp):
     def packet_in_handler(self, event):
         msg = event.msg
 
-        pkt = ryu_packet.Packet(msg.data)
-        pkt_ip = pkt.get_protocol(ipv4.ipv4)
+        # Full parsing is deferred to after the rate limit, as DHCP floods
+        # are mostly dropped by it
+        headers = packet_headers.PacketHeaders(msg.data)
 
-        if not pkt_ip:
+        if not headers.is_ipv4:
             LOG.error("No support for non IPv4 protocol")
             return
 
@@ -107,7 +109,7 @@ class DHCPApp(df_base_app.DFlowApp):
             LOG.error("Port %s no longer found.", lport.id)
             return
         try:
-            self._handle_dhcp_request(pkt, lport)
+            self._handle_dhcp_request(headers.packet, lport)
         except Exception:
             LOG.exception("Unable to handle packet %s", msg)
 
@@ -15,6 +15,7 @@ from oslo_utils import importutils
 
 from dragonflow._i18n import _
 from dragonflow.common import exceptions
+from dragonflow.common import metrics
 
 LOG = log.getLogger(__name__)
 
@@ -43,7 +44,8 @@ class AppDispatcher(object):
             handler = getattr(app, method, None)
             if handler is not None:
                 try:
-                    handler(*args, **kwargs)
+                    with metrics.timer(metrics.APP_DISPATCH, handler):
+                        handler(*args, **kwargs)
                 except Exception as e:
                     app_name = app.__class__.__name__
                     LOG.exception("Dragonflow application '%(name)s' "
@@ -30,6 +30,7 @@ from dragonflow import conf as cfg
 from dragonflow.controller.common import arp_responder
 from dragonflow.controller.common import constants as const
 from dragonflow.controller.common import icmp_error_generator
+from dragonflow.controller.common import packet_headers
 from dragonflow.controller.common import utils
 from dragonflow.controller import df_base_app
 from dragonflow.db.models import constants as model_constants
@@ -132,19 +133,18 @@ class DNATApp(df_base_app.DFlowApp):
                              'table': const.EGRESS_NAT_TABLE})
                 return
 
-            pkt = packet.Packet(msg.data)
-            e_pkt = pkt.get_protocol(ethernet.ethernet)
-            mac = netaddr.EUI(e_pkt.src)
+            headers = packet_headers.PacketHeaders(msg.data)
+            mac = netaddr.EUI(headers.eth_src)
             floatingip = self.floatingip_rarp_cache.get(mac)
             if floatingip:
                 icmp_ttl_pkt = icmp_error_generator.generate(
                     icmp.ICMP_TIME_EXCEEDED, icmp.ICMP_TTL_EXPIRED_CODE,
-                    msg.data, floatingip, pkt)
+                    msg.data, floatingip, headers.packet)
                 unique_key = msg.match.get('reg6')
                 self.dispatch_packet(icmp_ttl_pkt, unique_key)
             else:
                 LOG.warning("The invalid TTL packet's destination mac %s "
-                            "can't be recognized.", e_pkt.src)
+                            "can't be recognized.", headers.eth_src)
             return
 
         if self.external_bridge_mac:
@@ -0,0 +1,194 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+
+from oslo_log import log
+from ryu.ofproto import ofproto_v1_3
+
+LOG = log.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _normalize_field(name, value):
+    '''Return the field as (number, value, mask) in wire format, normalized
+    as the switch does: the value is masked, an all-ones mask is dropped,
+    and a field with an all-zeros mask is a wildcard (None is returned).
+    '''
+    number, value, mask = ofproto_v1_3.oxm_from_user(name, value)
+    if mask is not None:
+        mask_bytes = bytearray(mask)
+        if not any(mask_bytes):
+            return None
+        if all(byte == 0xff for byte in mask_bytes):
+            mask = None
+        else:
+            value = bytes(bytearray(
+                v & m for v, m in zip(bytearray(value), mask_bytes)))
+    return number, value, mask
+
+
+def _match_key(match):
+    '''Return a key of match that is equal for all the forms of the same
+    match, e.g. a match as sent, and the match dumped from the switch.
+    '''
+    fields = (_normalize_field(name, value)
+              for name, value in match.items())
+    return tuple(sorted(field for field in fields if field is not None))
+
+
+def _flow_key(table_id, priority, match):
+    return (table_id, priority, _match_key(match))
+
+
+def _serialize_instructions(instructions):
+    buf = bytearray()
+    for inst in instructions:
+        inst.serialize(buf, len(buf))
+    return bytes(buf)
+
+
+def _is_subset_match(match, flow_match_key):
+    '''Check whether a non-strict flow mod with match applies to a flow'''
+    flow_fields = {number: (value, mask)
+                   for number, value, mask in flow_match_key}
+    return all(flow_fields.get(number, _MISSING) == (value, mask)
+               for number, value, mask in _match_key(match))
+
+
+class FlowStore(object):
+    '''The desired state of the flow tables of a switch.
+
+    Flow mods are applied to the store instead of being sent, e.g. while all
+    flows are re-installed after (re)connecting to the switch. The store is
+    then compared to the flows actually installed, and only the difference
+    is sent (see diff).
+
+    Flows with timeouts are transient, and are neither stored nor removed.
+    They are sent to the switch directly (see RyuDFAdapter.send_msg).
+    '''
+
+    def __init__(self):
+        # table_id -> flow key -> flow mod
+        self._tables = collections.defaultdict(dict)
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    def flows(self):
+        '''Return the add flow mods of all the stored flows'''
+        return [flow for table in self._tables.values()
+                for flow in table.values()]
+
+    def apply(self, msg):
+        '''Apply a flow mod message to the desired state'''
+        if msg.idle_timeout or msg.hard_timeout:
+            return
+
+        ofp = msg.datapath.ofproto
+        command = msg.command
+        if command == ofp.OFPFC_ADD:
+            if msg.buffer_id != ofp.OFP_NO_BUFFER:
+                # The buffered packet is released once, by the sent flow mod
+                msg = self._modified(msg, msg)
+            key = _flow_key(msg.table_id, msg.priority, msg.match)
+            self._tables[msg.table_id][key] = msg
+        elif command in (ofp.OFPFC_MODIFY_STRICT, ofp.OFPFC_DELETE_STRICT):
+            key = _flow_key(msg.table_id, msg.priority, msg.match)
+            table = self._tables[msg.table_id]
+            if key not in table:
+                return
+            if command == ofp.OFPFC_DELETE_STRICT:
+                del table[key]
+            else:
+                table[key] = self._modified(table[key], msg)
+        elif command in (ofp.OFPFC_MODIFY, ofp.OFPFC_DELETE):
+            for table in self._get_tables(msg):
+                for key, flow in list(table.items()):
+                    if not self._non_strict_match(msg, key, flow):
+                        continue
+                    if command == ofp.OFPFC_DELETE:
+                        del table[key]
+                    else:
+                        table[key] = self._modified(flow, msg)
+
+    def _get_tables(self, msg):
+        if msg.table_id == msg.datapath.ofproto.OFPTT_ALL:
+            return list(self._tables.values())
+        return [self._tables[msg.table_id]]
+
+    @staticmethod
+    def _non_strict_match(msg, key, flow):
+        if (flow.cookie & msg.cookie_mask) != (msg.cookie & msg.cookie_mask):
+            return False
+        return _is_subset_match(msg.match, key[2])
+
+    @staticmethod
+    def _modified(flow, msg):
+        '''Return an add flow mod of flow, with the instructions of msg'''
+        return flow.datapath.ofproto_parser.OFPFlowMod(
+            flow.datapath,
+            cookie=flow.cookie,
+            table_id=flow.table_id,
+            command=flow.datapath.ofproto.OFPFC_ADD,
+            priority=flow.priority,
+            flags=flow.flags,
+            match=flow.match,
+            instructions=msg.instructions,
+        )
+
+    def diff(self, datapath, installed_flows):
+        '''Compare the desired state to the flows installed on the switch
+        (flow stats, as returned by OpenFlowSwitchMixin.dump_flows).
+
+        Returns a list of flow mods to send to the switch to reach the desired
+        state: strict deletes of the unknown flows, followed by adds of
+        missing and changed flows.
+        '''
+        deletes = []
+        adds = []
+        unchanged = set()
+        for flow in installed_flows:
+            if flow.idle_timeout or flow.hard_timeout:
+                continue
+            key = _flow_key(flow.table_id, flow.priority, flow.match)
+            desired = self._tables.get(flow.table_id, {}).get(key)
+            if desired is None:
+                deletes.append(self._delete_msg(datapath, flow))
+            elif (desired.cookie == flow.cookie and
+                  _serialize_instructions(desired.instructions) ==
+                  _serialize_instructions(flow.instructions)):
+                unchanged.add(key)
+
+        for table in self._tables.values():
+            for key, desired in table.items():
+                if key not in unchanged:
+                    adds.append(desired)
+
+        LOG.info('Flow reconciliation: %(unchanged)d flows unchanged, '
+                 '%(deletes)d to delete, %(adds)d to add or modify',
+                 {'unchanged': len(unchanged), 'deletes': len(deletes),
+                  'adds': len(adds)})
+        return deletes + adds
+
+    @staticmethod
+    def _delete_msg(datapath, flow):
+        ofp = datapath.ofproto
+        return datapath.ofproto_parser.OFPFlowMod(
+            datapath,
+            table_id=flow.table_id,
+            command=ofp.OFPFC_DELETE_STRICT,
+            priority=flow.priority,
+            match=flow.match,
+            out_port=ofp.OFPP_ANY,
+            out_group=ofp.OFPG_ANY,
+        )
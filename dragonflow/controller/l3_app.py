@@ -13,18 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import netaddr
+import collections
+import time
 
+import netaddr
 from neutron_lib import constants as n_const
 from oslo_log import log
-from ryu.lib.packet import ipv4
-from ryu.lib.packet import ipv6
-from ryu.lib.packet import packet
+from oslo_service import loopingcall
 from ryu.ofproto import ether
 
 from dragonflow.controller.common import constants as const
+from dragonflow.controller.common import packet_headers
 from dragonflow.controller import df_base_app
 from dragonflow.controller import l3_app_base
+from dragonflow.controller import ofswitch
 from dragonflow.db.models import l2
 from dragonflow.db.models import l3
 
@@ -38,10 +40,50 @@ ROUTER_PORT_BUFFER_ID = 0xff12
 
 
 class L3App(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
+    """Routes reactively: the first packet to a destination is sent to the
+    controller, which installs a flow for the destination.
+
+    Destinations are looked up in an index of the ports by (lswitch, IP),
+    maintained from the port events. Packets to unknown destinations are
+    dropped by a short lived negative cache flow, so that scans do not reach
+    the controller for every packet. Optionally, the routes of the most
+    frequent destinations, counted from the packet-ins and the packets
+    matched by their flows, are installed again periodically, so that they
+    stay installed, e.g. after their flows were removed from the switch.
+    """
+
     def __init__(self, *args, **kwargs):
         super(L3App, self).__init__(*args, **kwargs)
         self.idle_timeout = 30
         self.hard_timeout = 0
+        self.negative_cache_timeout = self.conf.reactive_negative_cache_timeout
+        self.prewarm_routes = self.conf.reactive_prewarm_routes
+        self.prewarm_interval = self.conf.reactive_prewarm_interval
+        # (lswitch id, IP) -> lport, for ports that are not router interfaces
+        self._lports_by_ip = {}
+        # (network id, IP) -> expiry time of its negative cache flow, in
+        # expiry order, and IP -> network ids of its negative cache flows
+        self._negative_cache = collections.OrderedDict()
+        self._negative_networks_by_ip = {}
+        # (router key, network id, IP) -> routed packet-ins since the last
+        # pre-warm
+        self._route_hits = collections.Counter()
+        # (network id, IP) -> router key, of the installed routes, and the
+        # packet count of their flows at the last pre-warm
+        self._route_routers = {}
+        self._route_packet_counts = {}
+        self._switch = None
+        self._prewarm_loop = None
+
+    def switch_features_handler(self, ev):
+        super(L3App, self).switch_features_handler(ev)
+        self._negative_cache.clear()
+        self._negative_networks_by_ip.clear()
+        if self.prewarm_routes and self._prewarm_loop is None:
+            self._prewarm_loop = loopingcall.FixedIntervalLoopingCall(
+                self._prewarm)
+            self._prewarm_loop.start(interval=self.prewarm_interval,
+                                     initial_delay=self.prewarm_interval)
 
     def packet_in_handler(self, event):
         msg = event.msg
@@ -51,40 +93,192 @@ class L3App(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
             return
 
         # Normal path for a learn routing device.
-        pkt = packet.Packet(msg.data)
-        pkt_ip = pkt.get_protocol(ipv4.ipv4) or pkt.get_protocol(ipv6.ipv6)
-        if pkt_ip is None:
+        dst_ip = packet_headers.PacketHeaders(msg.data).ip_dst
+        if dst_ip is None:
             LOG.error("Received Non IP Packet")
             return
         network_id = msg.match.get('metadata')
         try:
-            self._get_route(pkt_ip, network_id, msg)
+            self._get_route(dst_ip, network_id, msg)
         except Exception as e:
             LOG.error("L3 App PacketIn exception raised")
             LOG.error(e)
 
-    def _get_route(self, pkt_ip, network_id, msg):
-        ip_addr = netaddr.IPAddress(pkt_ip.dst)
+    def _get_route(self, dst_ip, network_id, msg):
+        ip_addr = netaddr.IPAddress(dst_ip)
         router_unique_key = msg.match.get('reg5')
-        router = self.db_store2.get_all(
+        router_port, out_port = self._lookup_route(router_unique_key,
+                                                   ip_addr)
+        if out_port is None:
+            self._install_negative_cache_flow(network_id, ip_addr,
+                                              msg.buffer_id)
+            return
+        self._install_l3_flow(router_port, out_port, msg, network_id)
+        if self.prewarm_routes:
+            self._route_hits[(router_unique_key, network_id, ip_addr)] += 1
+            self._route_routers[(network_id, ip_addr)] = router_unique_key
+
+    def _lookup_route(self, router_unique_key, ip_addr):
+        """Return the router port of the subnet of ip_addr, and the port of
+        ip_addr. Either is None if not found.
+        """
+        router = self.db_store2.get_one(
             l3.LogicalRouter(unique_key=router_unique_key),
             l3.LogicalRouter.get_index('unique_key'))
+        if router is None:
+            return None, None
         for router_port in router.ports:
             if ip_addr in router_port.network:
-                index = l2.LogicalPort.get_index('lswitch_id')
-                dst_ports = self.db_store2.get_all(
-                    l2.LogicalPort(lswitch=l2.LogicalSwitch(
-                        id=router_port.lswitch.id)),
-                    index=index)
-                for out_port in dst_ports:
-                    if out_port.ip == ip_addr:
-                        self._install_l3_flow(router_port,
-                                              out_port, msg,
-                                              network_id)
-                        return
+                return router_port, self._lports_by_ip.get(
+                    (router_port.lswitch.id, ip_addr))
+        return None, None
+
+    def _get_route_flow_hits(self):
+        """Return the number of packets matched by each route flow since the
+        last call, by (network id, IP)
+        """
+        if self._switch is None:
+            self._switch = ofswitch.OpenFlowSwitchMixin(self.api)
+        packet_counts = {}
+        for flow in self._switch.dump_flows(const.L3_LOOKUP_TABLE):
+            # Negative cache flows have no instructions
+            if (flow.priority != const.PRIORITY_VERY_HIGH or
+                    not flow.instructions):
+                continue
+            dst_ip = flow.match.get('ipv4_dst') or flow.match.get('ipv6_dst')
+            if dst_ip is None:
+                continue
+            key = (flow.match.get('metadata'), netaddr.IPAddress(dst_ip))
+            packet_counts[key] = flow.packet_count
+
+        hits = {}
+        for key, packet_count in packet_counts.items():
+            last_count = self._route_packet_counts.get(key, 0)
+            # A lower count is of a flow that was installed again
+            if packet_count < last_count:
+                last_count = 0
+            hits[key] = packet_count - last_count
+        self._route_packet_counts = packet_counts
+        return hits
+
+    def _prewarm(self):
+        """Install the routes of the most frequent destinations of the last
+        interval, counting both their packet-ins and the packets matched by
+        their flows.
+        """
+        route_hits = self._route_hits
+        self._route_hits = collections.Counter()
+        flow_hits = self._get_route_flow_hits()
+        for key, hits in flow_hits.items():
+            router_unique_key = self._route_routers.get(key)
+            if hits and router_unique_key is not None:
+                network_id, ip_addr = key
+                route_hits[(router_unique_key, network_id, ip_addr)] += hits
+        # Forget the routes that are neither installed nor recently routed
+        self._route_routers = {
+            key: router_unique_key
+            for key, router_unique_key in self._route_routers.items()
+            if key in flow_hits or
+            (router_unique_key,) + key in route_hits}
+
+        for (router_unique_key, network_id, ip_addr), _ in (
+                route_hits.most_common(self.prewarm_routes)):
+            router_port, out_port = self._lookup_route(router_unique_key,
+                                                       ip_addr)
+            if out_port is not None:
+                self._install_l3_flow(
+                    router_port, out_port, None, network_id,
+                    idle_timeout=self.idle_timeout + self.prewarm_interval)
+
+    @staticmethod
+    def _get_index_key(lport):
+        return lport.lswitch.id, lport.ip
+
+    def _add_port(self, lport):
+        super(L3App, self)._add_port(lport)
+        self._lports_by_ip[self._get_index_key(lport)] = lport
+        self._flush_negative_cache(lport.ip)
+
+    def _remove_port(self, lport):
+        super(L3App, self)._remove_port(lport)
+        key = self._get_index_key(lport)
+        indexed_lport = self._lports_by_ip.get(key)
+        if indexed_lport is not None and indexed_lport.id == lport.id:
+            del self._lports_by_ip[key]
+
+    @df_base_app.register_event(l2.LogicalPort, l2.EVENT_LOCAL_UPDATED)
+    @df_base_app.register_event(l2.LogicalPort, l2.EVENT_REMOTE_UPDATED)
+    def _update_port_index(self, lport, orig_lport):
+        if lport.device_owner == n_const.DEVICE_OWNER_ROUTER_INTF:
+            return
+        orig_key = self._get_index_key(orig_lport)
+        key = self._get_index_key(lport)
+        if key == orig_key:
+            self._lports_by_ip[key] = lport
+            return
+        indexed_lport = self._lports_by_ip.get(orig_key)
+        if indexed_lport is not None and indexed_lport.id == lport.id:
+            del self._lports_by_ip[orig_key]
+        self._lports_by_ip[key] = lport
+        self._flush_negative_cache(lport.ip)
+
+    def _get_dst_ip_match(self, network_id, dst_ip):
+        parser = self.parser
+        if netaddr.IPAddress(dst_ip).version == n_const.IP_VERSION_4:
+            return parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
+                                   metadata=network_id,
+                                   ipv4_dst=dst_ip)
+        return parser.OFPMatch(eth_type=ether.ETH_TYPE_IPV6,
+                               metadata=network_id,
+                               ipv6_dst=dst_ip)
+
+    def _expire_negative_cache(self):
+        now = time.time()
+        while self._negative_cache:
+            key, expiry = next(iter(self._negative_cache.items()))
+            if expiry > now:
+                return
+            del self._negative_cache[key]
+            network_id, ip_addr = key
+            networks = self._negative_networks_by_ip.get(ip_addr)
+            if networks is not None:
+                networks.discard(network_id)
+                if not networks:
+                    del self._negative_networks_by_ip[ip_addr]
+
+    def _install_negative_cache_flow(self, network_id, ip_addr, buffer_id):
+        """Drop the packets to an unknown destination for a while. The
+        buffered packet is dropped too.
+        """
+        if not self.negative_cache_timeout:
+            return
+        self._expire_negative_cache()
+        key = (network_id, ip_addr)
+        self._negative_cache.pop(key, None)
+        self._negative_cache[key] = time.time() + self.negative_cache_timeout
+        self._negative_networks_by_ip.setdefault(ip_addr, set()).add(
+            network_id)
+        self.mod_flow(
+            inst=[],
+            table_id=const.L3_LOOKUP_TABLE,
+            priority=const.PRIORITY_VERY_HIGH,
+            match=self._get_dst_ip_match(network_id, ip_addr),
+            buffer_id=buffer_id,
+            hard_timeout=self.negative_cache_timeout)
+
+    def _flush_negative_cache(self, ip_addr):
+        """Remove the negative cache flows of a destination that is now known
+        """
+        self._expire_negative_cache()
+        for network_id in self._negative_networks_by_ip.pop(ip_addr, ()):
+            self.mod_flow(
+                table_id=const.L3_LOOKUP_TABLE,
+                command=self.ofproto.OFPFC_DELETE_STRICT,
+                priority=const.PRIORITY_VERY_HIGH,
+                match=self._get_dst_ip_match(network_id, ip_addr))
 
     def _install_l3_flow(self, dst_router_port, dst_port, msg,
-                         src_network_id):
+                         src_network_id, idle_timeout=None):
         reg7 = dst_port.unique_key
         dst_ip = dst_port.ip
         src_mac = dst_router_port.mac
@@ -94,14 +288,11 @@ class L3App(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
         parser = self.parser
         ofproto = self.ofproto
 
-        if netaddr.IPAddress(dst_ip).version == n_const.IP_VERSION_4:
-            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
-                                    metadata=src_network_id,
-                                    ipv4_dst=dst_ip)
+        match = self._get_dst_ip_match(src_network_id, dst_ip)
+        if msg is not None:
+            buffer_id = msg.buffer_id
         else:
-            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IPV6,
-                                    metadata=src_network_id,
-                                    ipv6_dst=dst_ip)
+            buffer_id = ofproto.OFP_NO_BUFFER
 
         actions = []
         actions.append(parser.OFPActionDecNwTtl())
@@ -123,8 +314,8 @@ class L3App(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
             table_id=const.L3_LOOKUP_TABLE,
             priority=const.PRIORITY_VERY_HIGH,
             match=match,
-            buffer_id=msg.buffer_id,
-            idle_timeout=self.idle_timeout,
+            buffer_id=buffer_id,
+            idle_timeout=idle_timeout or self.idle_timeout,
             hard_timeout=self.hard_timeout)
 
     def _add_subnet_send_to_route(self, match, local_network_id, router_port):
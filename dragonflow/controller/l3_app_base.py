@@ -19,11 +19,8 @@ import netaddr
 from neutron_lib import constants as common_const
 from oslo_log import log
 from ryu.lib import mac as ryu_mac_lib
-from ryu.lib.packet import ethernet
 from ryu.lib.packet import icmp
-from ryu.lib.packet import packet
-from ryu.lib.packet import tcp
-from ryu.lib.packet import udp
+from ryu.lib.packet import in_proto
 from ryu.ofproto import ether
 
 from dragonflow.common import exceptions
@@ -33,6 +30,7 @@ from dragonflow.controller.common import arp_responder
 from dragonflow.controller.common import constants as const
 from dragonflow.controller.common import icmp_error_generator
 from dragonflow.controller.common import icmp_responder
+from dragonflow.controller.common import packet_headers
 from dragonflow.controller import df_base_app
 from dragonflow.db.models import constants as model_constants
 from dragonflow.db.models import host_route
@@ -84,19 +82,18 @@ class L3AppMixin(object):
                              'table': const.L3_LOOKUP_TABLE})
                 return True
 
-            pkt = packet.Packet(msg.data)
-            e_pkt = pkt.get_protocol(ethernet.ethernet)
-            mac = netaddr.EUI(e_pkt.dst)
+            headers = packet_headers.PacketHeaders(msg.data)
+            mac = netaddr.EUI(headers.eth_dst)
             router_port_ip = self.router_port_rarp_cache.get(mac)
             if router_port_ip:
                 icmp_ttl_pkt = icmp_error_generator.generate(
                     icmp.ICMP_TIME_EXCEEDED, icmp.ICMP_TTL_EXPIRED_CODE,
-                    msg.data, str(router_port_ip), pkt)
+                    msg.data, str(router_port_ip), headers.packet)
                 unique_key = msg.match.get('reg6')
                 self.dispatch_packet(icmp_ttl_pkt, unique_key)
             else:
                 LOG.warning("The invalid TTL packet's destination mac %s "
-                            "can't be recognized.", e_pkt.dst)
+                            "can't be recognized.", headers.eth_dst)
             return True
 
         if msg.match.get('reg7'):
@@ -113,13 +110,12 @@ class L3AppMixin(object):
                 return True
 
             # Response icmp unreachable to udp or tcp.
-            pkt = packet.Packet(msg.data)
-            tcp_pkt = pkt.get_protocol(tcp.tcp)
-            udp_pkt = pkt.get_protocol(udp.udp)
-            if tcp_pkt or udp_pkt:
+            headers = packet_headers.PacketHeaders(msg.data)
+            if headers.ip_proto in (in_proto.IPPROTO_TCP,
+                                    in_proto.IPPROTO_UDP):
                 icmp_dst_unreach = icmp_error_generator.generate(
                     icmp.ICMP_DEST_UNREACH, icmp.ICMP_PORT_UNREACH_CODE,
-                    msg.data, pkt=pkt)
+                    msg.data, pkt=headers.packet)
                 unique_key = msg.match.get('reg6')
                 self.dispatch_packet(icmp_dst_unreach, unique_key)
 
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import netaddr
 from neutron_lib import constants as n_const
 from oslo_log import log
 from ryu.ofproto import ether
@@ -22,14 +23,77 @@ LOG = log.getLogger(__name__)
 
 
 class L3ProactiveApp(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
+    """Routes to the ports of the router subnets with proactive flows.
+
+    By default, a flow per port is installed in L3_PROACTIVE_LOOKUP_TABLE.
+    If the MAC addresses of the ports are derived from their IPv4 addresses
+    (see the proactive_derived_mac_prefix option), a single flow per subnet
+    sets the destination MAC from the destination IP, and goes to the L2
+    lookup. Ports whose MAC is not derived keep a flow of their own, which
+    overrides the subnet flow.
+    """
 
     def packet_in_handler(self, event):
         msg = event.msg
         self.router_function_packet_in_handler(msg)
 
+    def _get_derived_mac(self, ip):
+        """Return the MAC derived from an IPv4 address, or None if MACs are
+        not derived from this address
+        """
+        prefix = self.conf.proactive_derived_mac_prefix
+        if not prefix or ip.version != n_const.IP_VERSION_4:
+            return None
+        return netaddr.EUI((int(netaddr.EUI(prefix + ':00:00:00:00')) |
+                            int(ip)))
+
+    def _is_mac_derived(self, ip, mac):
+        derived_mac = self._get_derived_mac(ip)
+        return derived_mac is not None and derived_mac == netaddr.EUI(mac)
+
     def _add_subnet_send_to_route(self, match, local_network_id, router_port):
         self._add_subnet_send_to_proactive_routing(match, local_network_id,
                                                    router_port.mac)
+        subnet = router_port.network
+        if self._get_derived_mac(subnet.ip) is not None:
+            self._add_subnet_derived_mac_flow(local_network_id, subnet)
+
+    def _get_subnet_match(self, network_id, subnet):
+        return self.parser.OFPMatch(eth_type=ether.ETH_TYPE_IP,
+                                    metadata=network_id,
+                                    ipv4_dst=(subnet.network, subnet.netmask))
+
+    def _add_subnet_derived_mac_flow(self, network_id, subnet):
+        parser = self.parser
+        ofproto = self.ofproto
+
+        base_mac = self._get_derived_mac(netaddr.IPAddress(0))
+        actions = [
+            parser.OFPActionSetField(eth_dst=str(base_mac)),
+            parser.NXActionRegMove(src_field='ipv4_dst',
+                                   dst_field='eth_dst',
+                                   n_bits=32),
+        ]
+        action_inst = parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS, actions)
+        goto_inst = parser.OFPInstructionGotoTable(const.L2_LOOKUP_TABLE)
+        self.mod_flow(
+            inst=[action_inst, goto_inst],
+            table_id=const.L3_PROACTIVE_LOOKUP_TABLE,
+            priority=const.PRIORITY_MEDIUM,
+            match=self._get_subnet_match(network_id, subnet))
+
+    def _delete_router_port(self, router, router_port):
+        super(L3ProactiveApp, self)._delete_router_port(router, router_port)
+        subnet = router_port.network
+        if self._get_derived_mac(subnet.ip) is not None:
+            # Strict, so that the flows of the ports of the subnet are kept
+            self.mod_flow(
+                table_id=const.L3_PROACTIVE_LOOKUP_TABLE,
+                command=self.ofproto.OFPFC_DELETE_STRICT,
+                priority=const.PRIORITY_MEDIUM,
+                match=self._get_subnet_match(
+                    router_port.lswitch.unique_key, subnet))
 
     def _add_subnet_send_to_proactive_routing(self, match, dst_network_id,
                                               dst_router_port_mac):
@@ -61,6 +125,9 @@ class L3ProactiveApp(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
         network_id = lport.local_network_id
         tunnel_key = lport.unique_key
 
+        if self._is_mac_derived(dst_ip, dst_mac):
+            # Routed by the flow of its subnet
+            return
         self._add_port_process(dst_ip, dst_mac, network_id, tunnel_key)
 
     def _add_port_process(self, dst_ip, dst_mac, network_id, tunnel_key,
@@ -97,6 +164,8 @@ class L3ProactiveApp(df_base_app.DFlowApp, l3_app_base.L3AppMixin):
         dst_ip = lport.ip
         network_id = lport.local_network_id
 
+        if self._is_mac_derived(dst_ip, lport.mac):
+            return
         self._remove_port_process(dst_ip, network_id)
 
     def _remove_port_process(self, dst_ip, network_id,
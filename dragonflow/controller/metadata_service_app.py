@@ -15,6 +15,8 @@
 
 import hashlib
 import hmac
+import threading
+import time
 
 import httplib2
 import netaddr
@@ -430,6 +432,8 @@ class BaseMetadataProxyHandler(object):
             headers=headers,
             body=req.body
         )
+        # Clients whose request failed are not reused
+        self.release_http_client(h)
         if resp.status == 200:
             LOG.debug(str(resp))
             return self.create_response(req, resp, content)
@@ -477,12 +481,23 @@ class BaseMetadataProxyHandler(object):
     def create_http_client(self, req):
         return httplib2.Http()
 
+    def release_http_client(self, h):
+        pass
+
 
 class DFMetadataProxyHandler(BaseMetadataProxyHandler):
     def __init__(self, conf, nb_api):
         super(DFMetadataProxyHandler, self).__init__()
         self.conf = conf
         self.nb_api = nb_api
+        # tunnel key -> (lport, time it was read)
+        self._lports_by_tunnel_key = {}
+        # tunnel key -> time it was not found in the lport table
+        self._missing_tunnel_keys = {}
+        self._reload_lock = threading.Lock()
+        self._reload_time = 0
+        # Idle HTTP clients, each keeping its connection to Nova alive
+        self._http_clients = []
 
     def _get_ovsdb_connection_string(self):
         return 'tcp:{}:6640'.format(cfg.CONF.df.management_ip)
@@ -515,6 +530,8 @@ class DFMetadataProxyHandler(BaseMetadataProxyHandler):
         return self.conf.nova_metadata_protocol
 
     def create_http_client(self, req):
+        if self._http_clients:
+            return self._http_clients.pop()
         h = httplib2.Http(
             ca_certs=self.conf.auth_ca_cert,
             disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
@@ -525,12 +542,60 @@ class DFMetadataProxyHandler(BaseMetadataProxyHandler):
                               self.get_host(req))
         return h
 
+    def release_http_client(self, h):
+        pool_size = cfg.CONF.df_metadata.nova_client_pool_size
+        if len(self._http_clients) < pool_size:
+            self._http_clients.append(h)
+
     def _get_logical_port_by_tunnel_key(self, tunnel_key):
-        lports = self.nb_api.get_all(l2.LogicalPort)
-        for lport in lports:
-            if lport.unique_key == tunnel_key:
+        """Return the logical port with the given tunnel key (unique key).
+
+        Ports are cached by tunnel key, and re-read by ID once their cache
+        entry expires. The entire lport table is read only for unknown
+        tunnel keys, and the cache is rebuilt from it. Concurrent requests
+        wait for the same read, and tunnel keys still not found are not
+        looked up again until their cache entry expires.
+        """
+        now = time.time()
+        ttl = cfg.CONF.df_metadata.lport_cache_ttl
+        lport, read_time = self._lports_by_tunnel_key.get(tunnel_key,
+                                                          (None, None))
+        if lport is not None:
+            if now - read_time < ttl:
                 return lport
-        raise exceptions.LogicalPortNotFoundByTunnelKey(key=tunnel_key)
+            lport = self.nb_api.get(l2.LogicalPort(id=lport.id))
+            if lport is not None and lport.unique_key == tunnel_key:
+                self._lports_by_tunnel_key[tunnel_key] = (lport, time.time())
+                return lport
+        elif now - self._missing_tunnel_keys.get(tunnel_key, 0) < ttl:
+            raise exceptions.LogicalPortNotFoundByTunnelKey(key=tunnel_key)
+
+        self._reload_lports(now)
+        try:
+            return self._lports_by_tunnel_key[tunnel_key][0]
+        except KeyError:
+            self._missing_tunnel_keys[tunnel_key] = self._reload_time
+            raise exceptions.LogicalPortNotFoundByTunnelKey(key=tunnel_key)
+
+    def _reload_lports(self, requested_time):
+        with self._reload_lock:
+            if self._reload_time >= requested_time:
+                # Read by another request while this one waited
+                return
+            now = time.time()
+            self._lports_by_tunnel_key = {
+                lport.unique_key: (lport, now)
+                for lport in self.nb_api.get_all(l2.LogicalPort)
+            }
+            ttl = cfg.CONF.df_metadata.lport_cache_ttl
+            self._missing_tunnel_keys = {
+                tunnel_key: missing_time
+                for tunnel_key, missing_time in
+                self._missing_tunnel_keys.items()
+                if (now - missing_time < ttl and
+                    tunnel_key not in self._lports_by_tunnel_key)
+            }
+            self._reload_time = now
 
     # Taken from Neurton: neutron/agent/metadata/agent.py
     def _sign_instance_id(self, instance_id):
@@ -30,10 +30,16 @@ class OpenFlowSwitchMixin(object):
     Mixin to provide a convenient way to use OpenFlow messages synchronously
     """
 
+    _ofctl_app = None
+
     def __init__(self, ryu_app):
-        app_mgr = app_manager.AppManager.get_instance()
-        self.ofctl_app = app_mgr.instantiate(service.OfctlService)
-        self.ofctl_app.start()
+        # Ryu allows a single instance of an app, share it between users
+        if OpenFlowSwitchMixin._ofctl_app is None:
+            app_mgr = app_manager.AppManager.get_instance()
+            ofctl_app = app_mgr.instantiate(service.OfctlService)
+            ofctl_app.start()
+            OpenFlowSwitchMixin._ofctl_app = ofctl_app
+        self.ofctl_app = OpenFlowSwitchMixin._ofctl_app
         self._app = ryu_app
 
     def _send_msg(self, msg, reply_cls=None, reply_multi=False):
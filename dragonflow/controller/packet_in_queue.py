@@ -0,0 +1,95 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import eventlet
+from eventlet import semaphore
+from oslo_log import log
+
+from dragonflow.common import metrics
+
+LOG = log.getLogger(__name__)
+
+
+class PacketInQueue(object):
+    '''A bounded queue of packet-in events, handled by a worker greenthread.
+
+    Events are handled by decreasing priority, and in order within a
+    priority. When the queue is full, the oldest event of the lowest
+    priority is dropped to make room for an event of a higher priority,
+    otherwise the new event is dropped.
+    '''
+
+    def __init__(self, size, handler):
+        self._size = size
+        self._handler = handler
+        self._events_by_priority = collections.defaultdict(collections.deque)
+        self._count = 0
+        self._available = semaphore.Semaphore(0)
+        self._worker = None
+        self.dropped = collections.Counter()
+
+    def __len__(self):
+        return self._count
+
+    def start(self):
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+
+    def _get_lowest_priority(self):
+        return min(priority
+                   for priority, events in self._events_by_priority.items()
+                   if events)
+
+    def _drop(self, event):
+        table_id = event.msg.table_id
+        self.dropped[table_id] += 1
+        metrics.observe(metrics.PACKET_IN_DROPPED, 1, table_id)
+
+    def put(self, event, priority=0):
+        '''Queue a packet-in event. Returns False if it was dropped.'''
+        if self._count >= self._size:
+            lowest_priority = self._get_lowest_priority()
+            if priority <= lowest_priority:
+                self._drop(event)
+                return False
+            # Replace the dropped event, the count is unchanged
+            self._drop(self._events_by_priority[lowest_priority].popleft())
+            self._events_by_priority[priority].append(event)
+            return True
+        self._events_by_priority[priority].append(event)
+        self._count += 1
+        self._available.release()
+        return True
+
+    def get(self):
+        '''Return the next event to handle, blocking until there is one'''
+        self._available.acquire()
+        priority = max(priority
+                       for priority, events in self._events_by_priority.items()
+                       if events)
+        self._count -= 1
+        return self._events_by_priority[priority].popleft()
+
+    def _run(self):
+        while True:
+            event = self.get()
+            try:
+                self._handler(event)
+            except Exception:
+                LOG.exception('Error handling packet-in %s', event.msg)
@@ -13,10 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import functools
+import threading
 import time
 
 from oslo_config import cfg
 from oslo_log import log
+from oslo_utils import excutils
 from ryu.controller import handler
 from ryu.controller import ofp_event
 from ryu.controller import ofp_handler
@@ -25,12 +29,41 @@ from ryu.ofproto import ofproto_parser
 from ryu.ofproto import ofproto_v1_3
 from ryu import utils
 
+from dragonflow.common import metrics
 from dragonflow.controller import dispatcher
+from dragonflow.controller import flow_store
+from dragonflow.controller import ofswitch
+from dragonflow.controller import packet_in_queue
 
 
 LOG = log.getLogger(__name__)
 
 
+def _parse_table_dict(option):
+    return {int(table_id): int(value)
+            for table_id, value in option.items()}
+
+
+class _MessageBatch(object):
+    """OpenFlow messages buffered while processing an event, and the
+    callbacks to call once the switch has processed them.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.callbacks = []
+        self.flow_mods = 0
+
+
+class _PendingBatch(object):
+    """A batch written to the switch, waiting for its barrier reply"""
+
+    def __init__(self, xids, callbacks):
+        self.xids = xids
+        self.callbacks = callbacks
+        self.errors = []
+
+
 class RyuDFAdapter(ofp_handler.OFPHandler):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
     OF_AUTO_PORT_DESC_STATS_REQ_VER = 0x04
@@ -47,6 +80,31 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
         self._datapath = None
         self.table_handlers = {}
         self.first_connect = True
+        self._batch_size = cfg.CONF.df_ryu.of_batch_size
+        # The open batch is per (green) thread, so that messages of an
+        # unrelated handler are not delayed
+        self._batches = threading.local()
+        # xid -> (message, pending batch), and barrier xid -> pending batch
+        self._pending_messages = {}
+        self._pending_barriers = {}
+        self._enable_reconciliation = cfg.CONF.df.enable_flow_reconciliation
+        # While not None, flow mods are applied to the flow store instead of
+        # being sent, until reconcile_flows is called
+        self._flow_store = None
+        self._switch = None
+        # table id -> meter id, of the tables whose packet-ins are metered
+        self._packet_in_meters = {}
+        # The flows sent to the tables whose meters are not confirmed yet,
+        # to meter them once they are
+        self._unmetered_flows = None
+        self._unmetered_tables = set()
+        self._packet_in_priorities = _parse_table_dict(
+            cfg.CONF.df_ryu.packet_in_priorities)
+        self._packet_in_queue = None
+        if cfg.CONF.df_ryu.packet_in_queue_size:
+            self._packet_in_queue = packet_in_queue.PacketInQueue(
+                cfg.CONF.df_ryu.packet_in_queue_size,
+                self._handle_packet_in)
 
     @property
     def datapath(self):
@@ -54,6 +112,10 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
 
     def start(self):
         super(RyuDFAdapter, self).start()
+        if self._enable_reconciliation:
+            self._switch = ofswitch.OpenFlowSwitchMixin(self)
+        if self._packet_in_queue is not None:
+            self._packet_in_queue.start()
         self.load(self, db_store=self.db_store,
                   vswitch_api=self.vswitch_api,
                   nb_api=self.nb_api,
@@ -77,6 +139,340 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
     def unregister_table_handler(self, table_id, handler):
         self.table_handlers.pop(table_id, None)
 
+    @contextlib.contextmanager
+    def batch(self, callback=None):
+        """Buffer the OpenFlow messages sent through send_msg in this
+        context, and write them to the switch together, followed by a
+        barrier. Nested batches are written with the outermost one.
+
+        If given, callback(errors) is called once the switch replied to the
+        barrier. errors is a list of (message, error message) pairs, for the
+        messages of the batch the switch failed to apply.
+        """
+        batch = getattr(self._batches, 'batch', None)
+        if batch is not None:
+            if callback is not None:
+                batch.callbacks.append(callback)
+            yield
+            return
+
+        batch = self._batches.batch = _MessageBatch()
+        if callback is not None:
+            batch.callbacks.append(callback)
+        try:
+            yield
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._batches.batch = None
+                # Send what the failed handler did, without hiding its
+                # exception
+                try:
+                    self._flush_batch(batch)
+                except Exception:
+                    LOG.exception('Failed to send the OpenFlow messages of '
+                                  'a failed batch')
+        else:
+            self._batches.batch = None
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        metrics.observe(metrics.FLOW_MODS_PER_EVENT, batch.flow_mods)
+        self._flush(batch.messages, batch.callbacks)
+
+    def send_msg(self, msg):
+        """Send an OpenFlow message, buffering it if in a batch"""
+        if (self._packet_in_meters and
+                getattr(msg, 'cls_msg_type', None) ==
+                msg.datapath.ofproto.OFPT_FLOW_MOD):
+            self._add_packet_in_meter(msg)
+        if (self._unmetered_flows is not None and
+                isinstance(msg, msg.datapath.ofproto_parser.OFPFlowMod) and
+                (msg.table_id in self._unmetered_tables or
+                 msg.table_id == msg.datapath.ofproto.OFPTT_ALL)):
+            self._unmetered_flows.apply(msg)
+
+        if (self._flow_store is not None and
+                isinstance(msg, msg.datapath.ofproto_parser.OFPFlowMod)):
+            self._flow_store.apply(msg)
+            if not self._is_sent_during_reconciliation(msg):
+                return
+
+        batch = getattr(self._batches, 'batch', None)
+        if (batch is not None and
+                getattr(msg, 'cls_msg_type', None) ==
+                msg.datapath.ofproto.OFPT_FLOW_MOD):
+            batch.flow_mods += 1
+
+        if batch is None or self._batch_size == 0:
+            msg.datapath.send_msg(msg)
+            return
+
+        batch.messages.append(msg)
+        if len(batch.messages) >= self._batch_size:
+            # Callbacks are called when the entire batch is processed
+            messages, batch.messages = batch.messages, []
+            self._flush(messages, [])
+
+    def _get_packet_in_meter_rates(self):
+        """Return the configured packet-in meter rate of each table handled
+        by the controller, as table id -> rate, omitting disabled meters
+        """
+        default_rate = cfg.CONF.df_ryu.packet_in_meter_rate
+        rates = _parse_table_dict(cfg.CONF.df_ryu.packet_in_meter_rates)
+        table_rates = {table_id: rates.get(table_id, default_rate)
+                       for table_id in self.table_handlers}
+        return {table_id: rate for table_id, rate in table_rates.items()
+                if rate}
+
+    def _send_meter_features_request(self):
+        """Request the meter features of the switch, if packet-in meters are
+        configured. The meters are installed when the switch replies.
+        """
+        table_rates = self._get_packet_in_meter_rates()
+        if not table_rates:
+            return
+        self._unmetered_flows = flow_store.FlowStore()
+        self._unmetered_tables = set(table_rates)
+        datapath = self.datapath
+        datapath.send_msg(
+            datapath.ofproto_parser.OFPMeterFeaturesStatsRequest(datapath))
+
+    @handler.set_ev_cls(ofp_event.EventOFPMeterFeaturesStatsReply,
+                        handler.MAIN_DISPATCHER)
+    def meter_features_stats_reply_handler(self, event):
+        ofproto = event.msg.datapath.ofproto
+        table_rates = self._get_packet_in_meter_rates()
+        if not table_rates:
+            return
+        features = event.msg.body[0] if event.msg.body else None
+        max_meter_id = max(table_rates) + 1
+        if (features is None or
+                features.max_meter < max_meter_id or
+                not features.band_types & (1 << ofproto.OFPMBT_DROP) or
+                not features.capabilities & ofproto.OFPMF_PKTPS):
+            LOG.warning('The switch does not support the packet-in meters '
+                        '(meter features: %s), packet-ins are not metered',
+                        features)
+            self._stop_tracking_unmetered_flows(table_rates)
+            return
+        self._install_packet_in_meters(table_rates, features.capabilities)
+
+    def _install_packet_in_meters(self, table_rates, capabilities):
+        """Install a meter limiting the packet-ins of each table handled by
+        the controller, with the configured rate.
+
+        The meters may remain from a previous connection, so they are
+        modified, and added if the switch does not know them. Flows are
+        metered from when their meter is installed.
+        """
+        datapath = self.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flags = ofproto.OFPMF_PKTPS
+        if capabilities & ofproto.OFPMF_BURST:
+            flags |= ofproto.OFPMF_BURST
+
+        meter_mods = {}
+        for table_id, rate in table_rates.items():
+            meter_mods[table_id] = parser.OFPMeterMod(
+                datapath, command=ofproto.OFPMC_MODIFY, flags=flags,
+                meter_id=table_id + 1,
+                bands=[parser.OFPMeterBandDrop(rate=rate, burst_size=rate)])
+
+        with self.batch(functools.partial(self._packet_in_meters_modified,
+                                          meter_mods)):
+            for meter_mod in meter_mods.values():
+                self.send_msg(meter_mod)
+
+    def _packet_in_meters_modified(self, meter_mods, errors):
+        failed = {id(msg): error for msg, error in errors}
+        meters = {}
+        added_meter_mods = {}
+        for table_id, meter_mod in meter_mods.items():
+            error = failed.get(id(meter_mod))
+            if error is None:
+                meters[table_id] = meter_mod.meter_id
+                continue
+            datapath = meter_mod.datapath
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            if (error.type == ofproto.OFPET_METER_MOD_FAILED and
+                    error.code == ofproto.OFPMMFC_UNKNOWN_METER):
+                added_meter_mods[table_id] = parser.OFPMeterMod(
+                    datapath, command=ofproto.OFPMC_ADD, flags=meter_mod.flags,
+                    meter_id=meter_mod.meter_id, bands=meter_mod.bands)
+        self._enable_packet_in_meters(meters)
+        self._stop_tracking_unmetered_flows(
+            set(meter_mods) - set(added_meter_mods))
+        if not added_meter_mods:
+            return
+
+        with self.batch(functools.partial(self._packet_in_meters_added,
+                                          added_meter_mods)):
+            for meter_mod in added_meter_mods.values():
+                self.send_msg(meter_mod)
+
+    def _packet_in_meters_added(self, meter_mods, errors):
+        failed = {id(msg) for msg, _error in errors}
+        self._enable_packet_in_meters({
+            table_id: meter_mod.meter_id
+            for table_id, meter_mod in meter_mods.items()
+            if id(meter_mod) not in failed})
+        self._stop_tracking_unmetered_flows(meter_mods)
+
+    def _enable_packet_in_meters(self, meters):
+        """Meter the packet-ins of each table in meters (table id -> meter
+        id), including those of the flows sent before the switch confirmed
+        the meter, which are modified to use it.
+        """
+        self._packet_in_meters.update(meters)
+        if self._unmetered_flows is None:
+            return
+        flows = [flow for flow in self._unmetered_flows.flows()
+                 if flow.table_id in meters and
+                 self._sends_to_controller(flow)]
+        self._stop_tracking_unmetered_flows(meters)
+        with self.batch():
+            for flow in flows:
+                datapath = flow.datapath
+                # Does nothing if the flow was removed since
+                self.send_msg(datapath.ofproto_parser.OFPFlowMod(
+                    datapath,
+                    cookie=flow.cookie,
+                    table_id=flow.table_id,
+                    command=datapath.ofproto.OFPFC_MODIFY_STRICT,
+                    priority=flow.priority,
+                    match=flow.match,
+                    instructions=list(flow.instructions),
+                ))
+
+    def _stop_tracking_unmetered_flows(self, table_ids):
+        self._unmetered_tables.difference_update(table_ids)
+        if not self._unmetered_tables:
+            self._unmetered_flows = None
+
+    @staticmethod
+    def _sends_to_controller(msg):
+        ofproto = msg.datapath.ofproto
+        parser = msg.datapath.ofproto_parser
+        return any(
+            isinstance(action, parser.OFPActionOutput) and
+            action.port == ofproto.OFPP_CONTROLLER
+            for inst in msg.instructions
+            if isinstance(inst, parser.OFPInstructionActions)
+            for action in inst.actions)
+
+    def _add_packet_in_meter(self, msg):
+        """Meter the flow if it sends packets to the controller from a table
+        with a packet-in meter
+        """
+        meter_id = self._packet_in_meters.get(msg.table_id)
+        if meter_id is None:
+            return
+        ofproto = msg.datapath.ofproto
+        parser = msg.datapath.ofproto_parser
+        if msg.command not in (ofproto.OFPFC_ADD, ofproto.OFPFC_MODIFY,
+                               ofproto.OFPFC_MODIFY_STRICT):
+            return
+
+        if any(isinstance(inst, parser.OFPInstructionMeter)
+               for inst in msg.instructions):
+            return
+        if self._sends_to_controller(msg):
+            msg.instructions = ([parser.OFPInstructionMeter(meter_id)] +
+                                list(msg.instructions))
+
+    def _flush(self, messages, callbacks):
+        if not messages and not callbacks:
+            return
+
+        datapath = self.datapath
+        if datapath is None:
+            LOG.warning('Dropping %d OpenFlow messages, the switch is not '
+                        'connected', len(messages))
+            return
+
+        pending = _PendingBatch([], callbacks)
+        bufs = []
+        for msg in messages:
+            datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+            pending.xids.append(msg.xid)
+            self._pending_messages[msg.xid] = (msg, pending)
+
+        barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+        datapath.set_xid(barrier)
+        barrier.serialize()
+        bufs.append(barrier.buf)
+        self._pending_barriers[barrier.xid] = pending
+
+        datapath.send(b''.join(bufs))
+
+    @staticmethod
+    def _is_sent_during_reconciliation(msg):
+        """Return True if a flow mod is sent to the switch even while flow
+        reconciliation is in progress: transient flows (with timeouts, or
+        releasing a buffered packet), which are not reconciled, and deletes,
+        which may remove transient flows. Deleted flows that are still
+        desired are added back by reconcile_flows.
+        """
+        ofproto = msg.datapath.ofproto
+        return bool(msg.idle_timeout or msg.hard_timeout or
+                    msg.buffer_id != ofproto.OFP_NO_BUFFER or
+                    msg.command in (ofproto.OFPFC_DELETE,
+                                    ofproto.OFPFC_DELETE_STRICT))
+
+    def reconcile_flows(self):
+        """Install the difference between the flows applied to the flow
+        store since the switch connected, and the flows installed on it.
+        Does nothing if flow reconciliation is not in progress.
+        """
+        store = self._flow_store
+        if store is None:
+            return
+
+        installed_flows = self._switch.dump_flows()
+        # Flow mods applied while dumping are included in the diff
+        self._flow_store = None
+        with self.batch():
+            for msg in store.diff(self.datapath, installed_flows):
+                self.send_msg(msg)
+
+    def cancel_reconciliation(self):
+        """Stop flow reconciliation, e.g. when the synchronization failed,
+        so that flow mods are not held back until a later synchronization
+        succeeds. The flows applied to the flow store are installed, and
+        no installed flows are deleted.
+        """
+        store = self._flow_store
+        if store is None:
+            return
+
+        LOG.warning('Flow reconciliation cancelled, installing %d flows',
+                    len(store))
+        self._flow_store = None
+        with self.batch():
+            for msg in store.flows():
+                self.send_msg(msg)
+
+    @handler.set_ev_cls(ofp_event.EventOFPBarrierReply,
+                        handler.MAIN_DISPATCHER)
+    def barrier_reply_handler(self, event):
+        pending = self._pending_barriers.pop(event.msg.xid, None)
+        if pending is None:
+            return
+
+        for xid in pending.xids:
+            self._pending_messages.pop(xid, None)
+
+        for callback in pending.callbacks:
+            try:
+                callback(pending.errors)
+            except Exception:
+                LOG.exception('Error in OpenFlow batch callback %s',
+                              callback)
+
     def notify_ovs_sync_finished(self):
         self.dispatcher.dispatch('ovs_sync_finished')
 
@@ -105,6 +501,13 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
     def switch_features_handler(self, ev):
         # TODO(oanson) is there a better way to get the datapath?
         self._datapath = ev.msg.datapath
+        # Barriers sent on a previous connection will not be replied
+        self._pending_messages = {}
+        self._pending_barriers = {}
+        if self._enable_reconciliation:
+            # All flows are now re-installed, and reconciled once the
+            # controller finished synchronizing
+            self._flow_store = flow_store.FlowStore()
         super(RyuDFAdapter, self).switch_features_handler(ev)
         version = self.datapath.ofproto.OFP_VERSION
         if version < RyuDFAdapter.OF_AUTO_PORT_DESC_STATS_REQ_VER:
@@ -113,7 +516,15 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
 
         self.get_sw_async_msg_config()
 
-        self.dispatcher.dispatch('switch_features_handler', ev)
+        # Meters of a previous connection are enabled again once the switch
+        # confirms they are installed
+        self._packet_in_meters = {}
+        self._unmetered_flows = None
+        self._unmetered_tables = set()
+        self._send_meter_features_request()
+
+        with self.batch():
+            self.dispatcher.dispatch('switch_features_handler', ev)
 
         if not self.first_connect:
             # For reconnecting to the ryu controller, df needs a full sync
@@ -135,11 +546,20 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
     @handler.set_ev_handler(ofp_event.EventOFPPacketIn,
                             handler.MAIN_DISPATCHER)
     def OF_packet_in_handler(self, event):
+        if self._packet_in_queue is not None:
+            self._packet_in_queue.put(
+                event,
+                self._packet_in_priorities.get(event.msg.table_id, 0))
+            return
+        self._handle_packet_in(event)
+
+    def _handle_packet_in(self, event):
         msg = event.msg
         table_id = msg.table_id
         if table_id in self.table_handlers:
             handler = self.table_handlers[table_id]
-            handler(event)
+            with metrics.timer(metrics.PACKET_IN, table_id):
+                handler(event)
         else:
             LOG.info("No handler for table id %(table)s with message "
                      "%(msg)", {'table': table_id, 'msg': msg})
@@ -148,6 +568,14 @@ class RyuDFAdapter(ofp_handler.OFPHandler):
                             handler.MAIN_DISPATCHER)
     def OF_error_msg_handler(self, event):
         msg = event.msg
+        pending_message, pending = self._pending_messages.pop(msg.xid,
+                                                              (None, None))
+        if pending is not None:
+            pending.errors.append((pending_message, msg))
+            LOG.error('OpenFlow message %(msg)s failed: %(error)s',
+                      {'msg': pending_message, 'error': msg})
+            return
+
         try:
             (version, msg_type, msg_len, xid) = ofproto_parser.header(msg.data)
             ryu_msg = ofproto_parser.msg(
@@ -15,18 +15,21 @@
 
 import collections
 import copy
+import functools
 
 import netaddr
 from neutron_lib import constants as n_const
 from oslo_log import log
 from ryu.ofproto import ether
 
+from dragonflow.controller.common import conntrack
 from dragonflow.controller.common import constants as const
 from dragonflow.controller.common import utils
 from dragonflow.controller import df_base_app
 from dragonflow.db.models import constants as model_constants
 from dragonflow.db.models import l2
 from dragonflow.db.models import secgroups as sg_model
+from dragonflow.utils import address_set
 
 
 LOG = log.getLogger(__name__)
@@ -44,6 +47,17 @@ DEST_FIELD_NAME_BY_PROTOCOL_NUMBER = {
 }
 
 
+def _batch_conntrack_deletes(func):
+    """Delete the conntrack entries of all the rules and ports affected by an
+    event at once, when the event handler returns.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.conntrack_flusher.batch():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 class SGApp(df_base_app.DFlowApp):
 
     def __init__(self, *args, **kwargs):
@@ -53,53 +67,12 @@ class SGApp(df_base_app.DFlowApp):
         self.remote_secgroup_ref = {}
         self.secgroup_associate_local_ports = {}
         self.secgroup_aggregate_addresses = collections.defaultdict(
-            netaddr.IPSet
+            address_set.AddressSet
         )
         self.secgroup_ip_refs = collections.defaultdict(set)
+        self.conntrack_flusher = conntrack.ConntrackFlusher()
         self.register_local_cookie_bits(COOKIE_NAME, 32)
 
-    @staticmethod
-    def _get_cidr_difference(cidr_set, new_cidr_set):
-        new_cidr_list = new_cidr_set.iter_cidrs()
-        old_cidr_list = cidr_set.iter_cidrs()
-
-        added_cidr = set(new_cidr_list) - set(old_cidr_list)
-        removed_cidr = set(old_cidr_list) - set(new_cidr_list)
-        return added_cidr, removed_cidr
-
-    @staticmethod
-    def _get_cidr_changes_after_removing_addresses(cidr_set, address_list):
-        """cidr_set - IPSet
-           address_list - IPAddress or string list
-        """
-        new_cidr_set = cidr_set - netaddr.IPSet(address_list)
-        added_cidr, removed_cidr = SGApp._get_cidr_difference(cidr_set,
-                                                              new_cidr_set)
-        return new_cidr_set, added_cidr, removed_cidr
-
-    @staticmethod
-    def _get_cidr_changes_after_adding_addresses(cidr_set, address_list):
-        """cidr_set - IPSet
-           address_list - IPAddress or string list
-        """
-        new_cidr_set = cidr_set | netaddr.IPSet(address_list)
-        added_cidr, removed_cidr = SGApp._get_cidr_difference(cidr_set,
-                                                              new_cidr_set)
-        return new_cidr_set, added_cidr, removed_cidr
-
-    @staticmethod
-    def _get_cidr_changes_after_updating_addresses(cidr_set, addresses_to_add,
-                                                   addresses_to_remove):
-        """cidr_set - IPSet
-           addresses_to_add - IPAddress or string list
-           addresses_to_remove - IPAddress or string list
-        """
-        new_cidr_set = ((cidr_set | netaddr.IPSet(addresses_to_add)) -
-                        (netaddr.IPSet(addresses_to_remove)))
-        added_cidr, removed_cidr = SGApp._get_cidr_difference(cidr_set,
-                                                              new_cidr_set)
-        return new_cidr_set, added_cidr, removed_cidr
-
     @staticmethod
     def _get_network_and_mask(cidr):
         result = netaddr.IPNetwork(cidr)
@@ -797,12 +770,7 @@ class SGApp(df_base_app.DFlowApp):
         # with this security group.
         addresses = self.secgroup_aggregate_addresses[secgroup_id]
         added_ips = self._get_lport_added_ips_for_secgroup(secgroup_id, lport)
-        new_cidr_set, added_cidr, removed_cidr = \
-            SGApp._get_cidr_changes_after_adding_addresses(
-                addresses,
-                added_ips,
-            )
-        self.secgroup_aggregate_addresses[secgroup_id] = new_cidr_set
+        added_cidr, removed_cidr = addresses.add(added_ips)
 
         # update the flows representing those rules each of which specifies
         #  this security group as its parameter
@@ -824,15 +792,10 @@ class SGApp(df_base_app.DFlowApp):
         if aggregate_addresses_range:
             removed_ips = self._get_lport_removed_ips_for_secgroup(
                 secgroup_id, lport)
-            new_cidr_set, added_cidr, removed_cidr = \
-                SGApp._get_cidr_changes_after_removing_addresses(
-                    aggregate_addresses_range,
-                    removed_ips,
-                )
-            if not new_cidr_set:
+            added_cidr, removed_cidr = \
+                aggregate_addresses_range.remove(removed_ips)
+            if not aggregate_addresses_range:
                 del self.secgroup_aggregate_addresses[secgroup_id]
-            else:
-                self.secgroup_aggregate_addresses[secgroup_id] = new_cidr_set
 
             # update the flows representing those rules each of which
             # specifies this security group as its
@@ -904,16 +867,12 @@ class SGApp(df_base_app.DFlowApp):
         added_ips, removed_ips = self._get_lport_updated_ips_for_secgroup(
             secgroup_id, lport, original_lport
         )
-        new_cidr_array, added_cidr, removed_cidr = \
-            self._get_cidr_changes_after_updating_addresses(
-                aggregate_addresses_range,
-                added_ips,
-                removed_ips
-            )
-        if len(new_cidr_array) == 0:
+        added_cidr, removed_cidr = aggregate_addresses_range.update(
+            added_ips,
+            removed_ips
+        )
+        if not aggregate_addresses_range:
             self.secgroup_aggregate_addresses.pop(secgroup_id, None)
-        else:
-            self.secgroup_aggregate_addresses[secgroup_id] = new_cidr_array
 
         # update the flows representing those rules each of which
         # specifies this security group as its
@@ -951,6 +910,7 @@ class SGApp(df_base_app.DFlowApp):
         return added_secgroups, removed_secgroups, unchanged_secgroups
 
     @df_base_app.register_event(l2.LogicalPort, l2.EVENT_LOCAL_DELETED)
+    @_batch_conntrack_deletes
     def _remove_local_port(self, lport):
         secgroups = lport.security_groups
         if not secgroups:
@@ -963,6 +923,7 @@ class SGApp(df_base_app.DFlowApp):
             self._remove_local_port_associating(lport, secgroup.id)
 
     @df_base_app.register_event(l2.LogicalPort, l2.EVENT_REMOTE_DELETED)
+    @_batch_conntrack_deletes
     def _remove_remote_port(self, lport):
         secgroups = lport.security_groups
         if not secgroups:
@@ -972,6 +933,7 @@ class SGApp(df_base_app.DFlowApp):
             self._remove_remote_port_associating(lport, secgroup.id)
 
     @df_base_app.register_event(l2.LogicalPort, l2.EVENT_LOCAL_UPDATED)
+    @_batch_conntrack_deletes
     def update_local_port(self, lport, original_lport):
         secgroups = lport.security_groups
         original_secgroups = original_lport.security_groups
@@ -1002,6 +964,7 @@ class SGApp(df_base_app.DFlowApp):
             self._install_connection_track_flows(lport)
 
     @df_base_app.register_event(l2.LogicalPort, l2.EVENT_REMOTE_UPDATED)
+    @_batch_conntrack_deletes
     def _update_remote_port(self, lport, original_lport):
         secgroups = lport.security_groups
         original_secgroups = original_lport.security_groups
@@ -1052,6 +1015,7 @@ class SGApp(df_base_app.DFlowApp):
 
     @df_base_app.register_event(sg_model.SecurityGroup,
                                 model_constants.EVENT_UPDATED)
+    @_batch_conntrack_deletes
     def update_security_group(self, new_secgroup, old_secgroup):
         new_secgroup_rules = copy.copy(new_secgroup.rules)
         old_secgroup_rules = copy.copy(old_secgroup.rules)
@@ -1091,6 +1055,7 @@ class SGApp(df_base_app.DFlowApp):
 
     @df_base_app.register_event(sg_model.SecurityGroupRule,
                                 model_constants.EVENT_DELETED)
+    @_batch_conntrack_deletes
     def remove_security_group_rule(self, secgroup, secgroup_rule):
         secgroup_id = secgroup.id
         if self._is_sg_not_associated_with_local_port(secgroup_id):
@@ -1142,10 +1107,10 @@ class SGApp(df_base_app.DFlowApp):
                     for remote_address in remote_address_list:
                         entries_filter_tmp = entries_filter.copy()
                         entries_filter_tmp[remote_match_mark] = remote_address
-                        utils.delete_conntrack_entries_by_filter(
+                        self.conntrack_flusher.delete_entries(
                             **entries_filter_tmp)
                 else:
-                    utils.delete_conntrack_entries_by_filter(**entries_filter)
+                    self.conntrack_flusher.delete_entries(**entries_filter)
 
     def _delete_conntrack_entries_by_rule(self, rule, filter_port_info=None,
                                           filter_remote_addresses=None):
@@ -14,21 +14,33 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
+import itertools
 import time
+
 from eventlet import queue
 from jsonmodels import errors
 from oslo_config import cfg
 from oslo_log import log
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
+from oslo_utils import timeutils
 
 import dragonflow.common.exceptions as df_exceptions
+from dragonflow.common import metrics
+from dragonflow.common import tracing
 from dragonflow.common import utils as df_utils
 from dragonflow.db import db_common
+from dragonflow.db import db_store2
+from dragonflow.db import event_queue
 from dragonflow.db import model_framework as mf
+from dragonflow.db import model_serializer
 from dragonflow.db import model_proxy as mproxy
 from dragonflow.db import models as db_models
+from dragonflow.db import pub_sub_api
 from dragonflow.db.models import core
+from dragonflow.db.models import l2
 
 
 LOG = log.getLogger(__name__)
@@ -40,6 +52,9 @@ DB_ACTION_LIST = ['create', 'set', 'delete', 'log',
 
 _nb_api = None
 
+DB_GENERATIONS_TABLE = 'df_generations'
+DB_CHANGELOG_TABLE_PREFIX = 'df_changelog_'
+
 
 def _get_topic(obj):
     try:
@@ -48,13 +63,93 @@ def _get_topic(obj):
         return None
 
 
+def _is_model_update(update):
+    return (update.table is not None and update.key is not None and
+            update.action in ('create', 'set', 'delete'))
+
+
+def _merge_db_updates(older, newer):
+    """Merge two updates of the same object, keeping only the newest state.
+    Returns None if the updates cancel each other out.
+    """
+    if older.action == 'create':
+        if newer.action == 'delete':
+            # The object was created and removed within the same batch, the
+            # controller never has to know about it.
+            return None
+        newer.action = 'create'
+    return newer
+
+
+def _get_model_order(update, model_order):
+    try:
+        model = mf.get_model(update.table)
+    except KeyError:
+        return len(model_order)
+    return model_order.get(model, len(model_order))
+
+
+def coalesce_db_updates(updates):
+    """Coalesce a batch of DB updates.
+
+    Updates of the same (table, key) are merged so that only the newest
+    version survives, and a delete that follows a create cancels both.
+    Within each run of consecutive created/updated objects, objects appear
+    after their dependencies, and within each run of consecutive deleted
+    objects, they appear before them. Deletes and upserts are never moved
+    across each other, e.g. an address deleted from one port stays free when
+    a later port is created with it.
+
+    Any other update (e.g. sync, dbrestart, log) acts as a barrier: updates
+    are never moved across it.
+    """
+    model_order = {
+        model: i
+        for i, model in enumerate(mf.iter_models_by_dependency_order())
+    }
+    result = []
+    pending = collections.OrderedDict()
+
+    def flush_pending():
+        for is_delete, run in itertools.groupby(
+                pending.values(), key=lambda u: u.action == 'delete'):
+            if is_delete:
+                result.extend(sorted(
+                    run, key=lambda u: -_get_model_order(u, model_order)))
+            else:
+                result.extend(sorted(
+                    run, key=lambda u: _get_model_order(u, model_order)))
+        pending.clear()
+
+    for update in updates:
+        if not _is_model_update(update):
+            flush_pending()
+            result.append(update)
+            continue
+
+        obj_key = (update.table, update.key)
+        older = pending.pop(obj_key, None)
+        if older is not None:
+            update = _merge_db_updates(older, update)
+        if update is not None:
+            pending[obj_key] = update
+
+    flush_pending()
+    return result
+
+
 class NbApi(object):
 
     def __init__(self, db_driver, use_pubsub=False, is_neutron_server=False):
         super(NbApi, self).__init__()
         self.driver = db_driver
         self.controller = None
-        self._queue = queue.PriorityQueue()
+        if cfg.CONF.df.enable_event_queue_lanes:
+            self._queue = event_queue.LanedQueue(
+                cfg.CONF.df.event_queue_local_lane_weight,
+                cfg.CONF.df.event_queue_topic_quantum)
+        else:
+            self._queue = queue.PriorityQueue()
         self.use_pubsub = use_pubsub
         self.publisher = None
         self.subscriber = None
@@ -66,6 +161,15 @@ class NbApi(object):
         if self.is_neutron_server:
             # multiproc pub/sub is only supported in neutron server
             self.pub_sub_use_multiproc = cfg.CONF.df.pub_sub_use_multiproc
+        self.enable_update_coalescing = \
+            cfg.CONF.df.enable_db_update_coalescing
+        self.update_coalescing_batch_size = \
+            cfg.CONF.df.db_update_coalescing_batch_size
+        self.enable_changelog = cfg.CONF.df.enable_db_changelog
+        self.changelog_size = cfg.CONF.df.db_changelog_size
+        self.serializer = cfg.CONF.df.nb_db_serializer
+        self.enable_publisher_sharding = \
+            cfg.CONF.df.enable_publisher_sharding
 
     @staticmethod
     def get_instance(is_neutron_server):
@@ -129,6 +233,16 @@ class NbApi(object):
             self.db_consistency_manager.process(direct=True)
 
     def _get_publisher(self):
+        if self.is_neutron_server and self.enable_publisher_sharding:
+            # Events are relayed to the publisher services owning their
+            # topics, over the inter-process driver
+            pub_sub_driver = pub_sub_api.load_relay_driver()
+            return pub_sub_api.ShardedPublisherAgent(
+                pub_sub_driver.get_relay_publisher,
+                functools.partial(self.get_all, core.Publisher),
+                cfg.CONF.df.monitor_table_poll_time,
+            )
+
         if self.pub_sub_use_multiproc:
             pubsub_driver_name = cfg.CONF.df.pub_sub_multiproc_driver
         else:
@@ -142,16 +256,23 @@ class NbApi(object):
         pub_sub_driver = df_utils.load_driver(
             cfg.CONF.df.pub_sub_driver,
             df_utils.DF_PUBSUB_DRIVER_NAMESPACE)
-        return pub_sub_driver.get_subscriber()
+        subscriber = pub_sub_driver.get_subscriber()
+        if not self.is_neutron_server and self.enable_publisher_sharding:
+            subscriber = pub_sub_api.ShardedSubscriber(subscriber)
+        return subscriber
 
     def _start_subscriber(self):
         self.subscriber.initialize(self.db_change_callback)
         self.subscriber.register_topic(db_common.SEND_ALL_TOPIC)
-        publishers_ips = cfg.CONF.df.publishers_ips
-        uris = {'%s://%s:%s' % (
-                cfg.CONF.df.publisher_transport,
-                ip,
-                cfg.CONF.df.publisher_port) for ip in publishers_ips}
+        uris = set()
+        # With sharding, all nodes must see the same set of publishers, so
+        # only those in the publisher table are used
+        if not self.enable_publisher_sharding:
+            uris = {'%s://%s:%s' % (
+                    cfg.CONF.df.publisher_transport,
+                    ip,
+                    cfg.CONF.df.publisher_port)
+                    for ip in cfg.CONF.df.publishers_ips}
         publishers = self.get_all(core.Publisher)
         uris |= {publisher.uri for publisher in publishers}
         for uri in uris:
@@ -163,13 +284,20 @@ class NbApi(object):
             return True
         return self.driver.support_publish_subscribe()
 
+    def _get_db_change_event(self, table, key, action, value, topic):
+        if not self.enable_selective_topo_dist or topic is None:
+            topic = db_common.SEND_ALL_TOPIC
+        trace_id = tracing.get_trace_id()
+        if trace_id is not None:
+            tracing.record(tracing.NB_WRITE, trace_id, table, key)
+        return db_common.DbUpdate(table, key, action, value, topic=topic,
+                                  trace_id=trace_id)
+
     def _send_db_change_event(self, table, key, action, value, topic):
         if not self.use_pubsub:
             return
 
-        if not self.enable_selective_topo_dist or topic is None:
-            topic = db_common.SEND_ALL_TOPIC
-        update = db_common.DbUpdate(table, key, action, value, topic=topic)
+        update = self._get_db_change_event(table, key, action, value, topic)
         self.publisher.send_event(update)
         time.sleep(0)
 
@@ -200,37 +328,102 @@ class NbApi(object):
         self.subscriber.register_topic(topic)
         self.subscriber.daemonize()
 
-    def db_change_callback(self, table, key, action, value, topic=None):
-        update = db_common.DbUpdate(table, key, action, value, topic=topic)
+    def db_change_callback(self, table, key, action, value, topic=None,
+                           trace_id=None):
+        if trace_id is not None:
+            tracing.record(tracing.RECEIVED, trace_id, table, key)
+        update = db_common.DbUpdate(table, key, action, value, topic=topic,
+                                    trace_id=trace_id)
         LOG.debug("Pushing Update to Queue: %s", update)
         self._queue.put(update)
         time.sleep(0)
 
+    def get_queue_stats(self):
+        """Return the depth, and wait times in seconds, of each lane of the
+        event queue. Without lanes, only the depth of the queue is known.
+        """
+        if isinstance(self._queue, event_queue.LanedQueue):
+            return self._queue.get_stats()
+        return {'default': {'depth': self._queue.qsize()}}
+
     def _read_db_changes_from_queue(self):
         sync_rate_limiter = df_utils.RateLimiter(
             max_rate=1, time_unit=db_common.DB_SYNC_MINIMUM_INTERVAL)
         while True:
-            self.next_update = self._queue.get(block=True)
-            LOG.debug("Event update: %s", self.next_update)
-            try:
-                value = self.next_update.value
-                if (not value and
-                        self.next_update.action not in {'delete', 'log',
-                                                        'dbrestart'}):
-                    if self.next_update.table and self.next_update.key:
-                        value = self.driver.get_key(self.next_update.table,
-                                                    self.next_update.key)
+            if self.enable_update_coalescing:
+                updates = self._drain_queue()
+                batch = coalesce_db_updates(updates)
+                LOG.debug("Coalesced %(total)d updates into %(batch)d",
+                          {'total': len(updates), 'batch': len(batch)})
+            else:
+                updates = batch = (self._queue.get(block=True),)
+            if metrics.is_enabled():
+                self._observe_queue_wait(updates)
+            for update in batch:
+                self._process_db_update(update, sync_rate_limiter)
+            for _update in updates:
+                self._queue.task_done()
 
+    @staticmethod
+    def _observe_queue_wait(updates):
+        now = timeutils.utcnow()
+        for update in updates:
+            metrics.observe(metrics.QUEUE_WAIT,
+                            timeutils.delta_seconds(update.timestamp, now))
+
+    def _drain_queue(self):
+        """Block until an update is available, then take up to
+        update_coalescing_batch_size updates that are already queued.
+        """
+        updates = [self._queue.get(block=True)]
+        while len(updates) < self.update_coalescing_batch_size:
+            try:
+                updates.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return updates
+
+    def _process_db_update(self, update, sync_rate_limiter):
+        self.next_update = update
+        LOG.debug("Event update: %s", self.next_update)
+        try:
+            value = self.next_update.value
+            if (not value and
+                    self.next_update.action not in {'delete', 'log',
+                                                    'dbrestart'}):
+                if self.next_update.table and self.next_update.key:
+                    value = self.driver.get_key(self.next_update.table,
+                                                self.next_update.key)
+
+            with tracing.trace(self.next_update.trace_id):
+                was_local = self._is_traced_local_lport(self.next_update)
                 self.apply_db_change(self.next_update.table,
                                      self.next_update.key,
                                      self.next_update.action,
                                      value)
-            except Exception as e:
-                if "ofport is 0" not in e.message:
-                    LOG.exception(e)
-                if not sync_rate_limiter():
-                    self.apply_db_change(None, None, 'sync', None)
-            self._queue.task_done()
+                tracing.record(tracing.APPLIED, table=self.next_update.table,
+                               key=self.next_update.key)
+                if (not was_local and
+                        self._is_traced_local_lport(self.next_update)):
+                    tracing.record(tracing.LOCAL_CREATED,
+                                   table=self.next_update.table,
+                                   key=self.next_update.key)
+        except Exception as e:
+            if "ofport is 0" not in e.message:
+                LOG.exception(e)
+            if not sync_rate_limiter():
+                self.apply_db_change(None, None, 'sync', None)
+
+    @staticmethod
+    def _is_traced_local_lport(update):
+        """Return True if update is traced, and is of a logical port the
+        controller handles as local
+        """
+        if (update.trace_id is None or
+                update.table != l2.LogicalPort.table_name):
+            return False
+        lport = db_store2.get_instance().get_one(l2.LogicalPort(id=update.key))
+        return bool(lport is not None and getattr(lport, 'is_local', None))
 
     def apply_db_change(self, table, key, action, value):
         # determine if the action is allowed or not
@@ -272,8 +465,13 @@ class NbApi(object):
             else:
                 if action == 'delete':
                     self.controller.delete_by_id(model_class, key)
+                elif issubclass(model_class, mf.ModelBase):
+                    self.controller.update_from_envelope(
+                        model_serializer.deserialize_envelope(model_class,
+                                                              value))
                 else:
-                    obj = model_class.from_json(value)
+                    with metrics.timer(metrics.DECODE, table):
+                        obj = model_class.from_json(value)
                     self.controller.update(obj)
 
     # lport process for VM migration
@@ -399,13 +597,17 @@ class NbApi(object):
         """
         model = type(obj)
         obj.on_create_pre()
-        serialized_obj = obj.to_json()
+        serialized_obj = model_serializer.serialize(obj, self.serializer)
         topic = _get_topic(obj)
         self.driver.create_key(model.table_name, obj.id,
                                serialized_obj, topic)
+        self._record_change(model.table_name, obj.id, 'create', topic)
         if not skip_send_event:
-            self._send_db_change_event(model.table_name, obj.id, 'create',
-                                       serialized_obj, topic)
+            self._send_db_change_event(
+                model.table_name, obj.id, 'create',
+                model_serializer.to_event_value(obj, serialized_obj,
+                                                self.serializer),
+                topic)
 
     def update(self, obj, skip_send_event=False):
         """Update the provided object in the database and publish an event
@@ -427,14 +629,19 @@ class NbApi(object):
             return
 
         full_obj.on_update_pre()
-        serialized_obj = full_obj.to_json()
+        serialized_obj = model_serializer.serialize(full_obj,
+                                                    self.serializer)
         topic = _get_topic(full_obj)
 
         self.driver.set_key(model.table_name, full_obj.id,
                             serialized_obj, topic)
+        self._record_change(model.table_name, full_obj.id, 'set', topic)
         if not skip_send_event:
-            self._send_db_change_event(model.table_name, full_obj.id, 'set',
-                                       serialized_obj, topic)
+            self._send_db_change_event(
+                model.table_name, full_obj.id, 'set',
+                model_serializer.to_event_value(full_obj, serialized_obj,
+                                                self.serializer),
+                topic)
 
     def delete(self, obj, skip_send_event=False):
         """Delete the provided object from the database and publish the event
@@ -454,17 +661,20 @@ class NbApi(object):
                     'Could not find object %(id)s to delete in %(table)s',
                     extra={'id': id, 'table': model.table_name})
 
+        self._record_change(model.table_name, obj.id, 'delete', topic)
         if not skip_send_event:
             self._send_db_change_event(model.table_name, obj.id, 'delete',
                                        obj.id, topic)
 
-    def get(self, lean_obj):
+    def get(self, lean_obj, lazy=False):
         """Retrieve a model instance from the database. This function uses
            lean_obj to deduce ID and model type
 
            >>> nb_api.get(Chassis(id="one"))
            Chassis(id="One", ip="192.168.121.22", tunnel_types=["vxlan"])
 
+           If lazy is True, an envelope that instantiates the model on demand
+           is returned (see model_framework.ModelEnvelope).
         """
         if mproxy.is_model_proxy(lean_obj):
             lean_obj = lean_obj.get_proxied_model()(id=lean_obj.id)
@@ -480,12 +690,98 @@ class NbApi(object):
                 'Could not get object %(id)s from table %(table)s',
                 extra={'id': id, 'table': model.table_name})
         else:
-            return model.from_json(serialized_obj)
+            if lazy:
+                return model_serializer.deserialize_envelope(model,
+                                                             serialized_obj)
+            return model_serializer.deserialize(model, serialized_obj)
 
-    def get_all(self, model, topic=None):
+    def get_all(self, model, topic=None, lazy=False):
         """Get all instances of provided model, can be limited to instances
            with a specific topic.
+
+           If lazy is True, envelopes that instantiate the model on demand are
+           returned (see model_framework.ModelEnvelope).
         """
         all_values = self.driver.get_all_entries(model.table_name, topic)
-        all_objects = [model.from_json(e) for e in all_values]
+        if lazy:
+            all_objects = [model_serializer.deserialize_envelope(model, e)
+                           for e in all_values]
+        else:
+            all_objects = [model_serializer.deserialize(model, e)
+                           for e in all_values]
         return model.on_get_all_post(all_objects)
+
+    def _record_change(self, table, key, action, topic):
+        """Stamp a write to the given table with the next generation of the
+        table, and record it in the table's change log.
+
+        The change log is bounded to db_changelog_size entries: recording
+        generation N drops generation N - db_changelog_size.
+        """
+        if not self.enable_changelog:
+            return
+
+        changelog_table = DB_CHANGELOG_TABLE_PREFIX + table
+        generation = self.driver.allocate_unique_key(changelog_table)
+        if generation is None:
+            LOG.warning('Could not allocate a generation for %s', table)
+            return
+        change = jsonutils.dumps({'key': key, 'action': action,
+                                  'topic': topic})
+        self.driver.create_key(changelog_table, str(generation), change)
+        # Writers record their generations concurrently, so an older one
+        # must not overwrite a newer one. The drivers have no
+        # compare-and-set, so a newer generation may still be overwritten
+        # in between, which get_changes_since tolerates.
+        if self._get_generation(table) < generation:
+            self.driver.set_key(DB_GENERATIONS_TABLE, table, str(generation))
+
+        expired_generation = generation - self.changelog_size
+        if expired_generation > 0:
+            try:
+                self.driver.delete_key(changelog_table,
+                                       str(expired_generation))
+            except df_exceptions.DBKeyNotFound:
+                pass
+
+    def get_generation(self, model):
+        """Return the last generation recorded for the model's table, or 0
+        if nothing was recorded yet.
+        """
+        return self._get_generation(model.table_name)
+
+    def _get_generation(self, table):
+        try:
+            return int(self.driver.get_key(DB_GENERATIONS_TABLE, table))
+        except df_exceptions.DBKeyNotFound:
+            return 0
+
+    def get_changes_since(self, model, generation):
+        """Return the changes made to the model's table after the given
+        generation, as a tuple of the current generation and a list of
+        dicts with the key, action, topic and generation of each change.
+
+        Returns None if the changes cannot be reconstructed from the change
+        log (it was truncated, a write is still in flight, or the generation
+        is newer than the table's), in which case the caller should pull the
+        full table.
+        """
+        changelog_table = DB_CHANGELOG_TABLE_PREFIX + model.table_name
+        current = self.get_generation(model)
+        if current < generation:
+            # The recorded generation may lag behind a concurrent writer. The
+            # given generation is valid if it is still in the change log.
+            if self.driver.batch_get_keys(
+                    [(changelog_table, str(generation), None)]) == [None]:
+                return None
+            return generation, []
+        if current - generation > self.changelog_size:
+            return None
+
+        generations = range(generation + 1, current + 1)
+        changes = self.driver.batch_get_keys(
+            (changelog_table, str(gen), None) for gen in generations)
+        if any(change is None for change in changes):
+            return None
+        return current, [dict(jsonutils.loads(change), generation=gen)
+                         for gen, change in zip(generations, changes)]
@@ -14,6 +14,8 @@ import abc
 
 import six
 
+from dragonflow.common import exceptions as df_exceptions
+
 
 @six.add_metaclass(abc.ABCMeta)
 class DbApi(object):
@@ -119,6 +121,41 @@ class DbApi(object):
         :raises DragonflowException.DBKeyNotFound: if key not found
         """
 
+    def batch_get_keys(self, requests):
+        """Get the values of several keys, possibly of different tables.
+           Drivers may override this to read all the keys in as few round
+           trips as possible. By default, keys are read one by one.
+
+        :param requests:   the keys to read
+        :type requests:    iterable of (table, key, topic) tuples
+        :returns:          list of values, in the order of the requests. The
+                           value of a key that is not found is None
+        """
+        values = []
+        for table, key, topic in requests:
+            try:
+                values.append(self.get_key(table, key, topic))
+            except df_exceptions.DBKeyNotFound:
+                values.append(None)
+        return values
+
+    def watch_table(self, table, callback):
+        """Start notifying the changes of a table, e.g. from the change
+           stream of the DB. Drivers able to watch tables override this. By
+           default, tables cannot be watched, and have to be polled.
+
+        :param table:      table name
+        :type table:       string
+        :param callback:   called for every change of the table, as
+                           callback(action, key, value), where action is
+                           'set' or 'delete' (value is None for deletes).
+                           action 'sync' (key and value are None) means
+                           changes may have been lost, and the table should
+                           be read again.
+        :returns:          True if the table is watched, False otherwise
+        """
+        return False
+
     @abc.abstractmethod
     def get_all_entries(self, table, topic=None):
         """Returns a list of all table entries values
@@ -25,7 +25,7 @@ class DbUpdate(object):
     and process a request to update a DB entry.
     """
     def __init__(self, table, key, action, value, timestamp=None,
-                 topic=SEND_ALL_TOPIC):
+                 topic=SEND_ALL_TOPIC, trace_id=None):
         if timestamp is None:
             timestamp = timeutils.utcnow()
         self.timestamp = timestamp
@@ -34,6 +34,7 @@ class DbUpdate(object):
         self.table = table
         self.value = value
         self.topic = topic
+        self.trace_id = trace_id
 
     def to_dict(self):
         update = {
@@ -43,6 +44,8 @@ class DbUpdate(object):
                 'value': self.value,
                 'topic': self.topic
         }
+        if self.trace_id is not None:
+            update['trace_id'] = self.trace_id
         return update
 
     def __str__(self):
@@ -12,8 +12,10 @@
 import collections
 import itertools
 import threading
+import weakref
 
 from dragonflow._i18n import _
+from dragonflow.db import model_compact
 from dragonflow.utils import radix_tree
 
 
@@ -40,8 +42,9 @@ class _IndexCache(object):
         self._tree = radix_tree.RadixTree(len(index))
 
         # We save ID->keys mapping for updating (object might have changed)
-        # and deletion (object might contain just the ID)
-        self._keys = collections.defaultdict(set)
+        # and deletion (object might contain just the ID). Keys are kept in
+        # tuples, which are considerably smaller than sets.
+        self._keys = {}
 
     def delete(self, obj):
         keys = self._keys.pop(obj.id)
@@ -51,7 +54,7 @@ class _IndexCache(object):
 
     def update(self, obj):
         new_keys = set(self._get_keys(obj))
-        old_keys = self._keys.get(obj.id, set())
+        old_keys = set(self._keys.get(obj.id, ()))
 
         # Re-insert into cache only if key changed
         added_keys = new_keys - old_keys
@@ -63,7 +66,7 @@ class _IndexCache(object):
         for key in deleted_keys:
             self._tree.delete(key, obj.id)
 
-        self._keys[obj.id] = new_keys
+        self._keys[obj.id] = tuple(new_keys)
 
     def get_all(self, obj):
         for key in self._get_keys(obj):
@@ -113,11 +116,20 @@ class _ModelCache(object):
     quick querying.
     '''
 
-    def __init__(self, model):
+    def __init__(self, model, compact=False):
         self._objs = {}
         self._indexes = {}
         self._id_index = model.get_index('id')
 
+        # In compact mode, _objs holds compact instances. Materialized objects
+        # are kept only while referenced elsewhere, so repeated lookups of an
+        # object in use return the same instance.
+        self._compact_model = None
+        self._materialized = None
+        if compact:
+            self._compact_model = model_compact.create_compact_model(model)
+            self._materialized = weakref.WeakValueDictionary()
+
         indexes = model.get_indexes()
         for index in indexes.values():
             if index == self._id_index:
@@ -126,22 +138,40 @@ class _ModelCache(object):
             self._indexes[index] = _IndexCache(index)
 
     def _get_by_id(self, obj_id):
-        return self._objs[obj_id]
+        obj = self._objs[obj_id]
+        if self._compact_model is None:
+            return obj
+
+        materialized = self._materialized.get(obj_id)
+        if materialized is None:
+            materialized = obj.materialize()
+            self._materialized[obj_id] = materialized
+        return materialized
 
     def delete(self, obj):
         for index in self._indexes.values():
             index.delete(obj)
 
         del self._objs[obj.id]
+        if self._compact_model is not None:
+            self._materialized.pop(obj.id, None)
 
     def update(self, obj):
         for index in self._indexes.values():
             index.update(obj)
 
-        old_obj = self._objs.get(obj.id)
+        if self._compact_model is None:
+            old_obj = self._objs.get(obj.id)
+        else:
+            old_obj = self._materialized.pop(obj.id, None)
         if old_obj:
             old_obj._is_object_stale = True
-        self._objs[obj.id] = obj
+
+        if self._compact_model is None:
+            self._objs[obj.id] = obj
+        else:
+            self._objs[obj.id] = self._compact_model(obj)
+            self._materialized[obj.id] = obj
 
     def get_one(self, obj, index):
         if index not in (None, self._id_index):
@@ -180,6 +210,7 @@ def _obj_key(obj):
 class DbStore2(object):
     def __init__(self):
         self._cache = {}
+        self._compact = False
 
         self._obj_to_embedded = collections.defaultdict(set)
         self._embedded_refs = collections.defaultdict(set)
@@ -188,10 +219,20 @@ class DbStore2(object):
         try:
             return self._cache[model]
         except KeyError:
-            cache = _ModelCache(model)
+            cache = _ModelCache(
+                model,
+                compact=self._compact and model.is_first_class(),
+            )
             self._cache[model] = cache
             return cache
 
+    def enable_compact_storage(self):
+        """Store instances of first-class models in compact form (see
+           model_compact), materializing full instances on retrieval. Only
+           affects models that were not cached yet.
+        """
+        self._compact = True
+
     def get_one(self, obj, index=None):
         """Retrieve an object from cache by ID or by a provided index. If
            several objects match the query, an ValueError is raised.
@@ -278,11 +319,15 @@ class DbStore2(object):
             new_embedded.add(embedded_key)
             self._embedded_refs[embedded_key].add(obj_key)
 
-        old_embedded = self._obj_to_embedded[obj_key]
+        old_embedded = self._obj_to_embedded.get(obj_key, set())
         for embedded_key in (old_embedded - new_embedded):
             self._delete_embedded(obj, embedded_key)
 
-        self._obj_to_embedded[obj_key] = new_embedded
+        # Most objects embed nothing, don't keep an empty set for each
+        if new_embedded:
+            self._obj_to_embedded[obj_key] = new_embedded
+        else:
+            self._obj_to_embedded.pop(obj_key, None)
 
     def __contains__(self, elem):
         return self.get_one(elem) == elem
@@ -30,6 +30,11 @@ LOG = log.getLogger(__name__)
 
 ETCD_READ_TIMEOUT = 20
 
+# Seconds to wait before watching a table again after an error
+ETCD_WATCH_RETRY_INTERVAL = 1
+
+_ETCD_DELETE_ACTIONS = frozenset(('delete', 'expire', 'compareAndDelete'))
+
 
 @contextmanager
 def _error_catcher(self):
@@ -193,6 +198,45 @@ class EtcdDbDriver(db_api.DbApi):
         self.notify_callback = callback
         self.pool.spawn_n(self._db_changes_updater)
 
+    def watch_table(self, table, callback):
+        index = self._get_next_index()
+        eventlet.spawn_n(self._table_watcher, table, callback, index)
+        return True
+
+    def _get_next_index(self):
+        return self.client.read('/').etcd_index + 1
+
+    def _table_watcher(self, table, callback, index):
+        prefix_size = len(table) + 2
+        while True:
+            try:
+                entry = self.client.read('/' + table, wait=True,
+                                         recursive=True, waitIndex=index,
+                                         timeout=ETCD_READ_TIMEOUT)
+            except Exception as e:
+                if "Read timed out" in str(e):
+                    continue
+                if not isinstance(e, etcd.EtcdEventIndexCleared):
+                    LOG.warning("Error when watching table %(table)s: %(e)s",
+                                {'table': table, 'e': e})
+                    eventlet.sleep(ETCD_WATCH_RETRY_INTERVAL)
+                # Events since index are lost, watch from now on and read
+                # the table again
+                try:
+                    index = self._get_next_index()
+                except Exception:
+                    continue
+                callback('sync', None, None)
+                continue
+            index = entry.modifiedIndex + 1
+            if entry.dir:
+                continue
+            key = entry.key[prefix_size:]
+            if entry.action in _ETCD_DELETE_ACTIONS:
+                callback('delete', key, None)
+            else:
+                callback('set', key, entry.value)
+
     def register_topic_for_notification(self, topic):
         # TODO(gsagie) implement this
         pass
@@ -10,8 +10,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import re
 
+import eventlet
 from oslo_log import log
 from redis import client as redis_client
 from redis import exceptions
@@ -23,9 +25,49 @@ from dragonflow.db.drivers import redis_mgt
 LOG = log.getLogger(__name__)
 
 
+_LOCAL_KEY_REGEX = re.compile('^{([^.]*)\\.(.*)}\\.(.*)$')
+
+# Seconds to wait before watching a table again after an error
+_WATCH_RETRY_INTERVAL = 1
+
+_KEYSPACE_DELETE_EVENTS = frozenset(('del', 'expired', 'evicted'))
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def _keyspace_events_enabled(flags):
+    """Check that the notify-keyspace-events flags of a server include the
+    keyspace notifications of string and generic commands
+    """
+    flags = _to_str(flags) or ''
+    if 'K' not in flags:
+        return False
+    return 'A' in flags or ('$' in flags and 'g' in flags)
+
+
 class RedisDbDriver(db_api.DbApi):
+    """Redis NB DB driver.
+
+    Every entry is stored under '{table.topic}.key'. To avoid KEYS scans,
+    the driver additionally maintains two indexes per table:
+
+     * '{table.topic}:index' - a set of the keys stored under the topic. It
+       shares its hash tag (and hence its slot) with the keys it indexes,
+       so it can be read together with them in a single MGET.
+     * '{table.}:keys' - a hash mapping each key of the table to its topic,
+       used for topic-less lookups and listings.
+
+    Tables written by older versions are indexed on first access, by
+    SCANning the masters.
+    """
 
     RequestRetryTimes = 5
+    ScanCount = 1000
+    MGetChunkSize = 500
 
     def __init__(self):
         super(RedisDbDriver, self).__init__()
@@ -33,6 +75,7 @@ class RedisDbDriver(db_api.DbApi):
         self.remote_server_lists = []
         self.redis_mgt = None
         self.is_neutron_server = False
+        self._indexed_tables = set()
 
     def initialize(self, db_ip, db_port, **args):
         # get remote ip port list
@@ -57,16 +100,19 @@ class RedisDbDriver(db_api.DbApi):
         pass
 
     def delete_table(self, table):
-        local_key = self._uuid_to_key(table, '*', '*')
-        for host, client in self.clients.items():
-            local_keys = client.keys(local_key)
-            if len(local_keys) > 0:
-                for tmp_key in local_keys:
-                    try:
-                        self._execute_cmd("DEL", tmp_key)
-                    except Exception:
-                        LOG.exception("exception when delete_table: "
-                                      "%(key)s ", {'key': local_key})
+        self._ensure_table_indexed(table)
+        for topic, keys in self._iter_keys_by_topic(table):
+            for key in keys:
+                local_key = self._uuid_to_key(table, key, topic)
+                try:
+                    self._execute_cmd("DEL", local_key)
+                except Exception:
+                    LOG.exception("exception when delete_table: "
+                                  "%(key)s ", {'key': local_key})
+            self._execute_cmd("DEL", self._topic_index_key(table, topic))
+        self._execute_cmd("DEL", self._table_index_key(table))
+        self._execute_cmd("DEL", self._table_indexed_marker_key(table))
+        self._indexed_tables.discard(table)
 
     def _handle_db_conn_error(self, ip_port, local_key=None):
         self.redis_mgt.remove_node_from_master_list(ip_port)
@@ -83,19 +129,16 @@ class RedisDbDriver(db_api.DbApi):
             if result:
                 self._update_server_list()
 
-    def _gen_args(self, local_key, value):
+    def _gen_args(self, local_key, *values):
         args = []
         args.append(local_key)
-        if value is not None:
-            args.append(value)
+        args.extend(value for value in values if value is not None)
 
         return args
 
     def _is_oper_valid(self, oper):
-        if oper == 'SET' or oper == 'GET' or oper == 'DEL':
-            return True
-
-        return False
+        return oper in ('SET', 'GET', 'DEL', 'SADD', 'SREM', 'HSET', 'HGET',
+                        'HDEL')
 
     def _update_client(self, local_key):
         self._sync_master_list()
@@ -103,7 +146,7 @@ class RedisDbDriver(db_api.DbApi):
         client = self._get_client(local_key, ip_port)
         return client
 
-    def _execute_cmd(self, oper, local_key, value=None):
+    def _execute_cmd(self, oper, local_key, *values):
         if not self._is_oper_valid(oper):
             LOG.warning("invalid oper: %(oper)s",
                         {'oper': oper})
@@ -114,7 +157,7 @@ class RedisDbDriver(db_api.DbApi):
         if client is None:
             return None
 
-        arg = self._gen_args(local_key, value)
+        arg = self._gen_args(local_key, *values)
 
         ttl = self.RequestRetryTimes
         asking = False
@@ -172,13 +215,98 @@ class RedisDbDriver(db_api.DbApi):
                               "db: %(e)s", {'e': e})
                 raise e
 
+    def _topic_index_key(self, table, topic):
+        return '{' + table + '.' + (topic or '') + '}:index'
+
+    def _table_index_key(self, table):
+        return '{' + table + '.}:keys'
+
+    def _table_indexed_marker_key(self, table):
+        return '{' + table + '.}:indexed'
+
+    def _add_to_index(self, table, key, topic):
+        self._execute_cmd("SADD", self._topic_index_key(table, topic), key)
+        self._execute_cmd("HSET", self._table_index_key(table), key,
+                          topic or '')
+
+    def _remove_from_index(self, table, key, topic):
+        self._execute_cmd("SREM", self._topic_index_key(table, topic), key)
+        self._execute_cmd("HDEL", self._table_index_key(table), key)
+
+    def _ensure_table_indexed(self, table):
+        """Build the indexes of a table written before they were maintained.
+
+        The table is SCANned (never KEYS) once. Afterwards, a marker key
+        tells all other drivers that the indexes are complete.
+        """
+        if table in self._indexed_tables:
+            return
+        marker_key = self._table_indexed_marker_key(table)
+        if self._execute_cmd("GET", marker_key) is None:
+            LOG.info("Building key index of table %s", table)
+            self._sync_master_list()
+            pattern = self._uuid_to_key(table, '*', '*')
+            for client in list(self.clients.values()):
+                for local_key in client.scan_iter(match=pattern,
+                                                  count=self.ScanCount):
+                    m = _LOCAL_KEY_REGEX.match(local_key)
+                    if m is None:
+                        continue
+                    self._add_to_index(table, m.group(3), m.group(2))
+            self._execute_cmd("SET", marker_key, '1')
+        self._indexed_tables.add(table)
+
     def _find_key_without_topic(self, table, key):
-        local_key = self._uuid_to_key(table, key, '*')
-        self._sync_master_list()
-        for client in self.clients.values():
-            local_keys = client.keys(local_key)
-            if len(local_keys) == 1:
-                return local_keys[0]
+        self._ensure_table_indexed(table)
+        topic = self._execute_cmd("HGET", self._table_index_key(table), key)
+        if topic is not None:
+            return self._uuid_to_key(table, key, topic)
+
+    def _iter_topic_keys(self, table, topic):
+        """Stream the keys stored under the given topic using SSCAN"""
+        index_key = self._topic_index_key(table, topic)
+        client = self._get_client(index_key)
+        if client is None:
+            return iter(())
+        return client.sscan_iter(index_key, count=self.ScanCount)
+
+    def _iter_keys_by_topic(self, table):
+        """Stream the keys of a table using HSCAN, grouped by topic"""
+        index_key = self._table_index_key(table)
+        client = self._get_client(index_key)
+        if client is None:
+            return
+        keys_by_topic = collections.defaultdict(list)
+        for key, topic in client.hscan_iter(index_key, count=self.ScanCount):
+            keys_by_topic[topic].append(key)
+        for topic, keys in keys_by_topic.items():
+            yield topic, keys
+
+    def _iter_chunks(self, iterable):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) >= self.MGetChunkSize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _get_values(self, table, keys, topic):
+        """Read the values of keys sharing a topic in chunked MGETs. Keys
+        sharing a topic share a slot, so a single client serves them all.
+        """
+        res = []
+        client = self._get_client(self._topic_index_key(table, topic))
+        if client is None:
+            return res
+        for chunk in self._iter_chunks(keys):
+            local_keys = [self._uuid_to_key(table, key, topic)
+                          for key in chunk]
+            # Skip keys deleted between reading the index and the values
+            res.extend(value for value in client.mget(local_keys)
+                       if value is not None)
+        return res
 
     def get_key(self, table, key, topic=None):
         if topic:
@@ -205,6 +333,8 @@ class RedisDbDriver(db_api.DbApi):
             res = self._execute_cmd("SET", local_key, value)
             if res is None:
                 res = 0
+            else:
+                self._add_to_index(table, key, topic)
 
             return res
         except Exception:
@@ -221,87 +351,126 @@ class RedisDbDriver(db_api.DbApi):
             local_key = self._find_key_without_topic(table, key)
             if local_key is None:
                 raise df_exceptions.DBKeyNotFound(key=key)
+            topic = _LOCAL_KEY_REGEX.match(local_key).group(2)
 
         try:
             res = self._execute_cmd("DEL", local_key)
             if res is None:
                 res = 0
+            self._remove_from_index(table, key, topic)
 
             return res
         except Exception:
             LOG.exception("exception when delete_key: %(key)s",
                           {'key': local_key})
 
-    def get_all_entries(self, table, topic=None):
-        res = []
-        ip_port = None
-        self._sync_master_list()
-        if not topic:
-            local_key = self._uuid_to_key(table, '*', '*')
+    def _execute_pipelined(self, commands):
+        """Execute commands, given as (oper, local_key, values...) tuples,
+        in a single pipeline per Redis node, and return their results in
+        order.
+
+        If a pipeline fails (e.g. a slot was migrated), its commands are
+        retried one by one using _execute_cmd, which follows redirections.
+        Only idempotent commands are pipelined, so this is safe.
+        """
+        commands = list(commands)
+        results = [None] * len(commands)
+        commands_by_node = collections.defaultdict(list)
+        for i, command in enumerate(commands):
+            ip_port = self.redis_mgt.get_ip_by_key(command[1])
+            commands_by_node[ip_port].append(i)
+
+        for ip_port, indexes in commands_by_node.items():
+            client = self.clients.get(ip_port)
             try:
-                for host, client in self.clients.items():
-                    local_keys = client.keys(local_key)
-                    if len(local_keys) > 0:
-                        for tmp_key in local_keys:
-                            res.append(self._execute_cmd("GET", tmp_key))
-                return res
-            except Exception:
-                LOG.exception("exception when get_all_entries: %(key)s",
-                              {'key': local_key})
-
-        else:
-            local_key = self._uuid_to_key(table, '*', topic)
-            try:
-                ip_port = self.redis_mgt.get_ip_by_key(local_key)
-                client = self._get_client(local_key, ip_port)
                 if client is None:
-                    return res
-
-                local_keys = client.keys(local_key)
-                if len(local_keys) > 0:
-                    res.extend(client.mget(local_keys))
-                return res
+                    raise exceptions.ConnectionError(ip_port)
+                pipeline = client.pipeline(transaction=False)
+                for i in indexes:
+                    oper, local_key = commands[i][:2]
+                    pipeline.execute_command(
+                        oper, *self._gen_args(local_key, *commands[i][2:]))
+                node_results = pipeline.execute()
             except Exception as e:
-                self._handle_db_conn_error(ip_port, local_key)
-                LOG.exception("exception when mget: %(key)s, %(e)s",
-                              {'key': local_key, 'e': e})
-
-    def get_all_keys(self, table, topic=None):
-        res = []
-        ip_port = None
+                LOG.warning("Pipeline to %(ip_port)s failed, executing its "
+                            "commands one by one: %(e)s",
+                            {'ip_port': ip_port, 'e': e})
+                node_results = [self._execute_cmd(*commands[i])
+                                for i in indexes]
+            for i, result in zip(indexes, node_results):
+                results[i] = result
+        return results
+
+    def _batch_find_topics(self, table_keys):
+        """Look up the topics of several keys, given as (table, key) tuples,
+        in a single pipelined round trip. Returns a dict from (table, key) to
+        topic, which is None for missing keys.
+        """
+        table_keys = list(table_keys)
+        for table in {table for table, _key in table_keys}:
+            self._ensure_table_indexed(table)
+        topics = self._execute_pipelined(
+            ("HGET", self._table_index_key(table), key)
+            for table, key in table_keys)
+        return dict(zip(table_keys, topics))
+
+    def batch_get_keys(self, requests):
         self._sync_master_list()
-        if not topic:
-            local_key = self._uuid_to_key(table, '*', '*')
-            try:
-                for host, client in self.clients.items():
-                    ip_port = host
-                    res.extend(client.keys(local_key))
-                return [self._strip_table_name_from_key(key) for key in res]
-            except Exception as e:
-                self._handle_db_conn_error(ip_port, local_key)
-                LOG.exception("exception when get_all_keys: %(key)s, %(e)s",
-                              {'key': local_key, 'e': e})
-
-        else:
-            local_key = self._uuid_to_key(table, '*', topic)
-            try:
-                ip_port = self.redis_mgt.get_ip_by_key(local_key)
-                client = self._get_client(local_key, ip_port)
-                if client is None:
-                    return res
+        requests = list(requests)
+        found_topics = self._batch_find_topics(
+            (table, key) for table, key, topic in requests if not topic)
+
+        local_keys = []
+        for table, key, topic in requests:
+            if not topic:
+                topic = found_topics[(table, key)]
+                if topic is None:
+                    local_keys.append(None)
+                    continue
+            local_keys.append(self._uuid_to_key(table, key, topic))
 
-                res = client.keys(local_key)
-                return [self._strip_table_name_from_key(key) for key in res]
+        values = iter(self._execute_pipelined(
+            ("GET", local_key) for local_key in local_keys
+            if local_key is not None))
+        return [None if local_key is None else next(values)
+                for local_key in local_keys]
 
-            except Exception as e:
-                self._handle_db_conn_error(ip_port, local_key)
-                LOG.exception("exception when get_all_keys: %(key)s, %(e)s",
-                              {'key': local_key, 'e': e})
+    def get_all_entries(self, table, topic=None):
+        res = []
+        self._sync_master_list()
+        index_key = self._table_index_key(table)
+        try:
+            self._ensure_table_indexed(table)
+            if not topic:
+                for topic, keys in self._iter_keys_by_topic(table):
+                    res.extend(self._get_values(table, keys, topic))
+            else:
+                index_key = self._topic_index_key(table, topic)
+                res.extend(self._get_values(
+                    table, self._iter_topic_keys(table, topic), topic))
+            return res
+        except Exception as e:
+            self._handle_db_conn_error(self.redis_mgt.get_ip_by_key(index_key),
+                                       index_key)
+            LOG.exception("exception when get_all_entries: %(key)s, %(e)s",
+                          {'key': index_key, 'e': e})
 
-    def _strip_table_name_from_key(self, key):
-        regex = '^{.*}\\.(.*)$'
-        m = re.match(regex, key)
-        return m.group(1)
+    def get_all_keys(self, table, topic=None):
+        self._sync_master_list()
+        index_key = self._table_index_key(table)
+        try:
+            self._ensure_table_indexed(table)
+            if not topic:
+                return [key
+                        for _topic, keys in self._iter_keys_by_topic(table)
+                        for key in keys]
+            index_key = self._topic_index_key(table, topic)
+            return list(self._iter_topic_keys(table, topic))
+        except Exception as e:
+            self._handle_db_conn_error(self.redis_mgt.get_ip_by_key(index_key),
+                                       index_key)
+            LOG.exception("exception when get_all_keys: %(key)s, %(e)s",
+                          {'key': index_key, 'e': e})
 
     def _allocate_unique_key(self, table):
         local_key = self._uuid_to_key('unique_key', table, None)
@@ -327,6 +496,61 @@ class RedisDbDriver(db_api.DbApi):
     def register_notification_callback(self, callback, topics=None):
         pass
 
+    def watch_table(self, table, callback):
+        """Watch a table through keyspace notifications. The servers must be
+        configured to send them for string and generic commands (e.g.
+        notify-keyspace-events K$g), otherwise the table is not watched.
+        """
+        clients = list(self.clients.values())
+        if not clients:
+            return False
+        for client in clients:
+            flags = client.config_get('notify-keyspace-events')
+            if not _keyspace_events_enabled(
+                    flags.get('notify-keyspace-events')):
+                LOG.info("Keyspace notifications are disabled, table %s "
+                         "is not watched", table)
+                return False
+        for client in clients:
+            eventlet.spawn_n(self._table_watcher, client, table, callback)
+        return True
+
+    def _table_watcher(self, client, table, callback):
+        pattern = '__keyspace@*__:{' + table + '.*'
+        resubscribed = False
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(pattern)
+                if resubscribed:
+                    # Changes while unsubscribed were lost
+                    callback('sync', None, None)
+                resubscribed = True
+                for message in pubsub.listen():
+                    self._handle_keyspace_message(message, table, callback)
+            except Exception:
+                LOG.exception("Error when watching table %s", table)
+            eventlet.sleep(_WATCH_RETRY_INTERVAL)
+
+    def _handle_keyspace_message(self, message, table, callback):
+        if message['type'] != 'pmessage':
+            return
+        local_key = _to_str(message['channel']).split(':', 1)[1]
+        match = _LOCAL_KEY_REGEX.match(local_key)
+        # Skip the keys of the indexes
+        if match is None or match.group(1) != table:
+            return
+        key = match.group(3)
+        event = _to_str(message['data'])
+        if event in _KEYSPACE_DELETE_EVENTS:
+            callback('delete', key, None)
+        elif event == 'set':
+            value = self._execute_cmd("GET", local_key)
+            if value is None:
+                callback('delete', key, None)
+            else:
+                callback('set', key, value)
+
     def _uuid_to_key(self, table, key, topic):
         if not topic:
             local_key = ('{' + table + '.' + '}' + '.' + key)
@@ -0,0 +1,292 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from eventlet import queue
+
+from dragonflow.db import model_framework as mf
+from dragonflow.db.models import l2
+from dragonflow.db.models import ovs
+
+LANE_CONTROL = 'control'
+LANE_LOCAL = 'local'
+LANE_REMOTE = 'remote'
+LANES = (LANE_CONTROL, LANE_LOCAL, LANE_REMOTE)
+
+# Actions handled before any data event
+CONTROL_ACTIONS = frozenset(('sync', 'dbrestart', 'db_sync', 'log'))
+# Actions that must stay ordered with the events of the local OVSDB
+LOCAL_ACTIONS = frozenset(('ovs_sync_started', 'ovs_sync_finished'))
+
+
+class _Entry(object):
+    __slots__ = ('seq', 'update', 'lane', 'queued_at', 'removed')
+
+    def __init__(self, seq, update, lane):
+        self.seq = seq
+        self.update = update
+        self.lane = lane
+        self.queued_at = time.time()
+        self.removed = False
+
+
+class _Lane(object):
+    '''Queued updates, served round-robin across their topics, taking up to
+    quantum updates of a topic in each turn.
+
+    An entry may be removed before its turn, when it is served ahead of a
+    later entry (see _LaneScheduler). It is then skipped lazily.
+    '''
+
+    def __init__(self, quantum):
+        self._quantum = quantum
+        self._entries_by_topic = {}
+        self._topics = collections.deque()
+        self._credit = quantum
+        self._size = 0
+        self.dequeued = 0
+        self.total_wait = 0
+        self.max_wait = 0
+
+    def __len__(self):
+        return self._size
+
+    def put(self, entry, topic):
+        entries = self._entries_by_topic.get(topic)
+        if entries is None:
+            entries = self._entries_by_topic[topic] = collections.deque()
+            self._topics.append(topic)
+        entries.append(entry)
+        self._size += 1
+
+    def _drop_topic(self):
+        topic = self._topics.popleft()
+        del self._entries_by_topic[topic]
+        self._credit = self._quantum
+
+    def peek(self):
+        while True:
+            entries = self._entries_by_topic[self._topics[0]]
+            while entries and entries[0].removed:
+                entries.popleft()
+            if entries:
+                return entries[0]
+            self._drop_topic()
+
+    def remove(self, entry):
+        if self.peek() is entry:
+            entries = self._entries_by_topic[self._topics[0]]
+            entries.popleft()
+            self._credit -= 1
+            if not entries:
+                self._drop_topic()
+            elif self._credit == 0:
+                self._topics.rotate(-1)
+                self._credit = self._quantum
+        entry.removed = True
+        self._size -= 1
+
+        wait = time.time() - entry.queued_at
+        self.dequeued += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def get_oldest_wait(self):
+        if not self._size:
+            return 0
+        oldest = min(entry.queued_at
+                     for entries in self._entries_by_topic.values()
+                     for entry in entries if not entry.removed)
+        return time.time() - oldest
+
+
+class _LaneScheduler(object):
+    '''Classifies updates into the control, local and remote lanes.
+
+    Control updates are always served first. The local and remote lanes
+    are served by weighted round-robin, up to local_weight local updates for
+    each remote update.
+
+    Local updates are those of the local OVSDB, and of the logical ports
+    bound to its interfaces.
+
+    An update never overtakes an earlier update of the same object, or of
+    an object of a model it depends on, or that depends on it: such an
+    update is served first, whatever its lane or topic.
+    '''
+
+    def __init__(self, local_weight, topic_quantum):
+        self._lanes = {lane: _Lane(topic_quantum) for lane in LANES}
+        self._local_weight = local_weight
+        self._local_credit = local_weight
+        self._local_lport_ids = set()
+        self._seq = 0
+        self._pending_by_key = {}
+        self._pending_by_table = collections.defaultdict(collections.deque)
+        self._related_tables = {}
+
+    def __len__(self):
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _classify(self, update):
+        if update.action in CONTROL_ACTIONS:
+            return LANE_CONTROL
+        if update.action in LOCAL_ACTIONS:
+            return LANE_LOCAL
+        if update.table == ovs.OvsPort.table_name:
+            self._track_local_lport(update)
+            return LANE_LOCAL
+        if (update.table == l2.LogicalPort.table_name and
+                update.key in self._local_lport_ids):
+            return LANE_LOCAL
+        return LANE_REMOTE
+
+    def _track_local_lport(self, update):
+        value = update.value
+        if not isinstance(value, dict) or not value.get('iface_id'):
+            return
+        if update.action == 'delete':
+            self._local_lport_ids.discard(value['iface_id'])
+        else:
+            self._local_lport_ids.add(value['iface_id'])
+
+    def _get_related_tables(self, table):
+        related = self._related_tables.get(table)
+        if related is None:
+            related = set()
+            try:
+                model = mf.get_model(table)
+            except KeyError:
+                model = None
+            if model is not None:
+                related = {dep.table_name for dep in model.dependencies()
+                           if dep.is_first_class()}
+                related.update(
+                    other.table_name for other in mf.iter_models()
+                    if model in other.dependencies())
+                related.discard(table)
+            self._related_tables[table] = related
+        return related
+
+    def _get_oldest_predecessor(self, entry):
+        update = entry.update
+        oldest = None
+        pending = self._pending_by_key.get((update.table, update.key))
+        if pending and pending[0] is not entry:
+            oldest = pending[0]
+        for table in self._get_related_tables(update.table):
+            pending = self._pending_by_table.get(table)
+            while pending and pending[0].removed:
+                pending.popleft()
+            if not pending:
+                continue
+            if pending[0].seq < (oldest or entry).seq:
+                oldest = pending[0]
+        return oldest
+
+    @staticmethod
+    def _is_tracked(entry):
+        return entry.lane != LANE_CONTROL and entry.update.table is not None
+
+    def put(self, update):
+        lane = self._classify(update)
+        obj_key = (update.table, update.key)
+        pending = self._pending_by_key.get(obj_key)
+        if pending and lane != LANE_CONTROL:
+            # Keep the updates of an object in one lane, in order
+            lane = pending[-1].lane
+        entry = _Entry(self._seq, update, lane)
+        self._seq += 1
+        if self._is_tracked(entry):
+            self._pending_by_key.setdefault(obj_key, collections.deque())
+            self._pending_by_key[obj_key].append(entry)
+            self._pending_by_table[update.table].append(entry)
+        self._lanes[lane].put(entry, update.topic)
+
+    def _remove(self, entry):
+        self._lanes[entry.lane].remove(entry)
+        update = entry.update
+        if not self._is_tracked(entry):
+            return update
+
+        obj_key = (update.table, update.key)
+        pending = self._pending_by_key[obj_key]
+        pending.popleft()
+        if not pending:
+            del self._pending_by_key[obj_key]
+        pending = self._pending_by_table[update.table]
+        while pending and pending[0].removed:
+            pending.popleft()
+        if not pending:
+            del self._pending_by_table[update.table]
+        return update
+
+    def get(self):
+        control = self._lanes[LANE_CONTROL]
+        if control:
+            return self._remove(control.peek())
+
+        local = self._lanes[LANE_LOCAL]
+        remote = self._lanes[LANE_REMOTE]
+        if local and (self._local_credit > 0 or not remote):
+            self._local_credit -= 1
+            entry = local.peek()
+        else:
+            self._local_credit = self._local_weight
+            entry = remote.peek()
+
+        predecessor = self._get_oldest_predecessor(entry)
+        while predecessor is not None:
+            entry = predecessor
+            predecessor = self._get_oldest_predecessor(entry)
+        return self._remove(entry)
+
+    def get_stats(self):
+        stats = {}
+        for name, lane in self._lanes.items():
+            stats[name] = {
+                'depth': len(lane),
+                'oldest_wait': lane.get_oldest_wait(),
+                'max_wait': lane.max_wait,
+                'avg_wait': (lane.total_wait / lane.dequeued
+                             if lane.dequeued else 0),
+                'dequeued': lane.dequeued,
+            }
+        return stats
+
+
+class LanedQueue(queue.Queue):
+    '''An eventlet queue of DbUpdates, scheduled by lanes (see
+    _LaneScheduler), so that control events and local port events are not
+    delayed by the bulk updates of other topics.
+    '''
+
+    def __init__(self, local_weight, topic_quantum):
+        self._local_weight = local_weight
+        self._topic_quantum = topic_quantum
+        super(LanedQueue, self).__init__()
+
+    def _init(self, maxsize):
+        self.queue = _LaneScheduler(self._local_weight, self._topic_quantum)
+
+    def _get(self):
+        return self.queue.get()
+
+    def _put(self, item):
+        self.queue.put(item)
+        self._put_bookkeeping()
+
+    def get_stats(self):
+        '''Return the depth, and wait times in seconds, of each lane'''
+        return self.queue.get_stats()
@@ -0,0 +1,113 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import six
+
+
+class _CompactModelBase(object):
+    '''Base for compact model instances
+
+    A compact instance holds the serialized (struct) form of each field of a
+    model instance in a slot, e.g. IDs instead of reference proxies, and
+    strings instead of netaddr objects. It has no per-instance __dict__, and
+    it is materialized back into a full model instance on demand.
+
+    Instance attributes that are not fields (e.g. LogicalPort's ofport) are
+    kept aside in the _extra slot, and restored when materializing.
+    '''
+
+    __slots__ = ('_extra',)
+
+    def __init__(self, obj):
+        for name, field in self._fields:
+            if obj.field_is_set(name):
+                value = getattr(obj, name)
+                if value is not None:
+                    value = field.to_struct(value)
+                    if isinstance(value, list):
+                        value = tuple(value)
+            else:
+                value = None
+            setattr(self, name, value)
+
+        extra = {k: v for k, v in six.iteritems(vars(obj))
+                 if not k.startswith('_')}
+        self._extra = extra or None
+
+    def materialize(self):
+        '''Create a full model instance from the compact instance'''
+        kwargs = {}
+        for name, _field in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                if isinstance(value, tuple):
+                    value = list(value)
+                kwargs[name] = value
+
+        obj = self._model(**kwargs)
+        if self._extra:
+            for key, value in six.iteritems(self._extra):
+                setattr(obj, key, value)
+        return obj
+
+    @classmethod
+    def get_compacted_model(cls):
+        return cls._model
+
+    def __repr__(self):
+        return '{0}(id={1})'.format(self.__class__.__name__, self.id)
+
+
+def _memoize_compact_models(f):
+    """
+    A memoization decorator targeted for `create_compact_model`.
+    """
+    memo = {}
+
+    @six.wraps(f)
+    def func(model):
+        try:
+            return memo[model]
+        except KeyError:
+            result = f(model)
+            memo[model] = result
+            return result
+    return func
+
+
+@_memoize_compact_models
+def create_compact_model(model):
+    '''This creates a compact class for a specific model type, with a slot
+    per field of the model.
+
+    >>> LportCompact = create_compact_model(Lport)
+    >>> compact_lport = LportCompact(lport)
+    >>> compact_lport.lswitch
+    'lswitch-id'
+    >>> compact_lport.materialize()
+    LogicalPort(...)
+    '''
+    fields = tuple(sorted(model.iterate_over_fields()))
+    attrs = {
+        '__slots__': tuple(name for name, _field in fields),
+        '_model': model,
+        '_fields': fields,
+    }
+
+    return type(
+        '{name}Compact'.format(name=model.__name__),
+        (_CompactModelBase,),
+        attrs,
+    )
+
+
+def is_compact_model(obj):
+    return isinstance(obj, _CompactModelBase)
@@ -20,11 +20,11 @@ from oslo_serialization import jsonutils
 import six
 
 from dragonflow._i18n import _
+from dragonflow.common import metrics
 from dragonflow.db.models import legacy
 
 LOG = log.getLogger(__name__)
 
-
 def _normalize_tuple(v):
     """Convert strings to tuples of length one, other iterables to tuples
 
@@ -69,6 +69,13 @@ class _CommonBase(models.Base):
         '''Instantiate current class from JSON encoded string'''
         return cls(**jsonutils.loads(data))
 
+    @classmethod
+    def envelope_from_json(cls, data):
+        '''Wrap a JSON encoded instance of current class in an envelope
+        that instantiates it only when needed (see ModelEnvelope)
+        '''
+        return ModelEnvelope(cls, jsonutils.loads(data))
+
     def to_json(self):
         '''Convert object to JSON formatted string'''
         return jsonutils.dumps(self.to_struct())
@@ -106,7 +113,8 @@ class _CommonBase(models.Base):
                        'event': event,
                        'resource': self})
             try:
-                cb(self, *args, **kwargs)
+                with metrics.timer(metrics.MODEL_EVENT_CALLBACK, cb):
+                    cb(self, *args, **kwargs)
             except Exception:
                 LOG.exception(
                     'Error while calling %(func)r(*%(_args)r, **%(kw)r)',
@@ -264,6 +272,48 @@ class _CommonBase(models.Base):
         return cls.get_indexes()[index]
 
 
+class ModelEnvelope(object):
+    '''A serialized model instance that is instantiated on demand
+
+    Instantiating a model (parsing references, IP and MAC addresses, embedded
+    models, etc.) is much more expensive than decoding its serialized form.
+    The envelope holds only the decoded struct, and exposes the header fields
+    (id, topic, version and unique_key) directly. The model instance is
+    constructed when any other attribute is accessed, or when decode() is
+    called. This allows dropping stale or duplicate updates cheaply.
+
+    >>> envelope = model_serializer.deserialize_envelope(LogicalPort, data)
+    >>> envelope.version
+    3
+    >>> envelope.decode()
+    LogicalPort(...)
+    '''
+
+    header_fields = frozenset(('id', 'topic', 'version', 'unique_key'))
+
+    def __init__(self, model, struct):
+        self.model = model
+        self._struct = struct
+        self._obj = None
+
+    def decode(self):
+        '''Return the model instance, constructing it on first call'''
+        if self._obj is None:
+            self._obj = self.model(**self._struct)
+        return self._obj
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self.header_fields and self._obj is None:
+            return self._struct.get(name)
+        return getattr(self.decode(), name)
+
+    def __repr__(self):
+        return '{0}Envelope(id={1})'.format(self.model.__name__,
+                                            self._struct.get('id'))
+
+
 def _add_event_funcs(cls_, event):
     @classmethod
     def register_event(cls, cb):
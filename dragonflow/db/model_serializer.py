@@ -0,0 +1,98 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import msgpack
+from oslo_serialization import jsonutils
+import six
+
+from dragonflow._i18n import _
+from dragonflow.db import model_framework as mf
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+FORMATS = (JSON, MSGPACK)
+
+
+def serialize(obj, fmt=JSON):
+    '''Serialize a model instance for storage in the NB database
+
+    >>> serialize(lport, MSGPACK)
+    b'\\x8b\\xa7chassis...'
+    '''
+    return dump_struct(obj.to_struct(), fmt)
+
+
+def dump_struct(struct, fmt=JSON):
+    '''Serialize the struct (dict) form of a model instance'''
+    if fmt == JSON:
+        return jsonutils.dumps(struct)
+    elif fmt == MSGPACK:
+        return msgpack.packb(struct, use_bin_type=True)
+    raise ValueError(_('Unknown serialization format: %s') % (fmt,))
+
+
+def _is_json(data):
+    # Models are always serialized as JSON objects, while a msgpack map
+    # never starts with '{' (which would encode the integer 123)
+    if isinstance(data, six.text_type):
+        return True
+    return data[:1] == b'{'
+
+
+def load_struct(data):
+    '''Decode a serialized model instance into its struct (dict) form.
+
+    Values of any supported format are accepted, as well as structs that were
+    already decoded, e.g. when embedded in a pub/sub event.
+    '''
+    if isinstance(data, dict):
+        return data
+    if _is_json(data):
+        return jsonutils.loads(data)
+    return msgpack.unpackb(data, raw=False)
+
+
+def _is_msgpack_map(data):
+    first = six.indexbytes(data, 0) if data else None
+    return first is not None and (0x80 <= first <= 0x8f or
+                                  first in (0xde, 0xdf))
+
+
+def load_value(data):
+    '''Decode any value of the NB database: a serialized model instance of
+    any format, or a JSON value of another table, e.g. a unique key counter.
+    '''
+    if not isinstance(data, six.text_type) and _is_msgpack_map(data):
+        return msgpack.unpackb(data, raw=False)
+    return jsonutils.loads(data)
+
+
+def deserialize(model, data):
+    '''Instantiate model from a serialized instance of any format'''
+    return model(**load_struct(data))
+
+
+def deserialize_envelope(model, data):
+    '''Wrap a serialized instance of any format in a model envelope'''
+    return mf.ModelEnvelope(model, load_struct(data))
+
+
+def to_event_value(obj, serialized_obj, fmt=JSON):
+    '''Return the value to publish in a DB change event about obj
+
+    Binary formats are not embedded in pub/sub events as an opaque value.
+    The struct itself is embedded, so it is encoded only once, by the
+    pub/sub message encoding.
+    '''
+    if fmt == JSON:
+        return serialized_obj
+    return obj.to_struct()
@@ -35,6 +35,8 @@ class Chassis(mf.ModelBase, mixins.BasicEvents):
 class Publisher(mf.ModelBase, mixins.Name):
     table_name = 'publisher'
     uri = fields.StringField()
+    # Where sharded publishers receive the events of the topics they own
+    relay_uri = fields.StringField()
     last_activity_timestamp = fields.FloatField()
 
     def is_stale(self):
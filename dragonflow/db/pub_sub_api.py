@@ -11,30 +11,43 @@
 #    under the License.
 
 import abc
+import hashlib
+import itertools
 import socket
 import threading
 import time
 import uuid
+import zlib
 
 import msgpack
+from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 import six
 
 from dragonflow.common import exceptions
+from dragonflow.common import utils as df_utils
 from dragonflow.db import db_common
+from dragonflow.db import model_serializer
 from dragonflow.db.models import core
+from dragonflow.utils import hash_ring
 
 LOG = logging.getLogger(__name__)
 
 
 MONITOR_TABLES = [core.Chassis.table_name, core.Publisher.table_name]
 
+# A batch of messages is framed with a leading byte that msgpack never uses,
+# so it can be told apart from a single message. The next byte tells how the
+# payload (the packed list of messages) is compressed.
+_BATCH_MARKER = b'\xc1'
+_BATCH_COMPRESSION_NONE = b'n'
+_BATCH_COMPRESSION_ZLIB = b'z'
+
 
 def pack_message(message):
     data = None
     try:
-        data = msgpack.packb(message, encoding='utf-8')
+        data = msgpack.packb(message, use_bin_type=True)
     except Exception:
         LOG.exception("Error in pack_message: ")
     return data
@@ -43,12 +56,48 @@ def pack_message(message):
 def unpack_message(message):
     entry = None
     try:
-        entry = msgpack.unpackb(message, encoding='utf-8')
+        entry = msgpack.unpackb(message, raw=False)
     except Exception:
         LOG.exception("Error in unpack_message: ")
     return entry
 
 
+def pack_batch(messages, compression=None):
+    """Pack several messages into a single framed batch
+
+    :param messages:    the messages to pack
+    :type messages:     list of dicts
+    :param compression: 'zlib' to compress the batch, or None / 'none'
+    :type compression:  string
+    :returns:           bytes
+    """
+    data = pack_message(messages)
+    if data is None:
+        return None
+    if compression == 'zlib':
+        return _BATCH_MARKER + _BATCH_COMPRESSION_ZLIB + zlib.compress(data)
+    return _BATCH_MARKER + _BATCH_COMPRESSION_NONE + data
+
+
+def unpack_messages(data):
+    """Unpack either a single message or a batch of messages
+
+    :returns: list of messages
+    """
+    if data[:1] != _BATCH_MARKER:
+        return [unpack_message(data)]
+
+    compression = data[1:2]
+    payload = data[2:]
+    try:
+        if compression == _BATCH_COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+    except Exception:
+        LOG.exception("Error in unpack_messages: ")
+        return []
+    return unpack_message(payload) or []
+
+
 def generate_publisher_uuid():
     """
     Generate a non-random uuid based on the fully qualified domain name.
@@ -82,6 +131,37 @@ class PubSubApi(object):
                   and local and non-local publishers are the same.
         """
 
+    def support_relay_publisher(self):
+        """Return True if the driver implements get_relay_publisher, and its
+        subscriber receives relayed events, as needed for publisher sharding.
+        """
+        return False
+
+    def get_relay_publisher(self, uri):
+        """Return a new Publisher Driver Object, that sends events to the
+        relay endpoint of a publisher service, for publisher sharding.
+
+        :param uri: the relay uri of the publisher service
+        :type uri:  string
+        :returns:   an PublisherApi Object
+        """
+        raise NotImplementedError()
+
+
+def load_relay_driver():
+    """Return the inter-process pub/sub driver, over which events are relayed
+    to the publisher services with publisher sharding.
+
+    :raises UnsupportedPublisherSharding: if the driver does not support
+                                          relays
+    """
+    driver_name = cfg.CONF.df.pub_sub_multiproc_driver
+    pub_sub_driver = df_utils.load_driver(
+        driver_name, df_utils.DF_PUBSUB_DRIVER_NAMESPACE)
+    if not pub_sub_driver.support_relay_publisher():
+        raise exceptions.UnsupportedPublisherSharding(driver=driver_name)
+    return pub_sub_driver
+
 
 @six.add_metaclass(abc.ABCMeta)
 class PublisherApi(object):
@@ -144,6 +224,44 @@ class PublisherAgentBase(PublisherApi):
         data = pack_message(update.to_dict())
         self._send_event(data, topic)
 
+    def send_events(self, updates):
+        """Publish several updates
+
+        If publisher_batch_size is greater than 1, consecutive updates to the
+        same topic are sent in framed batches of up to that many updates.
+        Otherwise, each update is sent on its own. Updates are sent in order
+        in any case.
+
+        :param updates: the updates to publish, each to its own topic
+        :type updates:  list of DbUpdate objects
+        :returns:       None
+        """
+        batch_size = cfg.CONF.df.publisher_batch_size
+        if batch_size <= 1:
+            for update in updates:
+                self.send_event(update)
+            return
+
+        # Only consecutive updates are batched, so that the updates are sent
+        # in order, also across topics
+        runs = itertools.groupby(
+            updates, lambda update: update.topic or db_common.SEND_ALL_TOPIC)
+        for topic, topic_updates in runs:
+            topic_updates = list(topic_updates)
+            for i in range(0, len(topic_updates), batch_size):
+                self._send_batch(topic_updates[i:i + batch_size], topic)
+
+    def _send_batch(self, updates, topic):
+        if len(updates) == 1:
+            self.send_event(updates[0], topic)
+            return
+
+        LOG.debug("Sending a batch of %(count)d updates to %(topic)s",
+                  {'count': len(updates), 'topic': topic})
+        data = pack_batch([update.to_dict() for update in updates],
+                          cfg.CONF.df.publisher_batch_compression)
+        self._send_event(data, topic.encode('utf8'))
+
 
 @six.add_metaclass(abc.ABCMeta)
 class SubscriberApi(object):
@@ -265,27 +383,188 @@ class SubscriberAgentBase(SubscriberApi):
         pass
 
     def _handle_incoming_event(self, data):
-        message = unpack_message(data)
-        if message['table'] == 'rlroutes':
-            LOG.info("Got message: %s", message)
-        self.db_changes_callback(
-            message['table'],
-            message['key'],
-            message['action'],
-            message['value'],
-            message['topic'],
-        )
+        for message in unpack_messages(data):
+            if message['table'] == 'rlroutes':
+                LOG.info("Got message: %s", message)
+            # Only traced events pass a trace_id, so that callbacks not
+            # taking it keep working
+            kwargs = {}
+            if message.get('trace_id') is not None:
+                kwargs['trace_id'] = message['trace_id']
+            self.db_changes_callback(
+                message['table'],
+                message['key'],
+                message['action'],
+                message['value'],
+                message['topic'],
+                **kwargs
+            )
+
+
+class ShardedPublisherAgent(PublisherAgentBase):
+    """Send each event to the publisher service owning its topic.
+
+    Topics are assigned to the publishers in the publisher table by
+    consistent hashing of their URIs (see ShardedSubscriber). Events are
+    sent to the relay endpoint of the owner, which publishes them. The
+    publisher table is re-read every refresh_interval seconds, so topics of
+    removed publishers move to the remaining ones.
+    """
+
+    def __init__(self, get_relay_publisher, get_publishers,
+                 refresh_interval):
+        super(ShardedPublisherAgent, self).__init__()
+        self._get_relay_publisher = get_relay_publisher
+        self._get_publishers = get_publishers
+        self._refresh_interval = refresh_interval
+        self._ring = hash_ring.HashRing()
+        self._relay_uris = {}
+        self._relays = {}
+        self._last_refresh = None
+
+    def initialize(self):
+        self._refresh()
+
+    def _refresh(self):
+        publishers = self._get_publishers()
+        self._last_refresh = time.time()
+        relay_uris = {p.uri: p.relay_uri for p in publishers}
+        for uri in self._ring.nodes - set(relay_uris):
+            LOG.info("Publisher %s removed from the sharding ring", uri)
+            self._ring.remove_node(uri)
+        for uri, relay_uri in relay_uris.items():
+            if self._relay_uris.get(uri) != relay_uri:
+                self._close_relay(uri)
+            self._ring.add_node(uri)
+        self._relay_uris = relay_uris
+
+    def _close_relay(self, uri):
+        relay = self._relays.pop(uri, None)
+        if relay is not None:
+            relay.close()
+
+    def _get_owner_relay(self, topic):
+        if time.time() - self._last_refresh >= self._refresh_interval:
+            self._refresh()
+        owner = self._ring.get_node(topic)
+        if owner is None:
+            return None
+        relay = self._relays.get(owner)
+        if relay is None:
+            relay_uri = self._relay_uris[owner]
+            if not relay_uri:
+                LOG.warning("Publisher %s does not support sharding", owner)
+                return None
+            relay = self._get_relay_publisher(relay_uri)
+            relay.initialize()
+            self._relays[owner] = relay
+        return relay
+
+    def _send_event(self, data, topic):
+        relay = self._get_owner_relay(topic.decode('utf8'))
+        if relay is None:
+            LOG.warning("No publisher to send event on topic %s", topic)
+            return
+        relay._send_event(data, topic)
+
+    def close(self):
+        for uri in list(self._relays):
+            self._close_relay(uri)
+
+
+class ShardedSubscriber(SubscriberApi):
+    """Wrap a subscriber s.t. it connects only to the publishers owning the
+    subscribed topics.
+
+    The registered publisher URIs are placed on a consistent hash ring, the
+    same as the one used by ShardedPublisherAgent. Registering or
+    unregistering a topic or a publisher reconnects only to the owners whose
+    topics changed.
+    """
+
+    def __init__(self, subscriber):
+        super(ShardedSubscriber, self).__init__()
+        self._subscriber = subscriber
+        self._ring = hash_ring.HashRing()
+        self._topics = set()
+        self._connected_uris = set()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._subscriber, name)
+
+    def _rebalance(self):
+        owners = {self._ring.get_node(topic) for topic in self._topics}
+        owners.discard(None)
+        for uri in self._connected_uris - owners:
+            self._subscriber.unregister_listen_address(uri)
+        for uri in owners - self._connected_uris:
+            self._subscriber.register_listen_address(uri)
+        self._connected_uris = owners
+
+    def initialize(self, callback):
+        return self._subscriber.initialize(callback)
+
+    def register_listen_address(self, uri):
+        if uri in self._ring.nodes:
+            return False
+        self._ring.add_node(uri)
+        self._rebalance()
+        return True
+
+    def unregister_listen_address(self, uri):
+        self._ring.remove_node(uri)
+        self._rebalance()
+
+    def register_topic(self, topic):
+        is_new = self._subscriber.register_topic(topic)
+        self._topics.add(topic)
+        self._rebalance()
+        return is_new
+
+    def unregister_topic(self, topic):
+        self._subscriber.unregister_topic(topic)
+        self._topics.discard(topic)
+        self._rebalance()
+
+    def run(self):
+        return self._subscriber.run()
+
+    def daemonize(self):
+        return self._subscriber.daemonize()
+
+    def close(self):
+        return self._subscriber.close()
+
+
+def _hash_value(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return hashlib.sha1(value).digest()
 
 
 class TableMonitor(object):
+    """Publish the changes of a table that is not published by its writers.
+
+    If the DB driver can watch the table (see DbApi.watch_table), changes are
+    published as they are notified, and the table is only polled every
+    resync_time seconds, to recover from lost notifications. Otherwise, it is
+    polled every polling_time seconds. Only a hash of each value is kept to
+    detect changes.
+    """
 
-    def __init__(self, table_name, driver, publisher, polling_time=10):
+    def __init__(self, table_name, driver, publisher, polling_time=10,
+                 resync_time=None):
         self._driver = driver
         self._publisher = publisher
         self._polling_time = polling_time
+        self._resync_time = resync_time
         self._daemon = threading.Thread(target=self.run)
         self._event = threading.Event()
         self._table_name = table_name
+        self._cache = {}
+        self._lock = threading.Lock()
 
     def daemonize(self):
         return self._daemon.start()
@@ -294,31 +573,72 @@ class TableMonitor(object):
         return self._event.set()
 
     def run(self):
-        cache = {}
         time.sleep(self._polling_time)
-        while self._event.is_set():
-            try:
-                cache = self._poll_once(cache)
-            except Exception:
-                LOG.exception("Error when polling table %s",
-                              self._table_name)
-            self._event.wait(self._polling_time)
+        # Watch before the first poll, so that no change is missed
+        polling_time = self._polling_time
+        if self._watch() and self._resync_time:
+            polling_time = self._resync_time
+        while not self._event.is_set():
+            self._poll()
+            self._event.wait(polling_time)
+
+    def _watch(self):
+        try:
+            return self._driver.watch_table(self._table_name,
+                                            self._on_change)
+        except Exception:
+            LOG.exception("Error when watching table %s, polling it",
+                          self._table_name)
+            return False
+
+    def _poll(self):
+        try:
+            with self._lock:
+                self._cache = self._poll_once(self._cache)
+        except Exception:
+            LOG.exception("Error when polling table %s",
+                          self._table_name)
+
+    def _on_change(self, action, entry_key, entry_value):
+        """Callback of the table watch. action 'sync' requests a poll, e.g.
+        when notifications were lost.
+        """
+        if action == 'sync':
+            self._poll()
+            return
+        with self._lock:
+            if action == 'delete' or entry_value is None:
+                if self._cache.pop(entry_key, None) is not None:
+                    self._send_event('delete', entry_key, None)
+            else:
+                self._update_entry(self._cache, entry_key, entry_value,
+                                   self._cache.get(entry_key))
+
+    def _update_entry(self, cache, entry_key, entry_value, old_hash):
+        value_hash = _hash_value(entry_value)
+        cache[entry_key] = value_hash
+        if old_hash is None:
+            self._send_event('create', entry_key, entry_value)
+        elif old_hash != value_hash:
+            self._send_event('set', entry_key, entry_value)
+
+    def _get_all_entries(self):
+        """Return the (key, value) pairs of the table, reading all the values
+        in one batch
+        """
+        entry_keys = self._driver.get_all_keys(self._table_name)
+        entry_values = self._driver.batch_get_keys(
+            [(self._table_name, entry_key, None) for entry_key in entry_keys])
+        return [(entry_key, entry_value)
+                for entry_key, entry_value in zip(entry_keys, entry_values)
+                if entry_value is not None]
 
     def _poll_once(self, old_cache):
         """Create a new cache and send events for changes from the old cache"""
         new_cache = {}
-        for entry_key in self._driver.get_all_keys(self._table_name):
-            entry_value = self._driver.get_key(
-                self._table_name,
-                entry_key)
-            if entry_value is None:
-                continue
-            old_value = old_cache.pop(entry_key, None)
-            if old_value is None:
-                self._send_event('create', entry_key, entry_value)
-            elif old_value != entry_value:
-                self._send_event('set', entry_key, entry_value)
-            new_cache[entry_key] = entry_value
+        for entry_key, entry_value in self._get_all_entries():
+            self._update_entry(new_cache, entry_key, entry_value,
+                               old_cache.pop(entry_key, None))
         for entry_key in old_cache:
             self._send_event('delete', entry_key, None)
         return new_cache
@@ -345,21 +665,22 @@ class StalePublisherMonitor(TableMonitor):
         self._timeout = timeout
         self._uuid = generate_publisher_uuid()
 
-    def _poll_once(self, old_cache):
-        """Scan for stale entries of other publishers"""
-        for entry_key in self._driver.get_all_keys(self._table_name):
-            publisher_json = self._driver.get_key(self._table_name, entry_key)
-            if publisher_json is None:
-                continue
-            publisher = jsonutils.loads(publisher_json)
-            if publisher['id'] == self._uuid:
-                continue
-            last_activity_timestamp = publisher['last_activity_timestamp']
-            if last_activity_timestamp < time.time() - self._timeout:
-                LOG.info('Removing publisher %s', publisher_json)
-                try:
-                    self._driver.delete_key(self._table_name, entry_key)
-                except exceptions.DBKeyNotFound:
-                    # Publisher already deleted. Ignore.
-                    pass
-        return super(StalePublisherMonitor, self)._poll_once(old_cache)
+    def _get_all_entries(self):
+        """Remove the stale entries of other publishers, and return the rest
+        """
+        entries = []
+        for entry_key, publisher_json in (
+                super(StalePublisherMonitor, self)._get_all_entries()):
+            publisher = model_serializer.load_struct(publisher_json)
+            if publisher['id'] != self._uuid:
+                last_activity_timestamp = publisher['last_activity_timestamp']
+                if last_activity_timestamp < time.time() - self._timeout:
+                    LOG.info('Removing publisher %s', publisher_json)
+                    try:
+                        self._driver.delete_key(self._table_name, entry_key)
+                    except exceptions.DBKeyNotFound:
+                        # Publisher already deleted. Ignore.
+                        pass
+                    continue
+            entries.append((entry_key, publisher_json))
+        return entries
@@ -114,7 +114,8 @@ class NbApiNeutronNotifier(neutron_notifier_api.NeutronNotifierDriver):
         LOG.info("Publish to neutron %s", topic)
         self.nb_api.publisher.send_event(update)
 
-    def notify_neutron_server(self, table, key, action, value, topic=None):
+    def notify_neutron_server(self, table, key, action, value, topic=None,
+                              trace_id=None):
         if l2.LogicalPort.table_name == table and 'update' == action:
             LOG.info("Process port %s status update event", key)
             core_plugin = directory.get_plugin()
@@ -60,6 +60,12 @@ class ZMQPubSubMultiproc(pub_sub_api.PubSubApi):
     def get_subscriber(self):
         return self.subscriber
 
+    def support_relay_publisher(self):
+        return True
+
+    def get_relay_publisher(self, uri):
+        return ZMQPublisherMultiprocAgent(uri)
+
 
 class ZMQPublisherAgentBase(pub_sub_api.PublisherAgentBase):
     def __init__(self):
@@ -104,15 +110,17 @@ class ZMQPublisherAgent(ZMQPublisherAgentBase):
 
 
 class ZMQPublisherMultiprocAgent(ZMQPublisherAgentBase):
-    def __init__(self):
+    def __init__(self, endpoint=None):
         super(ZMQPublisherMultiprocAgent, self).__init__()
+        if endpoint is None:
+            endpoint = 'ipc://%s' % cfg.CONF.df.publisher_multiproc_socket
+        self._endpoint = endpoint
         self.context = zmq.Context()
 
     def _connect(self):
         self.socket = self.context.socket(zmq.PUSH)
-        ipc_socket = cfg.CONF.df.publisher_multiproc_socket
-        LOG.debug("About to connect to IPC socket: %s", ipc_socket)
-        self.socket.connect('ipc://%s' % ipc_socket)
+        LOG.debug("About to connect to socket: %s", self._endpoint)
+        self.socket.connect(self._endpoint)
 
 
 class ZMQSubscriberAgentBase(pub_sub_api.SubscriberAgentBase):
@@ -174,6 +182,14 @@ class ZMQSubscriberMultiprocAgent(ZMQSubscriberAgentBase):
         ipc_socket = cfg.CONF.df.publisher_multiproc_socket
         LOG.debug("About to bind to IPC socket: %s", ipc_socket)
         self.sub_socket.bind('ipc://%s' % ipc_socket)
+        if cfg.CONF.df.enable_publisher_sharding:
+            # Events of the topics this publisher owns, from Neutron servers
+            relay_endpoint = 'tcp://%s:%s' % (
+                cfg.CONF.df.publisher_bind_address,
+                cfg.CONF.df.publisher_relay_port,
+            )
+            LOG.debug("About to bind to relay socket: %s", relay_endpoint)
+            self.sub_socket.bind(relay_endpoint)
 
 
 class ZMQSubscriberAgent(ZMQSubscriberAgentBase):
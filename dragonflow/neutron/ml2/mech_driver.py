@@ -25,6 +25,7 @@ from oslo_log import log
 from dragonflow._i18n import _
 from dragonflow.common import constants as df_common_const
 from dragonflow.common import exceptions as df_exceptions
+from dragonflow.common import tracing
 from dragonflow.common import utils as df_utils
 from dragonflow import conf as cfg
 from dragonflow.db import api_nb
@@ -476,7 +477,10 @@ class DFMechDriver(api.MechanismDriver):
         lport = neutron_l2.logical_port_from_neutron_port(port)
         lport.chassis = chassis
         lport.remote_vtep = remote_vtep
-        self.nb_api.create(lport)
+        with tracing.trace(tracing.new_trace_id()):
+            tracing.record(tracing.PORT_POSTCOMMIT,
+                           table=lport.table_name, key=lport.id)
+            self.nb_api.create(lport)
 
         LOG.info("DFMechDriver: create port %s", port['id'])
         return port
@@ -537,7 +541,10 @@ class DFMechDriver(api.MechanismDriver):
         lport = neutron_l2.logical_port_from_neutron_port(updated_port)
         lport.chassis = chassis
         lport.remote_vtep = remote_vtep
-        self.nb_api.update(lport)
+        with tracing.trace(tracing.new_trace_id()):
+            tracing.record(tracing.PORT_POSTCOMMIT,
+                           table=lport.table_name, key=lport.id)
+            self.nb_api.update(lport)
 
         LOG.info("DFMechDriver: update port %s", updated_port['id'])
         return updated_port
@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo_config import cfg
 from ovs.db import idl
 from ovsdbapp.backend.ovs_idl import connection
@@ -73,6 +75,14 @@ class DFIdl(idl.Idl):
         self.interface_type = (constants.OVS_VM_INTERFACE,
                                constants.OVS_TUNNEL_INTERFACE,
                                constants.OVS_BRIDGE_INTERFACE)
+        # Index of the Interface rows by external_ids:iface-id, which is
+        # looked up on every logical port processing
+        self._iface_uuids_by_id = collections.defaultdict(set)
+        self._iface_ids = {}
+        # Bridges of interfaces, resolved on demand. Invalidated whenever
+        # ports or bridges change.
+        self._iface_bridges = {}
+        self._iface_bridges_generation = 0
 
     def _is_handle_interface_update(self, interface):
         if interface.name == cfg.CONF.df_metadata.metadata_interface:
@@ -83,12 +93,64 @@ class DFIdl(idl.Idl):
             return False
         return True
 
+    def _invalidate_iface_bridges(self, uuid=None):
+        self._iface_bridges_generation += 1
+        if uuid is None:
+            self._iface_bridges = {}
+        else:
+            self._iface_bridges.pop(uuid, None)
+
+    def _update_interface_index(self, event, row):
+        old_iface_id = self._iface_ids.pop(row.uuid, None)
+        if old_iface_id is not None:
+            uuids = self._iface_uuids_by_id[old_iface_id]
+            uuids.discard(row.uuid)
+            if not uuids:
+                del self._iface_uuids_by_id[old_iface_id]
+
+        if event == 'delete':
+            return
+
+        iface_id = row.external_ids.get('iface-id')
+        if iface_id is not None:
+            self._iface_uuids_by_id[iface_id].add(row.uuid)
+            self._iface_ids[row.uuid] = iface_id
+
+    def get_interfaces_by_iface_id(self, iface_id):
+        """Return the Interface rows whose external_ids:iface-id is iface_id
+        """
+        rows = self.tables['Interface'].rows
+        uuids = tuple(self._iface_uuids_by_id.get(iface_id, ()))
+        return [rows[uuid] for uuid in uuids if uuid in rows]
+
+    def get_interface_bridge(self, row, resolve_bridge):
+        """Return the name of the bridge of the Interface row. It is resolved
+        by resolve_bridge(interface_name) if not already cached.
+        """
+        try:
+            return self._iface_bridges[row.uuid]
+        except KeyError:
+            pass
+
+        generation = self._iface_bridges_generation
+        bridge = resolve_bridge(row.name)
+        # Don't cache a bridge resolved while interfaces moved
+        if generation == self._iface_bridges_generation:
+            self._iface_bridges[row.uuid] = bridge
+        return bridge
+
     def notify(self, event, row, updates=None):
         if not row or not hasattr(row, '_table'):
             return
+        if row._table.name in ('Bridge', 'Port'):
+            self._invalidate_iface_bridges()
+            return
         if row._table.name != 'Interface':
             return
 
+        self._update_interface_index(event, row)
+        self._invalidate_iface_bridges(row.uuid)
+
         local_interface = ovs.OvsPort.from_idl_row(row)
         action = event if event != 'update' else 'set'
         if self._is_handle_interface_update(local_interface):
@@ -96,7 +158,7 @@ class DFIdl(idl.Idl):
                 local_interface.table_name,
                 local_interface.id,
                 action,
-                local_interface.to_json(),
+                local_interface.to_struct(),
             )
 
 
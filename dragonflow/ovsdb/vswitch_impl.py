@@ -18,6 +18,7 @@ import netaddr
 from oslo_config import cfg
 from oslo_log import log
 from ovs import vlog
+from ovsdbapp.backend.ovs_idl import idlutils
 
 from dragonflow.ovsdb import impl_idl
 from dragonflow.ovsdb import objects
@@ -120,21 +121,27 @@ class OvsApi(object):
 
         return True
 
+    def _get_integration_bridge_iface_row(self, port_id):
+        # Read from the IDL replica, through its iface-id index, rather than
+        # by a db_find over all the interfaces
+        idl = self.ovsdb.idl
+        for row in idl.get_interfaces_by_iface_id(port_id):
+            bridge = idl.get_interface_bridge(row,
+                                              self._get_bridge_for_iface)
+            if self.integration_bridge != bridge:
+                # iface-id is the port id in neutron, the same neutron port
+                # might create multiple interfaces in different bridges
+                continue
+            return row
+
     def get_interface_by_id_with_specified_columns(self, port_id,
                                                    specified_columns):
         columns = {'external_ids', 'name'}
         columns.update(specified_columns)
-        ifaces = self.ovsdb.db_find(
-            'Interface', ('external_ids', '=', {'iface-id': port_id}),
-            columns=columns).execute()
-
-        for iface in ifaces:
-            if (self.integration_bridge !=
-                    self._get_bridge_for_iface(iface['name'])):
-                # iface-id is the port id in neutron, the same neutron port
-                # might create multiple interfaces in different bridges
-                continue
-            return iface
+        row = self._get_integration_bridge_iface_row(port_id)
+        if row is not None:
+            return {column: idlutils.get_column_value(row, column)
+                    for column in columns}
 
     def get_port_ofport_by_id(self, port_id):
         iface = self.get_interface_by_id_with_specified_columns(
@@ -149,17 +156,9 @@ class OvsApi(object):
             return iface['mac_in_use']
 
     def _get_port_name_by_id(self, port_id):
-        ifaces = self.ovsdb.db_find(
-            'Interface', ('external_ids', '=', {'iface-id': port_id}),
-            columns=['external_ids', 'name']).execute()
-        for iface in ifaces:
-            if (self.integration_bridge !=
-                    self._get_bridge_for_iface(iface['name'])):
-                # iface-id is the port id in neutron, the same neutron port
-                # might create multiple interfaces in different bridges
-                continue
-
-            return iface['name']
+        row = self._get_integration_bridge_iface_row(port_id)
+        if row is not None:
+            return row.name
 
     def create_patch_port(self, bridge, port, remote_name):
         if cfg.CONF.df.enable_dpdk:
@@ -13,13 +13,26 @@
 import copy
 
 import mock
+from ryu.lib.packet import ethernet
 from ryu.lib.packet import icmp
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import packet
+from ryu.lib.packet import udp
 
 from dragonflow.controller.common import constants as const
 from dragonflow.db.models import l3
 from dragonflow.tests.unit import test_app_base
 
 
+def _udp_packet_data():
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst='fa:16:3e:50:96:f5'))
+    pkt.add_protocol(ipv4.ipv4(src='10.0.0.6', dst='10.0.0.1', proto=17))
+    pkt.add_protocol(udp.udp(src_port=1000, dst_port=53))
+    pkt.serialize()
+    return pkt.data
+
+
 class L3AppTestCaseMixin(object):
 
     def _add_another_router_interface(self):
@@ -65,6 +78,7 @@ class L3AppTestCaseMixin(object):
     def test_reply_ttl_invalid_message_with_rate_limit(self):
         event = mock.Mock()
         event.msg.reason = self.app.ofproto.OFPR_INVALID_TTL
+        event.msg.data = _udp_packet_data()
         with mock.patch.object(self.app, "router_port_rarp_cache") as rarp:
             rarp.get = mock.Mock(return_value="10.0.0.1")
             with mock.patch("ryu.lib.packet.packet.Packet"):
@@ -89,6 +103,7 @@ class L3AppTestCaseMixin(object):
         with mock.patch.object(self.app, "router_port_rarp_cache") as rarp:
             rarp.values.return_value = ["10.0.0.1"]
             event = mock.Mock()
+            event.msg.data = _udp_packet_data()
             fake_ip_pkt = mock.Mock()
             fake_ip_pkt.dst = "10.0.0.1"
             fake_pkt = mock.Mock()
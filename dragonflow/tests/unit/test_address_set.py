@@ -0,0 +1,66 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import random
+
+import netaddr
+
+from dragonflow.tests import base as tests_base
+from dragonflow.utils import address_set
+
+
+class TestAddressSet(tests_base.BaseTestCase):
+    def test_aggregation(self):
+        addresses = address_set.AddressSet()
+        added, removed = addresses.add(
+            ['10.0.0.%d' % (i,) for i in range(8)] + ['2001:db8::1'])
+        expected = {netaddr.IPNetwork('10.0.0.0/29'),
+                    netaddr.IPNetwork('2001:db8::1/128')}
+        self.assertEqual(expected, added)
+        self.assertEqual(set(), removed)
+        self.assertEqual(9, len(addresses))
+        self.assertIn('10.0.0.3', addresses)
+        self.assertNotIn('10.0.0.8', addresses)
+
+        added, removed = addresses.remove(['10.0.0.3', '2001:db8::1'])
+        self.assertEqual({netaddr.IPNetwork('10.0.0.0/31'),
+                          netaddr.IPNetwork('10.0.0.2/32'),
+                          netaddr.IPNetwork('10.0.0.4/30')}, added)
+        self.assertEqual(expected, removed)
+
+        # Adding an address back yields the original aggregation
+        added, removed = addresses.update(['10.0.0.3'], ['10.0.0.3'])
+        self.assertEqual((set(), set()), (added, removed))
+        addresses.remove(['10.0.0.%d' % (i,) for i in range(8)])
+        self.assertFalse(addresses)
+        self.assertEqual([], addresses.iter_cidrs())
+
+    def test_same_as_ipset(self):
+        rand = random.Random(0)
+        addresses = address_set.AddressSet()
+        ip_set = netaddr.IPSet()
+        present = []
+        for _ in range(500):
+            old_cidrs = set(ip_set.iter_cidrs())
+            if present and rand.random() < 0.4:
+                address = present.pop(rand.randrange(len(present)))
+                added, removed = addresses.remove([address])
+                ip_set.remove(address)
+            else:
+                address = '10.0.0.%d' % (rand.randrange(64),)
+                if address not in present:
+                    present.append(address)
+                added, removed = addresses.add([address])
+                ip_set.add(address)
+            new_cidrs = set(ip_set.iter_cidrs())
+            self.assertEqual(new_cidrs - old_cidrs, added)
+            self.assertEqual(old_cidrs - new_cidrs, removed)
+            self.assertEqual(ip_set.iter_cidrs(), addresses.iter_cidrs())
@@ -11,12 +11,14 @@
 #    under the License.
 from jsonmodels import fields
 import mock
+from oslo_serialization import jsonutils
 
 from dragonflow.common import exceptions
 from dragonflow.db import api_nb
 from dragonflow.db import db_common
 import dragonflow.db.field_types as df_fields
 import dragonflow.db.model_framework as mf
+from dragonflow.db import model_serializer
 from dragonflow.db.models import mixins
 from dragonflow.tests import base as tests_base
 
@@ -81,6 +83,19 @@ class TestNbApi(tests_base.BaseTestCase):
 
         m.on_create_pre.assert_called()
 
+    def test_create_msgpack(self):
+        self.api_nb.serializer = model_serializer.MSGPACK
+        m = ModelTest(id='id1', topic='topic', field1='1')
+        self.api_nb.create(m)
+
+        update, = self.api_nb.publisher.send_event.call_args_list[0][0]
+        self.assertEqual(m.to_struct(), update.value)
+
+        self.api_nb.driver.create_key.assert_called_once_with(
+            'dummy_table', 'id1',
+            model_serializer.serialize(m, model_serializer.MSGPACK),
+            'topic')
+
     def test_update(self):
         old_m = ModelTest(id='id1', topic='topic', field1='2')
         old_m.on_update_pre = mock.Mock()
@@ -154,8 +169,8 @@ class TestNbApi(tests_base.BaseTestCase):
                               (o.to_struct() for o in res))
         ModelTest.on_get_all_post.assert_called_once()
 
-    @mock.patch.object(TopicModelTest, 'from_json')
-    def test_get_topic(self, from_json):
+    @mock.patch.object(model_serializer, 'deserialize')
+    def test_get_topic(self, deserialize):
         self.api_nb.get(TopicModelTest(id='id1'))
         self.api_nb.driver.get_key.assert_called_once_with('topic_model_test',
                                                            'id1', None)
@@ -175,3 +190,169 @@ class TestNbApi(tests_base.BaseTestCase):
         self.api_nb.get(m.reffering_field)
         self.api_nb.driver.get_key.assert_called_once_with('dummy_table',
                                                            'id2', None)
+
+    def test_changelog_disabled(self):
+        self.api_nb.create(ModelTest(id='id1', topic='topic'))
+        self.api_nb.driver.allocate_unique_key.assert_not_called()
+
+    def test_create_records_change(self):
+        self.api_nb.enable_changelog = True
+        self.api_nb.changelog_size = 2
+        self.api_nb.driver.allocate_unique_key.return_value = 3
+        self.api_nb.driver.get_key.return_value = '2'
+        self.api_nb.create(ModelTest(id='id1', topic='topic'))
+
+        self.api_nb.driver.allocate_unique_key.assert_called_once_with(
+            'df_changelog_dummy_table')
+        self.api_nb.driver.create_key.assert_called_with(
+            'df_changelog_dummy_table', '3',
+            jsonutils.dumps({'key': 'id1', 'action': 'create',
+                             'topic': 'topic'}))
+        self.api_nb.driver.set_key.assert_called_once_with(
+            'df_generations', 'dummy_table', '3')
+        self.api_nb.driver.delete_key.assert_called_once_with(
+            'df_changelog_dummy_table', '1')
+
+    def test_record_change_keeps_newer_generation(self):
+        self.api_nb.enable_changelog = True
+        self.api_nb.driver.allocate_unique_key.return_value = 3
+        # Recorded by a concurrent writer
+        self.api_nb.driver.get_key.return_value = '4'
+        self.api_nb.create(ModelTest(id='id1', topic='topic'))
+        self.api_nb.driver.set_key.assert_not_called()
+
+    def test_get_changes_since(self):
+        self.api_nb.changelog_size = 10
+        changelog = {
+            ('df_generations', 'dummy_table'): '3',
+            ('df_changelog_dummy_table', '2'): '{"key": "id1"}',
+            ('df_changelog_dummy_table', '3'): '{"key": "id2"}',
+        }
+        self.api_nb.driver.get_key.side_effect = \
+            lambda table, key: changelog[(table, key)]
+        self.api_nb.driver.batch_get_keys.side_effect = \
+            lambda requests: [changelog.get((table, key))
+                              for table, key, topic in requests]
+
+        self.assertEqual((3, [{'key': 'id1', 'generation': 2},
+                              {'key': 'id2', 'generation': 3}]),
+                         self.api_nb.get_changes_since(ModelTest, 1))
+        self.assertEqual((3, []),
+                         self.api_nb.get_changes_since(ModelTest, 3))
+        # Newer than the table
+        self.assertIsNone(self.api_nb.get_changes_since(ModelTest, 4))
+
+        # The recorded generation lags behind a concurrent writer
+        changelog[('df_changelog_dummy_table', '4')] = '{"key": "id3"}'
+        self.assertEqual((4, []),
+                         self.api_nb.get_changes_since(ModelTest, 4))
+
+    def test_get_changes_since_truncated(self):
+        self.api_nb.changelog_size = 10
+        self.api_nb.driver.get_key.return_value = '30'
+        self.assertIsNone(self.api_nb.get_changes_since(ModelTest, 1))
+
+        self.api_nb.driver.get_key.return_value = '3'
+        self.api_nb.driver.batch_get_keys.return_value = [None, '{}']
+        self.assertIsNone(self.api_nb.get_changes_since(ModelTest, 1))
+
+
+@mf.construct_nb_db_model
+class DependentModelTest(mf.ModelBase):
+    table_name = 'dependent_model_test'
+
+    ref = df_fields.ReferenceField(ModelTest)
+
+
+class TestCoalesceDbUpdates(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestCoalesceDbUpdates, self).setUp()
+        lookup = {'dummy_table': ModelTest,
+                  'dependent_model_test': DependentModelTest}
+        for name, kwargs in (
+            ('get_model', {'side_effect': lookup.__getitem__}),
+            ('iter_models_by_dependency_order',
+             {'return_value': [ModelTest, DependentModelTest]}),
+        ):
+            patcher = mock.patch.object(mf, name, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _update(self, table, key, action, value=None):
+        return db_common.DbUpdate(table, key, action, value)
+
+    def _summary(self, updates):
+        return [(u.table, u.key, u.action, u.value) for u in updates]
+
+    def test_newest_update_survives(self):
+        updates = [
+            self._update('dummy_table', 'id1', 'set', 'v1'),
+            self._update('dummy_table', 'id1', 'set', 'v2'),
+            self._update('dummy_table', 'id1', 'set', 'v3'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id1', 'set', 'v3')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
+
+    def test_create_then_update_is_create(self):
+        updates = [
+            self._update('dummy_table', 'id1', 'create', 'v1'),
+            self._update('dummy_table', 'id1', 'set', 'v2'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id1', 'create', 'v2')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
+
+    def test_create_then_delete_cancels(self):
+        updates = [
+            self._update('dummy_table', 'id1', 'create', 'v1'),
+            self._update('dummy_table', 'id1', 'set', 'v2'),
+            self._update('dummy_table', 'id1', 'delete', 'id1'),
+        ]
+        self.assertEqual([], api_nb.coalesce_db_updates(updates))
+
+    def test_update_then_delete_is_delete(self):
+        updates = [
+            self._update('dummy_table', 'id1', 'set', 'v1'),
+            self._update('dummy_table', 'id1', 'delete', 'id1'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id1', 'delete', 'id1')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
+
+    def test_dependency_order(self):
+        updates = [
+            self._update('dependent_model_test', 'id1', 'create', 'v1'),
+            self._update('dummy_table', 'id4', 'create', 'v4'),
+            self._update('dummy_table', 'id3', 'delete', 'id3'),
+            self._update('dependent_model_test', 'id2', 'delete', 'id2'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id4', 'create', 'v4'),
+             ('dependent_model_test', 'id1', 'create', 'v1'),
+             ('dependent_model_test', 'id2', 'delete', 'id2'),
+             ('dummy_table', 'id3', 'delete', 'id3')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
+
+    def test_delete_stays_before_later_create(self):
+        # Port id2 takes the IP of port id1, which was deleted before
+        updates = [
+            self._update('dummy_table', 'id1', 'delete', 'id1'),
+            self._update('dummy_table', 'id2', 'create', 'ip1'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id1', 'delete', 'id1'),
+             ('dummy_table', 'id2', 'create', 'ip1')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
+
+    def test_control_events_are_barriers(self):
+        updates = [
+            self._update('dummy_table', 'id1', 'set', 'v1'),
+            self._update(None, None, 'sync'),
+            self._update('dummy_table', 'id1', 'set', 'v2'),
+        ]
+        self.assertEqual(
+            [('dummy_table', 'id1', 'set', 'v1'),
+             (None, None, 'sync', None),
+             ('dummy_table', 'id1', 'set', 'v2')],
+            self._summary(api_nb.coalesce_db_updates(updates)))
@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import netaddr
+
+from dragonflow.controller.common import conntrack
+from dragonflow.tests import base as tests_base
+
+
+class TestConntrackFlusher(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestConntrackFlusher, self).setUp()
+        self.delete_by_filter = mock.patch(
+            'dragonflow.controller.common.utils.'
+            'delete_conntrack_entries_by_filter').start()
+        self.netlink_lib = mock.Mock()
+        mock.patch.object(conntrack, '_import_netlink_lib',
+                          return_value=self.netlink_lib).start()
+        self.netlink_lib.ATTR_POSITIONS = {
+            'tcp': [('sport', 7), ('dport', 8), ('src', 5), ('dst', 6),
+                    ('zone', 15)],
+            'icmp': [('type', 6), ('code', 7), ('src', 4), ('dst', 5),
+                     ('id', 8), ('zone', 16)],
+        }
+
+    def test_batch_deduplicates_filters(self):
+        flusher = conntrack.ConntrackFlusher(conntrack.DRIVER_CLI)
+        with flusher.batch():
+            with flusher.batch():
+                flusher.delete_entries(ethertype='IPv4', protocol='tcp',
+                                       nw_dst=netaddr.IPAddress('10.0.0.1'),
+                                       zone=1)
+                flusher.delete_entries(ethertype='IPv4',
+                                       nw_dst=netaddr.IPAddress('10.0.0.1'),
+                                       zone=1)
+            flusher.delete_entries(ethertype='IPv4', nw_dst='10.0.0.1',
+                                   zone=1)
+            flusher.delete_entries(ethertype='IPv4', nw_src='10.0.0.1',
+                                   nw_dst='10.0.0.2', zone=1)
+            self.delete_by_filter.assert_not_called()
+        self.assertEqual(
+            [mock.call(ethertype='IPv4', protocol=None, nw_src=None,
+                       nw_dst='10.0.0.1', zone=1),
+             mock.call(ethertype='IPv4', protocol=None, nw_src='10.0.0.1',
+                       nw_dst='10.0.0.2', zone=1)],
+            self.delete_by_filter.call_args_list)
+
+        # Outside a batch, filters are executed immediately
+        flusher.delete_entries(ethertype='IPv6', nw_src='::1', zone=2)
+        self.assertEqual(3, self.delete_by_filter.call_count)
+
+    def test_netlink_dump_and_delete(self):
+        tcp_entry = (4, 'tcp', 1000, 80, '10.0.0.1', '10.0.0.2', 1)
+        icmp_entry = (4, 'icmp', 8, 0, '10.0.0.3', '10.0.0.2', 5, 1)
+        other_entry = (4, 'tcp', 1000, 80, '10.0.0.1', '10.0.0.4', 1)
+        self.netlink_lib.list_entries.return_value = [tcp_entry, icmp_entry,
+                                                      other_entry]
+        flusher = conntrack.ConntrackFlusher(conntrack.DRIVER_NETLINK)
+        with flusher.batch():
+            flusher.delete_entries(ethertype='IPv4', protocol='tcp',
+                                   nw_src='10.0.0.1', nw_dst='10.0.0.2',
+                                   zone=1)
+            flusher.delete_entries(ethertype='IPv4', protocol=1,
+                                   nw_dst='10.0.0.2', zone=1)
+            # Not supported by the netlink driver
+            flusher.delete_entries(ethertype='IPv4', protocol='gre',
+                                   nw_dst='10.0.0.2', zone=1)
+            # Would miss the entries of the protocols netlink does not list
+            flusher.delete_entries(ethertype='IPv6', nw_dst='::2', zone=1)
+
+        self.netlink_lib.list_entries.assert_called_once_with(1)
+        self.netlink_lib.delete_entries.assert_called_once_with(
+            [tcp_entry, icmp_entry])
+        self.assertEqual(
+            [mock.call(ethertype='IPv4', protocol='gre', nw_src=None,
+                       nw_dst='10.0.0.2', zone=1),
+             mock.call(ethertype='IPv6', protocol=None, nw_src=None,
+                       nw_dst='::2', zone=1)],
+            self.delete_by_filter.call_args_list)
+
+    def test_netlink_failure_falls_back_to_cli(self):
+        self.netlink_lib.list_entries.side_effect = RuntimeError
+        flusher = conntrack.ConntrackFlusher(conntrack.DRIVER_NETLINK)
+        flusher.delete_entries(ethertype='IPv4', protocol='tcp',
+                               nw_dst='10.0.0.2', zone=1)
+        self.netlink_lib.delete_entries.assert_not_called()
+        self.delete_by_filter.assert_called_once_with(
+            ethertype='IPv4', protocol='tcp', nw_src=None, nw_dst='10.0.0.2',
+            zone=1)
+
+    def test_netlink_import_failure_uses_cli(self):
+        conntrack._import_netlink_lib.side_effect = ImportError
+        flusher = conntrack.ConntrackFlusher(conntrack.DRIVER_NETLINK)
+        flusher.delete_entries(ethertype='IPv4', nw_dst='10.0.0.2', zone=1)
+        self.delete_by_filter.assert_called_once_with(
+            ethertype='IPv4', protocol=None, nw_src=None, nw_dst='10.0.0.2',
+            zone=1)
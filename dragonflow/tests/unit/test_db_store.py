@@ -17,6 +17,7 @@ import mock
 from dragonflow.db import db_store
 from dragonflow.db import db_store2
 from dragonflow.db import field_types as df_fields
+from dragonflow.db import model_compact
 from dragonflow.db import model_framework
 from dragonflow.db.models import mixins
 from dragonflow.tests import base as tests_base
@@ -461,3 +462,77 @@ class TestDbStore2(tests_base.BaseTestCase):
         self.db_store.update(o1)
         self.db_store.update(o2)
         self.assertTrue(o1._is_object_stale)
+
+
+@model_framework.construct_nb_db_model
+class CompactModelTest(model_framework.ModelBase, mixins.Topic):
+    table_name = 'compact_model_test'
+
+    extra_field = fields.StringField()
+    ref1 = df_fields.ReferenceField(ReffedModel)
+    ips = df_fields.ListOfField(df_fields.IpAddressField())
+
+
+class TestDbStore2Compact(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestDbStore2Compact, self).setUp()
+        self.db_store = db_store2.DbStore2()
+        self.db_store.enable_compact_storage()
+
+    def _get_stored(self, obj_id):
+        return self.db_store._get_cache(CompactModelTest)._objs[obj_id]
+
+    def test_store_retrieve(self):
+        o1 = CompactModelTest(id='id1', topic='topic', ref1='ref1',
+                              ips=['10.0.0.1', '10.0.0.2'])
+        struct = o1.to_struct()
+        self.db_store.update(o1)
+        del o1
+
+        stored = self._get_stored('id1')
+        self.assertTrue(model_compact.is_compact_model(stored))
+        self.assertFalse(hasattr(stored, '__dict__'))
+        self.assertEqual('ref1', stored.ref1)
+
+        o1 = self.db_store.get_one(CompactModelTest(id='id1'))
+        self.assertIsInstance(o1, CompactModelTest)
+        self.assertEqual(struct, o1.to_struct())
+        self.assertFalse(o1.field_is_set('extra_field'))
+
+    def test_materialized_instance_reused(self):
+        self.db_store.update(CompactModelTest(id='id1', topic='topic'))
+        o1 = self.db_store.get_one(CompactModelTest(id='id1'))
+        self.assertIs(o1, self.db_store.get_one(CompactModelTest(id='id1')))
+
+    def test_extra_attributes_kept(self):
+        o1 = CompactModelTest(id='id1', topic='topic')
+        o1.ofport = 1
+        self.db_store.update(o1)
+        del o1
+
+        o1 = self.db_store.get_one(CompactModelTest(id='id1'))
+        self.assertEqual(1, o1.ofport)
+
+    def test_get_all_by_topic(self):
+        self.db_store.update(CompactModelTest(id='id1', topic='topic1'))
+        self.db_store.update(CompactModelTest(id='id2', topic='topic2'))
+        self.assertEqual(
+            ['id1'],
+            [o.id for o in self.db_store.get_all_by_topic(CompactModelTest,
+                                                          'topic1')])
+
+    def test_delete(self):
+        self.db_store.update(CompactModelTest(id='id1', topic='topic'))
+        self.db_store.delete(CompactModelTest(id='id1'))
+        self.assertIsNone(
+            self.db_store.get_one(CompactModelTest(id='id1')))
+
+    def test_mark_object_as_stale(self):
+        self.db_store.update(CompactModelTest(id='id1', topic='topic'))
+        o1 = self.db_store.get_one(CompactModelTest(id='id1'))
+        self.db_store.update(CompactModelTest(id='id1', topic='topic',
+                                              extra_field='test'))
+        self.assertTrue(o1._is_object_stale)
+        self.assertEqual(
+            'test',
+            self.db_store.get_one(CompactModelTest(id='id1')).extra_field)
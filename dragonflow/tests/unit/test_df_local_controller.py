@@ -147,6 +147,20 @@ class DfLocalControllerTestCase(test_app_base.DFAppTestBase):
         mock_delete_lport.assert_called_once_with(lport)
         mock_db_store2_delete.assert_called_once_with(chassis)
 
+    def test_delete_publisher_by_id(self):
+        publisher = core.Publisher(id='publisher1',
+                                   uri='tcp://10.0.0.1:8866',
+                                   last_activity_timestamp=0)
+        self.controller.db_store2.update(publisher)
+        subscriber = self.controller.nb_api.subscriber
+        subscriber.reset_mock()
+
+        self.controller.delete_by_id(core.Publisher, 'publisher1')
+        subscriber.unregister_listen_address.assert_called_once_with(
+            'tcp://10.0.0.1:8866')
+        self.assertIsNone(self.controller.db_store2.get_one(
+            core.Publisher(id='publisher1')))
+
     @mock.patch.object(ryu_base_app.RyuDFAdapter,
                        'notify_update_active_port')
     @mock.patch.object(db_store.DbStore, 'update_active_port')
@@ -268,3 +282,24 @@ class DfLocalControllerTestCase(test_app_base.DFAppTestBase):
         get_one.return_value = None
         self.controller.delete_model_object(None)
         self.assertFalse(delete.called)
+
+    @mock.patch.object(df_local_controller.DfLocalController, 'update')
+    @mock.patch.object(db_store2.DbStore2, 'get_one')
+    def test_update_from_envelope(self, get_one, update):
+        lport = l2.LogicalPort(id='lport1', topic='topic', version=2,
+                               unique_key=1)
+        envelope = l2.LogicalPort.envelope_from_json(lport.to_json())
+
+        get_one.return_value = l2.LogicalPort(id='lport1', version=2)
+        self.controller.update_from_envelope(envelope)
+        update.assert_not_called()
+        get_one.assert_called_once_with(l2.LogicalPort(id='lport1'))
+
+        get_one.return_value = l2.LogicalPort(id='lport1', version=1)
+        self.controller.update_from_envelope(envelope)
+        update.assert_called_once_with(envelope.decode())
+
+        update.reset_mock()
+        get_one.return_value = None
+        self.controller.update_from_envelope(envelope)
+        update.assert_called_once_with(envelope.decode())
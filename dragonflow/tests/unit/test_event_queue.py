@@ -0,0 +1,91 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from dragonflow.db import db_common
+from dragonflow.db import event_queue
+from dragonflow.tests import base as tests_base
+
+
+def _update(table, key, action='set', value=None, topic=None):
+    return db_common.DbUpdate(table, key, action, value, topic=topic)
+
+
+class TestLanedQueue(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestLanedQueue, self).setUp()
+        self.queue = event_queue.LanedQueue(local_weight=2, topic_quantum=2)
+
+    def _get_all(self):
+        keys = []
+        while self.queue.qsize():
+            keys.append(self.queue.get_nowait().key)
+            self.queue.task_done()
+        return keys
+
+    def test_topics_round_robin(self):
+        for i in range(5):
+            self.queue.put(_update('lswitch', 'a%d' % i, topic='tenant1'))
+        self.queue.put(_update('lswitch', 'b0', topic='tenant2'))
+        self.queue.put(_update('lswitch', 'b1', topic='tenant2'))
+        self.queue.put(_update('lswitch', 'b2', topic='tenant2'))
+        self.assertEqual(['a0', 'a1', 'b0', 'b1', 'a2', 'a3', 'b2', 'a4'],
+                         self._get_all())
+
+    def test_lanes(self):
+        for i in range(3):
+            self.queue.put(_update('lport', 'r%d' % i, topic='tenant1'))
+        # The interface of a local port is plugged, and the port bound
+        self.queue.put(_update('ovs_port', 'l0', value={'iface_id': 'l1'}))
+        self.queue.put(_update('lport', 'l1', topic='tenant2'))
+        self.queue.put(_update('lport', 'l2', topic='tenant2'))
+        self.queue.put(_update(None, 'c0', action='sync'))
+        stats = self.queue.get_stats()
+        self.assertEqual(1, stats['control']['depth'])
+        self.assertEqual(2, stats['local']['depth'])
+        self.assertEqual(4, stats['remote']['depth'])
+        self.assertEqual(['c0', 'l0', 'l1', 'r0', 'r1', 'l2', 'r2'],
+                         self._get_all())
+
+        stats = self.queue.get_stats()
+        self.assertEqual({'control', 'local', 'remote'}, set(stats))
+        self.assertEqual(0, stats['local']['depth'])
+        self.assertEqual(2, stats['local']['dequeued'])
+        self.assertEqual(4, stats['remote']['dequeued'])
+        self.assertLessEqual(stats['remote']['avg_wait'],
+                             stats['remote']['max_wait'])
+
+    def test_object_updates_stay_in_order(self):
+        self.queue.put(_update('lport', 'p1', value='v1', topic='tenant1'))
+        for i in range(3):
+            self.queue.put(_update('lport', 'r%d' % i, topic='tenant1'))
+        # p1 is bound only after its first update was queued
+        self.queue.put(_update('ovs_port', 'o1', value={'iface_id': 'p1'}))
+        self.queue.put(_update('lport', 'p1', value='v2', topic='tenant1'))
+        values = []
+        while self.queue.qsize():
+            update = self.queue.get_nowait()
+            if update.key == 'p1':
+                values.append(update.value)
+        self.assertEqual(['v1', 'v2'], values)
+
+    def test_dependencies_not_overtaken(self):
+        for i in range(3):
+            self.queue.put(_update('lswitch', 's%d' % i, topic='tenant1'))
+        # A port of tenant2 on a network shared by tenant1
+        self.queue.put(_update('lport', 'p0', topic='tenant2'))
+        self.queue.put(_update('lport', 'p1', action='delete',
+                               topic='tenant2'))
+        self.queue.put(_update('lswitch', 's3', action='delete',
+                               topic='tenant1'))
+        self.queue.put(_update('lswitch', 's4', topic='tenant1'))
+        self.assertEqual(['s0', 's1', 's2', 'p0', 'p1', 's3', 's4'],
+                         self._get_all())
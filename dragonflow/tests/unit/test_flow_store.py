@@ -0,0 +1,139 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+from ryu.ofproto import ofproto_v1_3 as ofproto
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+from dragonflow.controller import flow_store
+from dragonflow.tests import base as tests_base
+
+
+class TestFlowStore(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestFlowStore, self).setUp()
+        self.datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.store = flow_store.FlowStore()
+
+    def _inst(self, port):
+        return [parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS, [parser.OFPActionOutput(port)])]
+
+    def _flow_mod(self, command=ofproto.OFPFC_ADD, table_id=10, priority=100,
+                  cookie=0, cookie_mask=0, match=None, port=1, **kwargs):
+        return parser.OFPFlowMod(
+            self.datapath,
+            command=command,
+            table_id=table_id,
+            priority=priority,
+            cookie=cookie,
+            cookie_mask=cookie_mask,
+            match=match or parser.OFPMatch(reg7=1),
+            instructions=self._inst(port),
+            **kwargs
+        )
+
+    def _flow_stats(self, table_id=10, priority=100, cookie=0, match=None,
+                    port=1, idle_timeout=0):
+        return parser.OFPFlowStats(
+            table_id=table_id,
+            priority=priority,
+            cookie=cookie,
+            idle_timeout=idle_timeout,
+            hard_timeout=0,
+            match=match or parser.OFPMatch(reg7=1),
+            instructions=self._inst(port),
+        )
+
+    def test_apply(self):
+        self.store.apply(self._flow_mod(match=parser.OFPMatch(reg7=1)))
+        self.store.apply(self._flow_mod(match=parser.OFPMatch(reg7=2)))
+        self.store.apply(self._flow_mod(match=parser.OFPMatch(reg7=3),
+                                        table_id=20, cookie=5))
+        self.store.apply(self._flow_mod(match=parser.OFPMatch(reg7=4),
+                                        idle_timeout=10))
+        self.assertEqual(3, len(self.store))
+
+        self.store.apply(self._flow_mod(command=ofproto.OFPFC_DELETE_STRICT,
+                                        match=parser.OFPMatch(reg7=1)))
+        self.assertEqual(2, len(self.store))
+
+        # Non-strict delete by cookie in all tables
+        self.store.apply(self._flow_mod(command=ofproto.OFPFC_DELETE,
+                                        table_id=ofproto.OFPTT_ALL,
+                                        cookie=5, cookie_mask=0xff,
+                                        match=parser.OFPMatch()))
+        self.assertEqual(1, len(self.store))
+
+        # Non-strict delete by match
+        self.store.apply(self._flow_mod(command=ofproto.OFPFC_DELETE,
+                                        priority=0,
+                                        match=parser.OFPMatch(reg7=2)))
+        self.assertEqual(0, len(self.store))
+
+    def test_diff(self):
+        unchanged = self._flow_mod(match=parser.OFPMatch(reg7=1))
+        modified = self._flow_mod(match=parser.OFPMatch(reg7=2))
+        added = self._flow_mod(match=parser.OFPMatch(reg7=3))
+        for msg in (unchanged, modified, added):
+            self.store.apply(msg)
+        self.store.apply(self._flow_mod(command=ofproto.OFPFC_MODIFY_STRICT,
+                                        match=parser.OFPMatch(reg7=2),
+                                        port=2))
+
+        installed = [
+            self._flow_stats(match=parser.OFPMatch(reg7=1)),
+            self._flow_stats(match=parser.OFPMatch(reg7=2)),
+            self._flow_stats(match=parser.OFPMatch(reg7=4)),
+            self._flow_stats(match=parser.OFPMatch(reg7=5), idle_timeout=10),
+        ]
+        msgs = self.store.diff(self.datapath, installed)
+        self.assertEqual(3, len(msgs))
+
+        delete = msgs[0]
+        self.assertEqual(ofproto.OFPFC_DELETE_STRICT, delete.command)
+        self.assertEqual(4, delete.match['reg7'])
+
+        adds = {msg.match['reg7']: msg for msg in msgs[1:]}
+        self.assertEqual({2, 3}, set(adds))
+        self.assertIs(added, adds[3])
+        self.assertEqual(ofproto.OFPFC_ADD, adds[2].command)
+        self.assertEqual(2, adds[2].instructions[0].actions[0].port)
+
+    def test_diff_normalizes_matches(self):
+        desired = [
+            parser.OFPMatch(eth_type=0x800,
+                            ipv4_dst=('10.0.0.5', '255.255.255.0'),
+                            metadata=(5, 0xffffffffffffffff)),
+            parser.OFPMatch(eth_dst='FA:16:3E:00:00:01',
+                            ipv6_src='fe80:0::1', reg6=(1, 0)),
+        ]
+        for match in desired:
+            self.store.apply(self._flow_mod(match=match))
+
+        installed = [
+            self._flow_stats(match=parser.OFPMatch(
+                eth_type=0x800, ipv4_dst=('10.0.0.0', '255.255.255.0'),
+                metadata=5)),
+            self._flow_stats(match=parser.OFPMatch(
+                eth_dst='fa:16:3e:00:00:01', ipv6_src='fe80::1')),
+        ]
+        self.assertEqual([], self.store.diff(self.datapath, installed))
+
+        self.store.apply(self._flow_mod(
+            command=ofproto.OFPFC_DELETE,
+            match=parser.OFPMatch(metadata=(5, 0xffffffffffffffff))))
+        self.assertEqual(1, len(self.store))
+
+    def test_flows(self):
+        msg = self._flow_mod()
+        self.store.apply(msg)
+        self.assertEqual([msg], self.store.flows())
@@ -0,0 +1,51 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from dragonflow.tests import base as tests_base
+from dragonflow.utils import hash_ring
+
+
+class TestHashRing(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestHashRing, self).setUp()
+        self.nodes = ['node{0}'.format(i) for i in range(4)]
+        self.keys = ['key{0}'.format(i) for i in range(1000)]
+
+    def _get_mapping(self, ring):
+        return {key: ring.get_node(key) for key in self.keys}
+
+    def test_empty(self):
+        self.assertIsNone(hash_ring.HashRing().get_node('key'))
+
+    def test_all_nodes_used(self):
+        ring = hash_ring.HashRing(self.nodes)
+        self.assertEqual(set(self.nodes),
+                         set(self._get_mapping(ring).values()))
+
+    def test_independent_of_insertion_order(self):
+        ring1 = hash_ring.HashRing(self.nodes)
+        ring2 = hash_ring.HashRing(reversed(self.nodes))
+        self.assertEqual(self._get_mapping(ring1), self._get_mapping(ring2))
+
+    def test_remove_node_moves_only_its_keys(self):
+        ring = hash_ring.HashRing(self.nodes)
+        before = self._get_mapping(ring)
+        ring.remove_node('node0')
+        self.assertEqual(frozenset(self.nodes[1:]), ring.nodes)
+        after = self._get_mapping(ring)
+        for key in self.keys:
+            if before[key] != 'node0':
+                self.assertEqual(before[key], after[key])
+            else:
+                self.assertNotEqual('node0', after[key])
+
+        ring.add_node('node0')
+        self.assertEqual(before, self._get_mapping(ring))
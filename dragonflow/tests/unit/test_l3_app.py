@@ -80,3 +80,89 @@ class TestL3App(test_app_base.DFAppTestBase,
         self.controller.delete(test_app_base.fake_local_port1)
         # 2 routes, 2 mod_flow
         self.assertEqual(2, self.app.mod_flow.call_count)
+
+    def _get_route_to(self, dst_ip):
+        msg = mock.Mock()
+        msg.match = {'reg5': self.router.unique_key, 'metadata': 3}
+        with mock.patch.object(self.app, '_install_l3_flow') as install:
+            self.app._get_route(dst_ip, 3, msg)
+        return install
+
+    def test_get_route_from_port_index(self):
+        self.controller.update(test_app_base.fake_local_port1)
+        install = self._get_route_to('10.0.0.6')
+        install.assert_called_once_with(self.router.ports[0],
+                                        test_app_base.fake_local_port1,
+                                        mock.ANY, 3)
+
+        self.controller.delete(test_app_base.fake_local_port1)
+        install = self._get_route_to('10.0.0.6')
+        install.assert_not_called()
+
+    def test_negative_cache(self):
+        install = self._get_route_to('10.0.0.6')
+        install.assert_not_called()
+        self.app.mod_flow.assert_called_once_with(
+            inst=[],
+            table_id=const.L3_LOOKUP_TABLE,
+            priority=const.PRIORITY_VERY_HIGH,
+            match=mock.ANY,
+            buffer_id=mock.ANY,
+            hard_timeout=self.app.negative_cache_timeout)
+
+        # The negative cache flow is removed once the destination is known
+        self.app.mod_flow.reset_mock()
+        self.controller.update(test_app_base.fake_local_port1)
+        self.app.mod_flow.assert_called_once_with(
+            table_id=const.L3_LOOKUP_TABLE,
+            command=self.app.ofproto.OFPFC_DELETE_STRICT,
+            priority=const.PRIORITY_VERY_HIGH,
+            match=mock.ANY)
+
+    def test_prewarm(self):
+        self.app.prewarm_routes = 1
+        self.app._switch = mock.Mock()
+        self.app._switch.dump_flows.return_value = []
+        self.controller.update(test_app_base.fake_local_port1)
+        self._get_route_to('10.0.0.6')
+        with mock.patch.object(self.app, '_install_l3_flow') as install:
+            self.app._prewarm()
+            install.assert_called_once_with(
+                self.router.ports[0], test_app_base.fake_local_port1, None,
+                3, idle_timeout=mock.ANY)
+
+            # The route flow matched packets since the last pre-warm
+            flow = mock.Mock(priority=const.PRIORITY_VERY_HIGH,
+                             instructions=[mock.Mock()],
+                             match={'metadata': 3, 'ipv4_dst': '10.0.0.6'},
+                             packet_count=10)
+            self.app._switch.dump_flows.return_value = [flow]
+            install.reset_mock()
+            self.app._prewarm()
+            install.assert_called_once_with(
+                self.router.ports[0], test_app_base.fake_local_port1, None,
+                3, idle_timeout=mock.ANY)
+
+            # Nothing routed since the last pre-warm
+            install.reset_mock()
+            self.app._prewarm()
+            install.assert_not_called()
+
+    def test_update_port_index(self):
+        lport = test_app_base.fake_local_port1
+        self.controller.update(lport)
+        updated_lport = copy.deepcopy(lport)
+        with mock.patch.object(self.app, '_reprocess_to_delete_route') as d, \
+                mock.patch.object(self.app, '_reprocess_to_add_route') as a:
+            self.app._update_port_index(updated_lport, lport)
+            d.assert_not_called()
+            a.assert_not_called()
+        self.assertIs(updated_lport,
+                      self.app._lports_by_ip[('fake_switch1', lport.ip)])
+
+        moved_lport = copy.deepcopy(lport)
+        moved_lport.ips = ['10.0.0.7']
+        self.app._update_port_index(moved_lport, lport)
+        self.assertNotIn(('fake_switch1', lport.ip), self.app._lports_by_ip)
+        self.assertIs(moved_lport,
+                      self.app._lports_by_ip[('fake_switch1', moved_lport.ip)])
@@ -17,6 +17,8 @@ import copy
 
 import mock
 
+from dragonflow.controller.common import constants as const
+from dragonflow import conf as cfg
 from dragonflow.db.models import host_route
 from dragonflow.tests.unit import _test_l3
 from dragonflow.tests.unit import test_app_base
@@ -91,3 +93,38 @@ class TestL3ProactiveApp(test_app_base.DFAppTestBase,
 
     def test_remove_remote_port(self):
         self._test_remove_port(test_app_base.fake_remote_port1)
+
+    def _get_proactive_lookup_flows(self):
+        return [kwargs for _, kwargs in self.app.mod_flow.call_args_list
+                if kwargs.get('table_id') == const.L3_PROACTIVE_LOOKUP_TABLE]
+
+    def test_derived_mac_subnet_flow(self):
+        cfg.CONF.set_override('proactive_derived_mac_prefix', 'fa:16',
+                              group='df_l3_app')
+        self.app.mod_flow.reset_mock()
+        self.app._add_new_router_port(self.router, self.router.ports[0])
+        flow, = self._get_proactive_lookup_flows()
+        self.assertEqual(const.PRIORITY_MEDIUM, flow['priority'])
+
+        self.app.mod_flow.reset_mock()
+        self.controller.delete(self.router)
+        flow, = self._get_proactive_lookup_flows()
+        self.assertEqual(self.app.ofproto.OFPFC_DELETE_STRICT,
+                         flow['command'])
+
+    def test_derived_mac_port_has_no_flow(self):
+        cfg.CONF.set_override('proactive_derived_mac_prefix', 'fa:16',
+                              group='df_l3_app')
+        derived_port = test_app_base.make_fake_local_port(
+            macs=['fa:16:0a:00:00:07'],
+            ips=['10.0.0.7'],
+            id='fake_derived_port')
+        with mock.patch.object(self.app, '_add_port_process') as add, \
+                mock.patch.object(self.app, '_remove_port_process') as rm:
+            self.controller.update(derived_port)
+            self.controller.delete(derived_port)
+            add.assert_not_called()
+            rm.assert_not_called()
+
+            self.controller.update(test_app_base.fake_local_port1)
+            add.assert_called_once()
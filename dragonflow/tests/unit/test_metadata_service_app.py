@@ -18,7 +18,9 @@ import netaddr
 from neutron.conf.agent.metadata import config as metadata_config
 from oslo_config import fixture as cfg_fixture
 
+from dragonflow.common import exceptions
 from dragonflow.controller import metadata_service_app
+from dragonflow.db.models import l2
 from dragonflow.db.models import ovs
 from dragonflow.tests import base as tests_base
 from dragonflow.tests.unit import test_app_base
@@ -101,3 +103,62 @@ class TestMetadataServiceProxy(tests_base.BaseTestCase):
     def test_proxy_get_scheme(self):
         scheme = self.proxy.get_scheme(mock.sentinel)
         self.assertEqual('https', scheme)
+
+    def test_lport_by_tunnel_key_cached(self):
+        lport1 = l2.LogicalPort(id='lport1', unique_key=1)
+        lport2 = l2.LogicalPort(id='lport2', unique_key=2)
+        self.nb_api.get_all.return_value = [lport1, lport2]
+        self.assertEqual(
+            lport1, self.proxy._get_logical_port_by_tunnel_key(1))
+        self.assertEqual(
+            lport2, self.proxy._get_logical_port_by_tunnel_key(2))
+        self.nb_api.get_all.assert_called_once_with(l2.LogicalPort)
+
+        self.assertRaises(exceptions.LogicalPortNotFoundByTunnelKey,
+                          self.proxy._get_logical_port_by_tunnel_key, 3)
+        self.assertEqual(2, self.nb_api.get_all.call_count)
+
+    def test_lport_by_tunnel_key_expired(self):
+        lport1 = l2.LogicalPort(id='lport1', unique_key=1)
+        self.nb_api.get_all.return_value = [lport1]
+        self.proxy._get_logical_port_by_tunnel_key(1)
+
+        lport1_new = l2.LogicalPort(id='lport1', unique_key=1, topic='t1')
+        self.nb_api.get.return_value = lport1_new
+        with mock.patch('time.time', return_value=2e9):
+            self.assertEqual(
+                lport1_new, self.proxy._get_logical_port_by_tunnel_key(1))
+        self.nb_api.get.assert_called_once_with(l2.LogicalPort(id='lport1'))
+        self.nb_api.get_all.assert_called_once_with(l2.LogicalPort)
+
+    def test_lport_by_tunnel_key_not_found_cached(self):
+        lport1 = l2.LogicalPort(id='lport1', unique_key=1)
+        self.nb_api.get_all.return_value = [lport1]
+        with mock.patch('time.time', return_value=1e9):
+            for _i in range(2):
+                self.assertRaises(
+                    exceptions.LogicalPortNotFoundByTunnelKey,
+                    self.proxy._get_logical_port_by_tunnel_key, 2)
+        self.nb_api.get_all.assert_called_once_with(l2.LogicalPort)
+
+        # Looked up again once the entry expired
+        lport2 = l2.LogicalPort(id='lport2', unique_key=2)
+        self.nb_api.get_all.return_value = [lport1, lport2]
+        with mock.patch('time.time', return_value=2e9):
+            self.assertEqual(
+                lport2, self.proxy._get_logical_port_by_tunnel_key(2))
+        self.assertEqual(2, self.nb_api.get_all.call_count)
+
+    def test_lport_reload_single_flight(self):
+        self.nb_api.get_all.return_value = []
+        with mock.patch('time.time', return_value=1e9):
+            self.proxy._reload_lports(1e9)
+        # Requested before the completed reload started
+        self.proxy._reload_lports(1e9 - 1)
+        self.nb_api.get_all.assert_called_once_with(l2.LogicalPort)
+
+    def test_http_client_reused(self):
+        h = self.proxy.create_http_client(mock.sentinel)
+        self.proxy.release_http_client(h)
+        self.assertIs(h, self.proxy.create_http_client(mock.sentinel))
+        self.assertIsNot(h, self.proxy.create_http_client(mock.sentinel))
@@ -0,0 +1,68 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from dragonflow.common import metrics
+from dragonflow.controller import dispatcher
+from dragonflow.tests import base as tests_base
+
+
+class _FakeApp(object):
+    def handle(self):
+        pass
+
+
+class TestMetrics(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        metrics.enable()
+        self.addCleanup(metrics.enable, False)
+        self.addCleanup(metrics.reset)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram()
+        for value in [0, 1, 2, 3, 4, 100]:
+            histogram.observe(value)
+        result = histogram.to_dict()
+        self.assertEqual(6, result['count'])
+        self.assertEqual(110, result['sum'])
+        self.assertEqual(100, result['max'])
+        # 3 of 6 values are <= 2
+        self.assertEqual(2, result['p50'])
+        self.assertEqual(100, result['p99'])
+
+    def test_disabled(self):
+        metrics.enable(False)
+        metrics.observe('test', 1)
+        with metrics.timer('test'):
+            pass
+        self.assertEqual({}, metrics.get_snapshot())
+
+    def test_timer_labels(self):
+        app_dispatcher = dispatcher.AppDispatcher('', '')
+        app_dispatcher.apps = [_FakeApp()]
+        with mock.patch('time.time', side_effect=[10, 10.5, 20, 20.25]):
+            app_dispatcher.dispatch('handle')
+            app_dispatcher.dispatch('handle')
+        metrics.observe(metrics.PACKET_IN, 0.5, 17)
+
+        snapshot = metrics.get_snapshot()
+        dispatch = snapshot[metrics.APP_DISPATCH]
+        self.assertEqual(1, len(dispatch))
+        histogram = dispatch[list(dispatch)[0]]
+        self.assertIn('_FakeApp.handle', list(dispatch)[0])
+        self.assertEqual(2, histogram['count'])
+        self.assertEqual(0.75, histogram['sum'])
+        self.assertEqual(0.5, histogram['max'])
+        self.assertEqual(1, snapshot[metrics.PACKET_IN]['17']['count'])
@@ -468,6 +468,21 @@ class TestModelFramework(tests_base.BaseTestCase):
             embedding1.iterate_embedded_model_instances(),
         )
 
+    def test_envelope(self):
+        obj = ModelTest(id='id1', field1='value1')
+        envelope = ModelTest.envelope_from_json(obj.to_json())
+        self.assertIs(ModelTest, envelope.model)
+        with mock.patch.object(ModelTest, '__init__') as init:
+            self.assertEqual('id1', envelope.id)
+            self.assertIsNone(envelope.version)
+            init.assert_not_called()
+
+        self.assertEqual('value1', envelope.field1)
+        decoded = envelope.decode()
+        self.assertIsInstance(decoded, ModelTest)
+        self.assertEqual(obj.to_struct(), decoded.to_struct())
+        self.assertIs(decoded, envelope.decode())
+
     def test_hierarchical_dependency(self):
         sorted_models = mf.iter_models_by_dependency_order()
         self.assertLess(
@@ -0,0 +1,94 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from jsonmodels import fields
+
+import dragonflow.db.field_types as df_fields
+import dragonflow.db.model_framework as mf
+from dragonflow.db import model_serializer
+from dragonflow.tests import base as tests_base
+
+
+@mf.construct_nb_db_model
+class SerializedModelTest(mf.ModelBase):
+    table_name = 'serialized_model_test'
+
+    topic = fields.StringField()
+    ips = df_fields.ListOfField(df_fields.IpAddressField())
+    count = fields.IntField()
+
+
+class TestModelSerializer(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestModelSerializer, self).setUp()
+        self.obj = SerializedModelTest(
+            id='id1',
+            topic='topic1',
+            ips=['10.0.0.1', 'fd00::1'],
+            count=3,
+        )
+
+    def test_round_trip(self):
+        for fmt in model_serializer.FORMATS:
+            data = model_serializer.serialize(self.obj, fmt)
+            obj = model_serializer.deserialize(SerializedModelTest, data)
+            self.assertEqual(self.obj.to_struct(), obj.to_struct())
+
+    def test_msgpack_is_smaller(self):
+        self.assertLess(
+            len(model_serializer.serialize(self.obj,
+                                           model_serializer.MSGPACK)),
+            len(model_serializer.serialize(self.obj, model_serializer.JSON)),
+        )
+
+    def test_load_struct(self):
+        struct = self.obj.to_struct()
+        json_data = self.obj.to_json()
+        self.assertEqual(struct, model_serializer.load_struct(json_data))
+        self.assertEqual(
+            struct,
+            model_serializer.load_struct(json_data.encode('utf-8')),
+        )
+        self.assertIs(struct, model_serializer.load_struct(struct))
+
+    def test_load_value(self):
+        struct = self.obj.to_struct()
+        for fmt in model_serializer.FORMATS:
+            data = model_serializer.dump_struct(struct, fmt)
+            self.assertEqual(struct, model_serializer.load_value(data))
+        # Values of other tables, e.g. unique key counters
+        self.assertEqual(5, model_serializer.load_value(b'5'))
+        self.assertEqual(5, model_serializer.load_value(u'5'))
+
+    def test_deserialize_envelope(self):
+        data = model_serializer.serialize(self.obj, model_serializer.MSGPACK)
+        envelope = model_serializer.deserialize_envelope(SerializedModelTest,
+                                                         data)
+        self.assertEqual('id1', envelope.id)
+        self.assertEqual(self.obj.to_struct(), envelope.decode().to_struct())
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, model_serializer.serialize, self.obj,
+                          'xml')
+
+    def test_event_value(self):
+        json_data = model_serializer.serialize(self.obj)
+        self.assertIs(
+            json_data,
+            model_serializer.to_event_value(self.obj, json_data),
+        )
+        msgpack_data = model_serializer.serialize(self.obj,
+                                                  model_serializer.MSGPACK)
+        self.assertEqual(
+            self.obj.to_struct(),
+            model_serializer.to_event_value(self.obj, msgpack_data,
+                                            model_serializer.MSGPACK),
+        )
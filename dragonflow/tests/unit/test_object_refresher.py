@@ -84,3 +84,117 @@ class TestDbObjectsRefresh(tests_base.BaseTestCase):
         refresher.delete()
 
         self.assertFalse(fake_delete_method.called)
+
+
+class TestDeltaObjectsRefresh(tests_base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDeltaObjectsRefresh, self).setUp()
+        self.cache_update = mock.Mock()
+        self.cache_delete = mock.Mock()
+        self.db_read_objects = mock.Mock(return_value=[])
+        self.db_read_changes = mock.Mock()
+        self.db_read_object = mock.Mock(
+            side_effect=lambda obj_id, topic: mock.Mock(id=obj_id))
+        self.refresher = df_db_objects_refresh.DfDeltaObjectRefresher(
+            'Mock',
+            lambda t: set(),
+            self.db_read_objects,
+            self.cache_update,
+            self.cache_delete,
+            mock.Mock(return_value=5),
+            self.db_read_changes,
+            self.db_read_object,
+        )
+
+    def _sync(self, topic=None):
+        self.refresher.start_sync(None if topic is None else [topic])
+        self.refresher.read(topic)
+        self.refresher.update(topic)
+        self.refresher.delete()
+
+    def test_first_sync_reads_full_table(self):
+        self._sync()
+        self.db_read_objects.assert_called_once_with(None)
+        self.db_read_changes.assert_not_called()
+        self.assertEqual(5, self.refresher.generation)
+
+    def test_sync_reads_changes(self):
+        self._sync()
+        self.db_read_objects.reset_mock()
+        self.db_read_changes.return_value = (8, [
+            {'key': 'a', 'action': 'create', 'topic': 't1', 'generation': 6},
+            {'key': 'b', 'action': 'set', 'topic': 't2', 'generation': 7},
+            {'key': 'c', 'action': 'set', 'topic': 't1', 'generation': 7},
+            {'key': 'c', 'action': 'delete', 'topic': 't1',
+             'generation': 8},
+        ])
+        self._sync('t1')
+
+        self.db_read_changes.assert_called_once_with(5)
+        self.db_read_objects.assert_not_called()
+        self.db_read_object.assert_called_once_with('a', 't1')
+        self.assertEqual(1, self.cache_update.call_count)
+        self.cache_delete.assert_called_once_with('c')
+        self.assertEqual(8, self.refresher.generation)
+
+    def test_partial_sync_keeps_changes_of_other_topics(self):
+        self._sync()
+        self.db_read_changes.return_value = (8, [
+            {'key': 'a', 'action': 'create', 'topic': 't1', 'generation': 6},
+            {'key': 'b', 'action': 'create', 'topic': 't2', 'generation': 7},
+        ])
+        self._sync('t1')
+        self.db_read_object.assert_called_once_with('a', 't1')
+
+        # The change of t2 is read on its next sync, from t2's generation
+        self.db_read_object.reset_mock()
+        self.db_read_changes.reset_mock()
+        self.db_read_changes.return_value = (9, [
+            {'key': 'b', 'action': 'create', 'topic': 't2', 'generation': 7},
+            {'key': 'a', 'action': 'set', 'topic': 't1', 'generation': 9},
+        ])
+        self._sync()
+        self.db_read_changes.assert_called_once_with(5)
+        self.assertEqual([mock.call('b', 't2'), mock.call('a', 't1')],
+                         self.db_read_object.call_args_list)
+
+        # A sync of all topics brings all of them to its generation
+        self.db_read_changes.reset_mock()
+        self.db_read_changes.return_value = (9, [])
+        self._sync('t2')
+        self.db_read_changes.assert_called_once_with(9)
+
+    def test_truncated_changelog_reads_full_table(self):
+        self._sync()
+        self.db_read_objects.reset_mock()
+        self.db_read_changes.return_value = None
+        self._sync()
+        self.db_read_objects.assert_called_once_with(None)
+
+    def test_new_topic_reads_full_table(self):
+        self._sync('t1')
+        self.db_read_objects.reset_mock()
+        self.db_read_changes.return_value = (8, [])
+        self._sync('t2')
+        self.db_read_objects.assert_called_once_with('t2')
+
+        self.db_read_objects.reset_mock()
+        self._sync('t1')
+        self.db_read_objects.assert_not_called()
+
+    def test_reset_reads_full_table(self):
+        self._sync()
+        self.db_read_changes.return_value = (8, [])
+        self.refresher.reset('t1')
+        self.db_read_objects.reset_mock()
+        self._sync('t1')
+        self.db_read_objects.assert_called_once_with('t1')
+
+        self.refresher.reset()
+        self.assertIsNone(self.refresher.generation)
+        self.db_read_objects.reset_mock()
+        self.db_read_changes.reset_mock()
+        self._sync('t1')
+        self.db_read_changes.assert_not_called()
+        self.db_read_objects.assert_called_once_with('t1')
@@ -0,0 +1,68 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+from ovs.db import idl
+
+from dragonflow.ovsdb import impl_idl
+from dragonflow.tests import base as tests_base
+
+
+def _row(table_name, uuid, **kwargs):
+    row = mock.Mock(uuid=uuid, **kwargs)
+    row._table.name = table_name
+    return row
+
+
+class TestDFIdl(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestDFIdl, self).setUp()
+        with mock.patch.object(idl.Idl, '__init__', return_value=None):
+            self.idl = impl_idl.DFIdl(mock.Mock(), mock.sentinel.remote,
+                                      mock.sentinel.schema)
+        self.rows = {}
+        self.idl.tables = {'Interface': mock.Mock(rows=self.rows)}
+        mock.patch.object(impl_idl.ovs.OvsPort, 'from_idl_row').start()
+        mock.patch.object(self.idl, '_is_handle_interface_update',
+                          return_value=False).start()
+
+    def _notify_interface(self, event, uuid, iface_id):
+        row = _row('Interface', uuid, external_ids={'iface-id': iface_id})
+        if event == 'delete':
+            self.rows.pop(uuid)
+        else:
+            self.rows[uuid] = row
+        self.idl.notify(event, row)
+        return row
+
+    def test_interfaces_by_iface_id(self):
+        row1 = self._notify_interface('create', 'uuid1', 'port1')
+        row2 = self._notify_interface('create', 'uuid2', 'port1')
+        self.assertItemsEqual([row1, row2],
+                              self.idl.get_interfaces_by_iface_id('port1'))
+
+        row2 = self._notify_interface('update', 'uuid2', 'port2')
+        self.assertEqual([row1], self.idl.get_interfaces_by_iface_id('port1'))
+        self.assertEqual([row2], self.idl.get_interfaces_by_iface_id('port2'))
+
+        self._notify_interface('delete', 'uuid1', 'port1')
+        self.assertEqual([], self.idl.get_interfaces_by_iface_id('port1'))
+
+    def test_interface_bridge_cached(self):
+        row = self._notify_interface('create', 'uuid1', 'port1')
+        resolve = mock.Mock(return_value='br-int')
+        self.assertEqual('br-int', self.idl.get_interface_bridge(row, resolve))
+        self.assertEqual('br-int', self.idl.get_interface_bridge(row, resolve))
+        resolve.assert_called_once_with(row.name)
+
+        self.idl.notify('update', _row('Bridge', 'uuid2'))
+        resolve.return_value = 'br-ex'
+        self.assertEqual('br-ex', self.idl.get_interface_bridge(row, resolve))
@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from ryu.lib.packet import arp
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import icmp
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import packet
+from ryu.lib.packet import udp
+from ryu.lib.packet import vlan
+from ryu.ofproto import ether
+
+from dragonflow.controller.common import packet_headers
+from dragonflow.tests import base as tests_base
+
+SRC_MAC = 'fa:16:3e:8c:2e:b3'
+DST_MAC = 'ff:ff:ff:ff:ff:ff'
+
+
+def _serialize(*protocols):
+    pkt = packet.Packet()
+    for protocol in protocols:
+        pkt.add_protocol(protocol)
+    pkt.serialize()
+    return pkt.data
+
+
+class TestPacketHeaders(tests_base.BaseTestCase):
+    def test_udp(self):
+        data = _serialize(
+            ethernet.ethernet(dst=DST_MAC, src=SRC_MAC),
+            ipv4.ipv4(src='0.0.0.0', dst='255.255.255.255',
+                      proto=in_proto.IPPROTO_UDP),
+            udp.udp(src_port=68, dst_port=67))
+        headers = packet_headers.PacketHeaders(data)
+        self.assertEqual(ether.ETH_TYPE_IP, headers.eth_type)
+        self.assertEqual(DST_MAC, headers.eth_dst)
+        self.assertEqual(SRC_MAC, headers.eth_src)
+        self.assertTrue(headers.is_ipv4)
+        self.assertEqual(in_proto.IPPROTO_UDP, headers.ip_proto)
+        self.assertEqual('0.0.0.0', headers.ip_src)
+        self.assertEqual('255.255.255.255', headers.ip_dst)
+        self.assertEqual(68, headers.l4_src_port)
+        self.assertEqual(67, headers.l4_dst_port)
+        self.assertIsNone(headers.icmp_type)
+        self.assertIsNone(headers.arp_opcode)
+
+    def test_arp(self):
+        data = _serialize(
+            ethernet.ethernet(dst=DST_MAC, src=SRC_MAC,
+                              ethertype=ether.ETH_TYPE_ARP),
+            arp.arp(opcode=arp.ARP_REPLY, src_mac=SRC_MAC,
+                    src_ip='10.0.0.5', dst_mac=DST_MAC, dst_ip='10.0.0.1'))
+        headers = packet_headers.PacketHeaders(data)
+        self.assertTrue(headers.is_arp)
+        self.assertFalse(headers.is_ipv4)
+        self.assertEqual(arp.ARP_REPLY, headers.arp_opcode)
+        self.assertEqual(SRC_MAC, headers.arp_src_mac)
+        self.assertEqual('10.0.0.5', headers.arp_src_ip)
+        self.assertEqual('10.0.0.1', headers.arp_dst_ip)
+        self.assertIsNone(headers.ip_dst)
+
+    def test_vlan_icmp(self):
+        data = _serialize(
+            ethernet.ethernet(dst=DST_MAC, src=SRC_MAC,
+                              ethertype=ether.ETH_TYPE_8021Q),
+            vlan.vlan(vid=10, ethertype=ether.ETH_TYPE_IP),
+            ipv4.ipv4(src='10.0.0.5', dst='10.0.0.1',
+                      proto=in_proto.IPPROTO_ICMP),
+            icmp.icmp(type_=icmp.ICMP_ECHO_REQUEST, code=0,
+                      data=icmp.echo()))
+        headers = packet_headers.PacketHeaders(data)
+        self.assertEqual(ether.ETH_TYPE_IP, headers.eth_type)
+        self.assertEqual('10.0.0.1', headers.ip_dst)
+        self.assertEqual(icmp.ICMP_ECHO_REQUEST, headers.icmp_type)
+        self.assertEqual(0, headers.icmp_code)
+        self.assertIsNone(headers.l4_dst_port)
+
+    def test_ipv6(self):
+        data = _serialize(
+            ethernet.ethernet(dst=DST_MAC, src=SRC_MAC,
+                              ethertype=ether.ETH_TYPE_IPV6),
+            ipv6.ipv6(src='fd00::5', dst='fd00::1',
+                      nxt=in_proto.IPPROTO_UDP),
+            udp.udp(src_port=546, dst_port=547))
+        headers = packet_headers.PacketHeaders(data)
+        self.assertTrue(headers.is_ipv6)
+        self.assertEqual('fd00::5', headers.ip_src)
+        self.assertEqual('fd00::1', headers.ip_dst)
+        self.assertEqual(547, headers.l4_dst_port)
+
+    def test_truncated(self):
+        data = _serialize(
+            ethernet.ethernet(dst=DST_MAC, src=SRC_MAC),
+            ipv4.ipv4(src='10.0.0.5', dst='10.0.0.1'))
+        headers = packet_headers.PacketHeaders(data[:20])
+        self.assertEqual(ether.ETH_TYPE_IP, headers.eth_type)
+        self.assertFalse(headers.is_ipv4)
+        self.assertIsNone(headers.ip_dst)
+        self.assertIsNone(packet_headers.PacketHeaders(data[:10]).eth_dst)
+
+    def test_packet_parsed_on_demand(self):
+        data = _serialize(ethernet.ethernet(dst=DST_MAC, src=SRC_MAC))
+        with mock.patch.object(packet_headers.packet, 'Packet') as parse:
+            headers = packet_headers.PacketHeaders(data)
+            self.assertEqual(DST_MAC, headers.eth_dst)
+            parse.assert_not_called()
+            self.assertIs(headers.packet, headers.packet)
+            parse.assert_called_once_with(data)
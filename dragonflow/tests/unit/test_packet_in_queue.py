@@ -0,0 +1,66 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from dragonflow.controller import packet_in_queue
+from dragonflow.tests import base as tests_base
+
+
+def _event(table_id):
+    return mock.Mock(msg=mock.Mock(table_id=table_id))
+
+
+class TestPacketInQueue(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestPacketInQueue, self).setUp()
+        self.handler = mock.Mock()
+        self.queue = packet_in_queue.PacketInQueue(2, self.handler)
+
+    def test_priority_order(self):
+        low = _event(1)
+        high = _event(2)
+        self.queue.put(low, 0)
+        self.queue.put(high, 1)
+        self.assertEqual(2, len(self.queue))
+        self.assertIs(high, self.queue.get())
+        self.assertIs(low, self.queue.get())
+        self.assertEqual(0, len(self.queue))
+
+    def test_shed_lowest_priority(self):
+        low1 = _event(1)
+        low2 = _event(1)
+        high = _event(2)
+        self.assertTrue(self.queue.put(low1, 0))
+        self.assertTrue(self.queue.put(low2, 0))
+        # A full queue drops new events of the lowest priority...
+        self.assertFalse(self.queue.put(_event(1), 0))
+        # ...and the oldest of the lowest priority for higher ones
+        self.assertTrue(self.queue.put(high, 1))
+        self.assertEqual(2, len(self.queue))
+        self.assertEqual({1: 2}, self.queue.dropped)
+        self.assertIs(high, self.queue.get())
+        self.assertIs(low2, self.queue.get())
+
+    def test_worker_handles_events(self):
+        event = _event(1)
+        self.handler.side_effect = [Exception('error'), None]
+        self.queue.start()
+        self.addCleanup(self.queue.stop)
+        self.queue.put(_event(1))
+        self.queue.put(event)
+        for _ in range(10):
+            if self.handler.call_count == 2:
+                break
+            packet_in_queue.eventlet.sleep(0)
+        self.handler.assert_called_with(event)
+        self.assertEqual(2, self.handler.call_count)
@@ -40,32 +40,46 @@ class TestRedisDB(tests_base.BaseTestCase):
         result = self.RedisDbDriver.set_key('table', 'key', 'value', 'topic')
         self.assertEqual(0, result)
 
-    def test_get_method(self):
+    def _mock_client(self, execute_command):
         client = mock.Mock()
+        client.execute_command.side_effect = execute_command
         self.RedisDbDriver._get_client = mock.Mock(return_value=client)
         self.RedisDbDriver._sync_master_list = mock.Mock()
         self.RedisDbDriver.clients[0] = client
-        client.keys.return_value = ['a']
-        client.mget.return_value = ['value']
-        client.execute_command.return_value = 'value'
         redis_mgt = mock.Mock()
-        self.RedisDbDriver.redis_mgt = redis_mgt
         redis_mgt.get_ip_by_key.return_value = '0.0.0.0:1000'
+        self.RedisDbDriver.redis_mgt = redis_mgt
+        return client
+
+    def test_get_method(self):
+        commands = {
+            ('GET', '{table.}:indexed'): '1',
+            ('HGET', '{table.}:keys', 'key'): 'topic',
+            ('GET', '{table.topic}.key'): 'value',
+        }
+        client = self._mock_client(lambda *args: commands.get(args))
+        redis_mgt = self.RedisDbDriver.redis_mgt
 
         # test get_key
         result = self.RedisDbDriver.get_key('table', 'key')
         self.assertEqual('value', result)
-        redis_mgt.get_ip_by_key.assert_called_with('a')
+        redis_mgt.get_ip_by_key.assert_called_with('{table.topic}.key')
 
         result = self.RedisDbDriver.get_key('table', 'key', '')
         self.assertEqual('value', result)
-        redis_mgt.get_ip_by_key.assert_called_with('a')
+        redis_mgt.get_ip_by_key.assert_called_with('{table.topic}.key')
 
         result = self.RedisDbDriver.get_key('table', 'key', 'topic')
         self.assertEqual('value', result)
         local_key = '{table.topic}.key'
         redis_mgt.get_ip_by_key.assert_called_with(local_key)
 
+        self.assertRaises(
+            exceptions.DBKeyNotFound,
+            self.RedisDbDriver.get_key,
+            'table', 'missing',
+        )
+
         with mock.patch(
             'dragonflow.db.drivers.redis_db_driver.RedisDbDriver._execute_cmd',
             return_value=None,
@@ -87,34 +101,126 @@ class TestRedisDB(tests_base.BaseTestCase):
             )
 
         # test get_all_entries
+        client.hscan_iter.return_value = [('key', 'topic')]
+        client.sscan_iter.return_value = iter(['key'])
+        client.mget.return_value = ['value']
         result = self.RedisDbDriver.get_all_entries('table')
         self.assertEqual(['value'], result)
-        redis_mgt.get_ip_by_key.assert_called_with('a')
+        client.hscan_iter.assert_called_with(
+            '{table.}:keys', count=self.RedisDbDriver.ScanCount)
+        client.mget.assert_called_with(['{table.topic}.key'])
 
         result = self.RedisDbDriver.get_all_entries('table', '')
         self.assertEqual(['value'], result)
-        redis_mgt.get_ip_by_key.assert_called_with('a')
 
         result = self.RedisDbDriver.get_all_entries('table', 'topic')
         self.assertEqual(['value'], result)
-        local_key = '{table.topic}.*'
-        redis_mgt.get_ip_by_key.assert_called_with(local_key)
+        client.sscan_iter.assert_called_with(
+            '{table.topic}:index', count=self.RedisDbDriver.ScanCount)
+        client.mget.assert_called_with(['{table.topic}.key'])
 
         # test get_all_key
-        client.keys.return_value = ['{table.*}.key']
         result = self.RedisDbDriver.get_all_keys('table')
         self.assertEqual(['key'], result)
-        local_key = '{table.*}.*'
-        client.keys.assert_called_with(local_key)
 
         result = self.RedisDbDriver.get_all_keys('table', '')
         self.assertEqual(['key'], result)
-        client.keys.assert_called_with(local_key)
 
+        client.sscan_iter.return_value = iter(['key'])
         result = self.RedisDbDriver.get_all_keys('table', 'topic')
         self.assertEqual(['key'], result)
-        local_key = '{table.topic}.*'
-        redis_mgt.get_ip_by_key.assert_called_with(local_key)
+        client.keys.assert_not_called()
+
+    def test_get_all_entries_chunks_mget(self):
+        client = self._mock_client(lambda *args: '1')
+        self.RedisDbDriver.MGetChunkSize = 2
+        client.sscan_iter.return_value = iter(['k1', 'k2', 'k3'])
+        client.mget.side_effect = lambda keys: ['v'] * len(keys)
+        result = self.RedisDbDriver.get_all_entries('table', 'topic')
+        self.assertEqual(['v', 'v', 'v'], result)
+        client.mget.assert_has_calls([
+            mock.call(['{table.topic}.k1', '{table.topic}.k2']),
+            mock.call(['{table.topic}.k3']),
+        ])
+
+    def test_build_index_of_unindexed_table(self):
+        client = self._mock_client(lambda *args: None)
+        client.scan_iter.return_value = ['{table.topic}.key1',
+                                         '{table.}.key2']
+        client.hscan_iter.return_value = []
+        self.RedisDbDriver.get_all_keys('table')
+        client.scan_iter.assert_called_once_with(
+            match='{table.*}.*', count=self.RedisDbDriver.ScanCount)
+        client.execute_command.assert_has_calls([
+            mock.call('SADD', '{table.topic}:index', 'key1'),
+            mock.call('HSET', '{table.}:keys', 'key1', 'topic'),
+            mock.call('SADD', '{table.}:index', 'key2'),
+            mock.call('HSET', '{table.}:keys', 'key2', ''),
+            mock.call('SET', '{table.}:indexed', '1'),
+        ])
+
+        # The index is built only once
+        self.RedisDbDriver.get_all_keys('table')
+        client.scan_iter.assert_called_once()
+        client.keys.assert_not_called()
+
+    def test_set_and_delete_key_update_index(self):
+        client = self._mock_client(lambda *args: 1)
+        self.RedisDbDriver.set_key('table', 'key', 'value', 'topic')
+        client.execute_command.assert_has_calls([
+            mock.call('SET', '{table.topic}.key', 'value'),
+            mock.call('SADD', '{table.topic}:index', 'key'),
+            mock.call('HSET', '{table.}:keys', 'key', 'topic'),
+        ])
+        client.execute_command.reset_mock()
+        self.RedisDbDriver.delete_key('table', 'key', 'topic')
+        client.execute_command.assert_has_calls([
+            mock.call('DEL', '{table.topic}.key'),
+            mock.call('SREM', '{table.topic}:index', 'key'),
+            mock.call('HDEL', '{table.}:keys', 'key'),
+        ])
+
+    def _mock_pipeline(self, client, execute_command):
+        pipeline = mock.Mock()
+        commands = []
+
+        def execute():
+            results = [execute_command(*args) for args in commands]
+            del commands[:]
+            return results
+
+        pipeline.execute_command.side_effect = \
+            lambda *args: commands.append(args)
+        pipeline.execute.side_effect = execute
+        client.pipeline.return_value = pipeline
+        self.RedisDbDriver.clients['0.0.0.0:1000'] = client
+        return pipeline
+
+    def test_batch_get_keys(self):
+        commands = {
+            ('GET', '{table.}:indexed'): '1',
+            ('HGET', '{table.}:keys', 'key1'): 'topic',
+            ('GET', '{table.topic}.key1'): 'value1',
+            ('GET', '{table.topic}.key2'): 'value2',
+        }
+        client = self._mock_client(lambda *args: commands.get(args))
+        pipeline = self._mock_pipeline(client,
+                                       lambda *args: commands.get(args))
+
+        result = self.RedisDbDriver.batch_get_keys([
+            ('table', 'key1', None),
+            ('table', 'key2', 'topic'),
+            ('table', 'missing', None),
+        ])
+        self.assertEqual(['value1', 'value2', None], result)
+        pipeline.execute_command.assert_has_calls([
+            mock.call('HGET', '{table.}:keys', 'key1'),
+            mock.call('HGET', '{table.}:keys', 'missing'),
+            mock.call('GET', '{table.topic}.key1'),
+            mock.call('GET', '{table.topic}.key2'),
+        ])
+        self.assertEqual(2, pipeline.execute.call_count)
+        client.pipeline.assert_called_with(transaction=False)
 
     def test_delete_key(self):
         client = mock.Mock()
@@ -136,3 +242,22 @@ class TestRedisDB(tests_base.BaseTestCase):
         client.incr.return_value = 1
         result = self.RedisDbDriver.allocate_unique_key('fake_table')
         self.assertEqual(1, result)
+
+    def test_handle_keyspace_message(self):
+        self._mock_client(lambda *args: {
+            ('GET', '{table.topic}.key'): 'value',
+        }.get(args))
+        callback = mock.Mock()
+        for channel, event in (
+                (b'__keyspace@0__:{table.topic}.key', b'set'),
+                (b'__keyspace@0__:{table.topic}.key2', b'set'),
+                (b'__keyspace@0__:{table.topic}.key', b'del'),
+                (b'__keyspace@0__:{table.topic}:index', b'sadd'),
+                (b'__keyspace@0__:{table2.topic}.key', b'del')):
+            self.RedisDbDriver._handle_keyspace_message(
+                {'type': 'pmessage', 'channel': channel, 'data': event},
+                'table', callback)
+        self.assertEqual([mock.call('set', 'key', 'value'),
+                          mock.call('delete', 'key2', None),
+                          mock.call('delete', 'key', None)],
+                         callback.call_args_list)
@@ -13,10 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+
 import mock
+from oslo_config import cfg
+from ryu.ofproto import ofproto_v1_3 as ofproto
+from ryu.ofproto import ofproto_v1_3_parser as parser
+import testtools
 
+from dragonflow.common import metrics
+from dragonflow.controller import flow_store
 from dragonflow.controller import ryu_base_app
 from dragonflow.tests import base as tests_base
+from dragonflow.tests.unit import test_app_base
 
 
 class TestRyuDFAdapter(tests_base.BaseTestCase):
@@ -71,3 +80,291 @@ class TestRyuDFAdapter(tests_base.BaseTestCase):
                 10, self.mock_app.packet_in_handler)
         self.ryu_df_adapter.OF_packet_in_handler(ev)
         self.mock_app.assert_has_calls([mock.call.packet_in_handler(ev)])
+
+
+class TestRyuDFAdapterBatch(test_app_base.DFAppTestBase):
+    apps_list = "portsec_app.PortSecApp"
+
+    def setUp(self):
+        super(TestRyuDFAdapterBatch, self).setUp()
+        xids = itertools.count(1)
+
+        def set_xid(msg):
+            msg.xid = next(xids)
+
+        self.datapath.set_xid.side_effect = set_xid
+        self.barrier = self.datapath.ofproto_parser.OFPBarrierRequest()
+        self.barrier.buf = b'barrier'
+
+    def _msg(self, buf):
+        return mock.Mock(datapath=self.datapath, buf=buf)
+
+    def test_send_without_batch(self):
+        msg = self._msg(b'msg1')
+        self.open_flow_app.send_msg(msg)
+        self.datapath.send_msg.assert_called_once_with(msg)
+        self.datapath.send.assert_not_called()
+
+    def test_batch(self):
+        callback = mock.Mock()
+        with self.open_flow_app.batch(callback):
+            self.open_flow_app.send_msg(self._msg(b'msg1'))
+            with self.open_flow_app.batch():
+                self.open_flow_app.send_msg(self._msg(b'msg2'))
+            self.datapath.send.assert_not_called()
+
+        self.datapath.send_msg.assert_not_called()
+        self.datapath.send.assert_called_once_with(b'msg1msg2barrier')
+
+        callback.assert_not_called()
+        self.open_flow_app.barrier_reply_handler(
+            mock.Mock(msg=mock.Mock(xid=self.barrier.xid)))
+        callback.assert_called_once_with([])
+        self.assertEqual({}, self.open_flow_app._pending_messages)
+
+    def test_batch_flow_mods_metric(self):
+        metrics.enable()
+        self.addCleanup(metrics.enable, False)
+        self.addCleanup(metrics.reset)
+        flow_mod = self._msg(b'msg1')
+        flow_mod.cls_msg_type = self.datapath.ofproto.OFPT_FLOW_MOD
+        with self.open_flow_app.batch():
+            self.open_flow_app.send_msg(flow_mod)
+            self.open_flow_app.send_msg(self._msg(b'msg2'))
+
+        histogram = metrics.get_snapshot()[metrics.FLOW_MODS_PER_EVENT]
+        self.assertEqual(1, histogram['None']['count'])
+        self.assertEqual(1, histogram['None']['sum'])
+
+    def test_batch_error(self):
+        callback = mock.Mock()
+        msg1 = self._msg(b'msg1')
+        with self.open_flow_app.batch(callback):
+            self.open_flow_app.send_msg(msg1)
+            self.open_flow_app.send_msg(self._msg(b'msg2'))
+
+        error = mock.Mock(xid=msg1.xid)
+        self.open_flow_app.OF_error_msg_handler(mock.Mock(msg=error))
+        self.open_flow_app.barrier_reply_handler(
+            mock.Mock(msg=mock.Mock(xid=self.barrier.xid)))
+        callback.assert_called_once_with([(msg1, error)])
+
+    def test_batch_handler_error(self):
+        self.datapath.send.side_effect = Exception('flush error')
+        with testtools.ExpectedException(ValueError):
+            with self.open_flow_app.batch():
+                self.open_flow_app.send_msg(self._msg(b'msg1'))
+                raise ValueError()
+        self.datapath.send.assert_called_once_with(b'msg1barrier')
+        self.assertIsNone(self.open_flow_app._batches.batch)
+
+    def test_batch_without_datapath(self):
+        self.open_flow_app._datapath = None
+        with self.open_flow_app.batch():
+            self.open_flow_app.send_msg(self._msg(b'msg1'))
+        self.datapath.send.assert_not_called()
+
+    def test_batch_size(self):
+        self.open_flow_app._batch_size = 2
+        with self.open_flow_app.batch():
+            for i in range(3):
+                self.open_flow_app.send_msg(self._msg(b'msg%d' % (i,)))
+            self.datapath.send.assert_called_once_with(b'msg0msg1barrier')
+        self.datapath.send.assert_called_with(b'msg2barrier')
+
+    def test_reconcile_flows(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        flow_mod = parser.OFPFlowMod(datapath, table_id=10,
+                                     match=parser.OFPMatch(reg7=1))
+        self.open_flow_app._flow_store = flow_store.FlowStore()
+        self.open_flow_app._switch = mock.Mock()
+        self.open_flow_app._switch.dump_flows.return_value = []
+
+        # Flow mods are applied to the store, other messages are sent
+        self.open_flow_app.send_msg(flow_mod)
+        barrier = parser.OFPBarrierRequest(datapath)
+        self.open_flow_app.send_msg(barrier)
+        datapath.send_msg.assert_called_once_with(barrier)
+
+        with mock.patch.object(self.open_flow_app, '_flush') as flush:
+            self.open_flow_app.reconcile_flows()
+            flush.assert_called_once_with([flow_mod], [])
+        self.assertIsNone(self.open_flow_app._flow_store)
+
+    def test_transient_flows_sent_during_reconciliation(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._flow_store = flow_store.FlowStore()
+        timed = parser.OFPFlowMod(datapath, table_id=10, idle_timeout=30,
+                                  match=parser.OFPMatch(reg7=1))
+        buffered = parser.OFPFlowMod(datapath, table_id=10, buffer_id=5,
+                                     match=parser.OFPMatch(reg7=2))
+        delete = parser.OFPFlowMod(datapath, table_id=10,
+                                   command=ofproto.OFPFC_DELETE,
+                                   match=parser.OFPMatch(reg7=1))
+        permanent = parser.OFPFlowMod(datapath, table_id=10,
+                                      match=parser.OFPMatch(reg7=3))
+        for msg in (timed, buffered, delete, permanent):
+            self.open_flow_app.send_msg(msg)
+
+        self.assertEqual([mock.call(timed), mock.call(buffered),
+                          mock.call(delete)],
+                         datapath.send_msg.call_args_list)
+        stored = self.open_flow_app._flow_store.flows()
+        self.assertEqual([2, 3], [msg.match['reg7'] for msg in stored])
+        # The stored copy does not release the buffered packet again
+        self.assertEqual(ofproto.OFP_NO_BUFFER, stored[0].buffer_id)
+
+    def test_cancel_reconciliation(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        flow_mod = parser.OFPFlowMod(datapath, table_id=10,
+                                     match=parser.OFPMatch(reg7=1))
+        self.open_flow_app._flow_store = flow_store.FlowStore()
+        self.open_flow_app._switch = mock.Mock()
+        self.open_flow_app.send_msg(flow_mod)
+
+        with mock.patch.object(self.open_flow_app, '_flush') as flush:
+            self.open_flow_app.cancel_reconciliation()
+            flush.assert_called_once_with([flow_mod], [])
+        self.assertIsNone(self.open_flow_app._flow_store)
+        self.open_flow_app._switch.dump_flows.assert_not_called()
+
+    def _meter_features_reply(self, datapath, max_meter=100):
+        features = parser.OFPMeterFeaturesStats(
+            max_meter=max_meter, band_types=1 << ofproto.OFPMBT_DROP,
+            capabilities=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+            max_bands=1, max_color=0)
+        return mock.Mock(msg=mock.Mock(datapath=datapath, body=[features]))
+
+    def test_install_packet_in_meters(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._datapath = datapath
+        self.open_flow_app.table_handlers = {10: mock.Mock(),
+                                             20: mock.Mock(),
+                                             30: mock.Mock()}
+        cfg.CONF.set_override('packet_in_meter_rates', {'20': '0',
+                                                        '30': '50'},
+                              group='df_ryu')
+        cfg.CONF.set_override('packet_in_meter_rate', 100, group='df_ryu')
+        self.open_flow_app._send_meter_features_request()
+        self.assertIsInstance(datapath.send_msg.call_args[0][0],
+                              parser.OFPMeterFeaturesStatsRequest)
+
+        with mock.patch.object(self.open_flow_app, '_flush') as flush:
+            self.open_flow_app.meter_features_stats_reply_handler(
+                self._meter_features_reply(datapath))
+            meter_mods, callbacks = flush.call_args[0]
+            meter_mods = {msg.meter_id: msg for msg in meter_mods}
+            self.assertEqual({11, 31}, set(meter_mods))
+            self.assertEqual({ofproto.OFPMC_MODIFY},
+                             {msg.command for msg in meter_mods.values()})
+            self.assertEqual(100, meter_mods[11].bands[0].rate)
+            self.assertEqual(50, meter_mods[31].bands[0].rate)
+            # Flows are metered once the meters are installed
+            self.assertEqual({}, self.open_flow_app._packet_in_meters)
+
+            # Meter 31 is unknown to the switch, and is added
+            error = mock.Mock(type=ofproto.OFPET_METER_MOD_FAILED,
+                              code=ofproto.OFPMMFC_UNKNOWN_METER)
+            callbacks[0]([(meter_mods[31], error)])
+            self.assertEqual({10: 11}, self.open_flow_app._packet_in_meters)
+            meter_mods, callbacks = flush.call_args[0]
+            self.assertEqual([(ofproto.OFPMC_ADD, 31)],
+                             [(msg.command, msg.meter_id)
+                              for msg in meter_mods])
+            callbacks[0]([])
+        self.assertEqual({10: 11, 30: 31},
+                         self.open_flow_app._packet_in_meters)
+
+    def test_flows_sent_before_meters_are_metered(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._datapath = datapath
+        self.open_flow_app.table_handlers = {10: mock.Mock(),
+                                             20: mock.Mock()}
+        cfg.CONF.set_override('packet_in_meter_rates', {}, group='df_ryu')
+        cfg.CONF.set_override('packet_in_meter_rate', 100, group='df_ryu')
+        self.open_flow_app._send_meter_features_request()
+
+        def flow_mod(table_id, port, priority, command=ofproto.OFPFC_ADD):
+            actions = [parser.OFPActionOutput(port)]
+            return parser.OFPFlowMod(
+                datapath, table_id=table_id, command=command,
+                priority=priority,
+                instructions=[parser.OFPInstructionActions(
+                    ofproto.OFPIT_APPLY_ACTIONS, actions)])
+
+        to_controller = flow_mod(10, ofproto.OFPP_CONTROLLER, 1)
+        removed = flow_mod(10, ofproto.OFPP_CONTROLLER, 2)
+        to_port = flow_mod(10, 1, 3)
+        other_table = flow_mod(30, ofproto.OFPP_CONTROLLER, 1)
+        for msg in (to_controller, removed, to_port, other_table,
+                    flow_mod(10, ofproto.OFPP_CONTROLLER, 2,
+                             ofproto.OFPFC_DELETE_STRICT)):
+            self.open_flow_app.send_msg(msg)
+        # Sent before the meter is confirmed
+        self.assertEqual(1, len(to_controller.instructions))
+
+        with mock.patch.object(self.open_flow_app, '_flush') as flush:
+            self.open_flow_app.meter_features_stats_reply_handler(
+                self._meter_features_reply(datapath))
+            meter_mods, callbacks = flush.call_args[0]
+            callbacks[0]([])
+            flows, _callbacks = flush.call_args[0]
+        self.assertEqual({10: 11, 20: 21},
+                         self.open_flow_app._packet_in_meters)
+        self.assertEqual(1, len(flows))
+        self.assertEqual(ofproto.OFPFC_MODIFY_STRICT, flows[0].command)
+        self.assertEqual((10, 1), (flows[0].table_id, flows[0].priority))
+        meter = flows[0].instructions[0]
+        self.assertIsInstance(meter, parser.OFPInstructionMeter)
+        self.assertEqual(11, meter.meter_id)
+        self.assertIsNone(self.open_flow_app._unmetered_flows)
+
+    def test_packet_in_meters_not_supported(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._datapath = datapath
+        self.open_flow_app.table_handlers = {10: mock.Mock()}
+        cfg.CONF.set_override('packet_in_meter_rates', {}, group='df_ryu')
+        cfg.CONF.set_override('packet_in_meter_rate', 100, group='df_ryu')
+        with mock.patch.object(self.open_flow_app, '_flush') as flush:
+            self.open_flow_app.meter_features_stats_reply_handler(
+                self._meter_features_reply(datapath, max_meter=0))
+            flush.assert_not_called()
+        self.assertEqual({}, self.open_flow_app._packet_in_meters)
+
+    def test_meter_features_not_requested_without_meters(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._datapath = datapath
+        self.open_flow_app.table_handlers = {10: mock.Mock()}
+        cfg.CONF.set_override('packet_in_meter_rates', {}, group='df_ryu')
+        cfg.CONF.set_override('packet_in_meter_rate', 0, group='df_ryu')
+        self.open_flow_app._send_meter_features_request()
+        datapath.send_msg.assert_not_called()
+
+    def test_packet_in_meter_added_to_flows(self):
+        datapath = mock.Mock(ofproto=ofproto, ofproto_parser=parser)
+        self.open_flow_app._packet_in_meters = {10: 11}
+
+        def flow_mod(table_id, port, command=ofproto.OFPFC_ADD):
+            actions = [parser.OFPActionOutput(port)]
+            return parser.OFPFlowMod(
+                datapath, table_id=table_id, command=command,
+                instructions=[parser.OFPInstructionActions(
+                    ofproto.OFPIT_APPLY_ACTIONS, actions)])
+
+        to_controller = flow_mod(10, ofproto.OFPP_CONTROLLER)
+        to_port = flow_mod(10, 1)
+        other_table = flow_mod(20, ofproto.OFPP_CONTROLLER)
+        delete = flow_mod(10, ofproto.OFPP_CONTROLLER, ofproto.OFPFC_DELETE)
+        for msg in (to_controller, to_port, other_table, delete):
+            self.open_flow_app.send_msg(msg)
+
+        meter = to_controller.instructions[0]
+        self.assertIsInstance(meter, parser.OFPInstructionMeter)
+        self.assertEqual(11, meter.meter_id)
+        self.assertEqual(2, len(to_controller.instructions))
+        for msg in (to_port, other_table, delete):
+            self.assertEqual(1, len(msg.instructions))
+
+        # A metered flow is not metered twice
+        self.open_flow_app.send_msg(to_controller)
+        self.assertEqual(2, len(to_controller.instructions))
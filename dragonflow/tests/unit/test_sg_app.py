@@ -21,6 +21,7 @@ from neutron_lib import constants as n_const
 from dragonflow.db.models import l2
 from dragonflow.db.models import secgroups
 from dragonflow.tests.unit import test_app_base
+from dragonflow.utils import address_set
 
 COMMAND_ADD = 1
 COMMAND_DELETE = 2
@@ -525,37 +526,30 @@ class TestSGApp(test_app_base.DFAppTestBase):
 
     def test_aggregating_flows_for_addresses(self):
         # add one address
-        old_cidr_set = netaddr.IPSet(['192.168.10.6'])
-        new_cidr_set, added_cidr, deleted_cidr = \
-            self.app._get_cidr_changes_after_adding_addresses(
-                old_cidr_set, ['192.168.10.7'])
-        expected_new_cidr_set = netaddr.IPSet(['192.168.10.6/31'])
+        cidr_set = address_set.AddressSet(['192.168.10.6'])
+        added_cidr, deleted_cidr = cidr_set.add(['192.168.10.7'])
+        expected_cidrs = [netaddr.IPNetwork('192.168.10.6/31')]
         expected_added_cidr = {netaddr.IPNetwork('192.168.10.6/31')}
         expected_deleted_cidr = {netaddr.IPNetwork('192.168.10.6/32')}
-        self.assertEqual(new_cidr_set, expected_new_cidr_set)
+        self.assertEqual(expected_cidrs, cidr_set.iter_cidrs())
         self.assertEqual(added_cidr, expected_added_cidr)
         self.assertEqual(deleted_cidr, expected_deleted_cidr)
 
         # remove one address
-        old_cidr_set = new_cidr_set
-        new_cidr_set, added_cidr, deleted_cidr = \
-            self.app._get_cidr_changes_after_removing_addresses(
-                old_cidr_set, ['192.168.10.7'])
-        expected_new_cidr_set = netaddr.IPSet(['192.168.10.6/32'])
+        added_cidr, deleted_cidr = cidr_set.remove(['192.168.10.7'])
+        expected_cidrs = [netaddr.IPNetwork('192.168.10.6/32')]
         expected_added_cidr = {netaddr.IPNetwork('192.168.10.6/32')}
         expected_deleted_cidr = {netaddr.IPNetwork('192.168.10.6/31')}
-        self.assertEqual(new_cidr_set, expected_new_cidr_set)
+        self.assertEqual(expected_cidrs, cidr_set.iter_cidrs())
         self.assertEqual(added_cidr, expected_added_cidr)
         self.assertEqual(deleted_cidr, expected_deleted_cidr)
 
         # update addresses
-        old_cidr_set = new_cidr_set
-        new_cidr_set, added_cidr, deleted_cidr = \
-            self.app._get_cidr_changes_after_updating_addresses(
-                old_cidr_set, ['192.168.10.7'], ['192.168.10.6'])
-        expected_new_cidr_set = netaddr.IPSet(['192.168.10.7/32'])
+        added_cidr, deleted_cidr = cidr_set.update(['192.168.10.7'],
+                                                   ['192.168.10.6'])
+        expected_cidrs = [netaddr.IPNetwork('192.168.10.7/32')]
         expected_added_cidr = {netaddr.IPNetwork('192.168.10.7/32')}
         expected_deleted_cidr = {netaddr.IPNetwork('192.168.10.6/32')}
-        self.assertEqual(new_cidr_set, expected_new_cidr_set)
+        self.assertEqual(expected_cidrs, cidr_set.iter_cidrs())
         self.assertEqual(added_cidr, expected_added_cidr)
         self.assertEqual(deleted_cidr, expected_deleted_cidr)
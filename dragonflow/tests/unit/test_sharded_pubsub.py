@@ -0,0 +1,127 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+
+from dragonflow.common import exceptions
+from dragonflow import conf as cfg
+from dragonflow.db.models import core
+from dragonflow.db import pub_sub_api
+from dragonflow.tests import base as tests_base
+from dragonflow.utils import hash_ring
+
+
+def _publisher(i):
+    return core.Publisher(
+        id='publisher{}'.format(i),
+        uri='tcp://10.0.0.{}:8866'.format(i),
+        relay_uri='tcp://10.0.0.{}:8867'.format(i),
+    )
+
+
+class TestShardedSubscriber(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestShardedSubscriber, self).setUp()
+        self.subscriber = mock.Mock()
+        self.sharded = pub_sub_api.ShardedSubscriber(self.subscriber)
+        self.uris = [_publisher(i).uri for i in range(3)]
+        self.topics = ['tenant{}'.format(i) for i in range(10)]
+        self.ring = hash_ring.HashRing(self.uris)
+
+    def _connected(self):
+        connected = set()
+        for call in self.subscriber.register_listen_address.call_args_list:
+            connected.add(call[0][0])
+        for call in self.subscriber.unregister_listen_address.call_args_list:
+            connected.discard(call[0][0])
+        return connected
+
+    def test_connect_to_owners_only(self):
+        for uri in self.uris:
+            self.sharded.register_listen_address(uri)
+        self.sharded.register_topic('tenant1')
+        self.subscriber.register_topic.assert_called_once_with('tenant1')
+        self.assertEqual({self.ring.get_node('tenant1')}, self._connected())
+
+        for topic in self.topics:
+            self.sharded.register_topic(topic)
+        owners = {self.ring.get_node(topic) for topic in self.topics}
+        self.assertEqual(owners, self._connected())
+
+    def test_rebalance_on_publisher_removal(self):
+        for uri in self.uris:
+            self.sharded.register_listen_address(uri)
+        self.sharded.register_topic('tenant1')
+        owner = self.ring.get_node('tenant1')
+
+        self.sharded.unregister_listen_address(owner)
+        self.ring.remove_node(owner)
+        new_owner = self.ring.get_node('tenant1')
+        self.assertNotEqual(owner, new_owner)
+        self.assertEqual({new_owner}, self._connected())
+
+
+class TestShardedPublisherAgent(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestShardedPublisherAgent, self).setUp()
+        self.publishers = [_publisher(i) for i in range(3)]
+        self.relays = {}
+        self.publisher = pub_sub_api.ShardedPublisherAgent(
+            self._get_relay_publisher,
+            lambda: self.publishers,
+            60,
+        )
+        self.publisher.initialize()
+
+    def _get_relay_publisher(self, uri):
+        return self.relays.setdefault(uri, mock.Mock())
+
+    def test_send_to_owner_relay(self):
+        ring = hash_ring.HashRing(p.uri for p in self.publishers)
+        relay_uris = {p.uri: p.relay_uri for p in self.publishers}
+        self.publisher._send_event(b'data', b'tenant1')
+        owner_relay_uri = relay_uris[ring.get_node('tenant1')]
+        self.assertEqual([owner_relay_uri], list(self.relays))
+        relay = self.relays[owner_relay_uri]
+        relay.initialize.assert_called_once_with()
+        relay._send_event.assert_called_once_with(b'data', b'tenant1')
+
+    def test_refresh_removes_publisher(self):
+        ring = hash_ring.HashRing(p.uri for p in self.publishers)
+        owner = ring.get_node('tenant1')
+        self.publishers = [p for p in self.publishers if p.uri != owner]
+        now = self.publisher._last_refresh + 60
+        with mock.patch('time.time', return_value=now):
+            self.publisher._send_event(b'data', b'tenant1')
+        ring.remove_node(owner)
+        new_owner = [p for p in self.publishers
+                     if p.uri == ring.get_node('tenant1')][0]
+        relay = self.relays[new_owner.relay_uri]
+        relay._send_event.assert_called_once_with(b'data', b'tenant1')
+
+
+class TestLoadRelayDriver(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestLoadRelayDriver, self).setUp()
+        self.driver = mock.Mock()
+        mock.patch('dragonflow.common.utils.load_driver',
+                   return_value=self.driver).start()
+        cfg.CONF.set_override('pub_sub_multiproc_driver',
+                              'redis_db_pubsub_driver', group='df')
+
+    def test_load_relay_driver(self):
+        self.driver.support_relay_publisher.return_value = True
+        self.assertIs(self.driver, pub_sub_api.load_relay_driver())
+
+    def test_relay_not_supported(self):
+        self.driver.support_relay_publisher.return_value = False
+        self.assertRaises(exceptions.UnsupportedPublisherSharding,
+                          pub_sub_api.load_relay_driver)
@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import time
+
+import mock
+from oslo_serialization import jsonutils
+
+from dragonflow.db import model_serializer
+from dragonflow.db import pub_sub_api
+from dragonflow.tests import base as tests_base
+
+
+class TestTableMonitor(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestTableMonitor, self).setUp()
+        self.table = {}
+        self.driver = mock.Mock()
+        self.driver.get_all_keys.side_effect = lambda table: list(self.table)
+        self.driver.batch_get_keys.side_effect = lambda requests: [
+            self.table.get(key) for _, key, _ in requests]
+        self.publisher = mock.Mock()
+        self.monitor = pub_sub_api.TableMonitor(
+            'chassis', self.driver, self.publisher, 1, 10)
+
+    def _get_events(self):
+        events = [(update.action, update.key, update.value)
+                  for (update,), _ in self.publisher.send_event.call_args_list]
+        self.publisher.send_event.reset_mock()
+        return events
+
+    def test_poll(self):
+        self.table = {'a': 'a1', 'b': 'b1'}
+        self.monitor._poll()
+        self.assertEqual([('create', 'a', 'a1'), ('create', 'b', 'b1')],
+                         sorted(self._get_events()))
+        self.assertEqual(1, self.driver.batch_get_keys.call_count)
+        self.assertNotIn('a1', self.monitor._cache.values())
+
+        self.table = {'a': 'a1', 'b': 'b2', 'c': 'c1'}
+        self.monitor._poll()
+        self.assertEqual([('create', 'c', 'c1'), ('set', 'b', 'b2')],
+                         sorted(self._get_events()))
+
+        del self.table['a']
+        self.monitor._poll()
+        self.assertEqual([('delete', 'a', None)], self._get_events())
+        self.driver.get_key.assert_not_called()
+
+    def test_watch(self):
+        self.table = {'a': 'a1'}
+        self.monitor._poll()
+        self._get_events()
+
+        self.monitor._on_change('set', 'a', 'a1')
+        self.monitor._on_change('set', 'b', 'b1')
+        self.monitor._on_change('set', 'a', 'a2')
+        self.monitor._on_change('delete', 'b', None)
+        self.monitor._on_change('delete', 'c', None)
+        self.assertEqual([('create', 'b', 'b1'), ('set', 'a', 'a2'),
+                          ('delete', 'b', None)], self._get_events())
+
+        # A poll after lost notifications only sends the missed changes
+        self.table = {'a': 'a2', 'd': 'd1'}
+        self.monitor._on_change('sync', None, None)
+        self.assertEqual([('create', 'd', 'd1')], self._get_events())
+
+    def test_stale_publishers_removed(self):
+        monitor = pub_sub_api.StalePublisherMonitor(
+            self.driver, self.publisher, 10)
+        self.table = {
+            'stale': jsonutils.dumps({
+                'id': 'stale', 'last_activity_timestamp': time.time() - 20}),
+            'active': model_serializer.dump_struct(
+                {'id': 'active', 'last_activity_timestamp': time.time()},
+                model_serializer.MSGPACK),
+        }
+        monitor._poll()
+        self.driver.delete_key.assert_called_once_with('publisher', 'stale')
+        self.assertEqual([('create', 'active', self.table['active'])],
+                         self._get_events())
@@ -39,13 +39,16 @@ def nb_api_get_all_func(*instances):
         except KeyError:
             alls[instance.__class__] = [instance]
 
-    def nb_api_get_all(inst, topic=None):
+    def nb_api_get_all(inst, topic=None, lazy=False):
         try:
-            if not topic:
-                return alls[inst]
-            return [obj for obj in alls[inst] if obj.topic == topic]
+            objs = alls[inst]
         except KeyError:
             return mock.MagicMock(name='NbApi.get_instance().get()')
+        if topic:
+            objs = [obj for obj in objs if obj.topic == topic]
+        if lazy:
+            objs = [inst.envelope_from_json(obj.to_json()) for obj in objs]
+        return objs
     return nb_api_get_all
 
 
@@ -89,13 +92,11 @@ class TestTopology(test_app_base.DFAppTestBase):
         self.controller.delete_by_id.side_effect = original_delete_by_id
         self._reset_refresher()
 
-        # Verify port online
+        # Verify port online. fake_logic_switch1 is already cached in its
+        # current version, so it is not applied again.
         self.topology.ovs_port_updated(test_app_base.fake_ovs_port1)
-        self.controller.update.assert_has_calls(
-            (mock.call(test_app_base.fake_logic_switch1),
-             mock.call(test_app_base.fake_local_port1)),
-            any_order=True,
-        )
+        self.controller.update.assert_called_once_with(
+            test_app_base.fake_local_port1)
         self.nb_api.subscriber.register_topic.assert_called_once_with(
             test_app_base.fake_local_port1.topic)
 
@@ -168,12 +169,12 @@ class TestTopology(test_app_base.DFAppTestBase):
         self.topology.ovs_port_updated(test_app_base.fake_ovs_port1)
         self.topology.ovs_port_updated(test_app_base.fake_ovs_port2)
 
-        calls = [mock.call(test_app_base.fake_logic_switch1),
-                 mock.call(test_app_base.fake_local_port1),
+        # fake_logic_switch1 is cached in its current version, and skipped
+        calls = [mock.call(test_app_base.fake_local_port1),
                  mock.call(test_app_base.fake_local_port2)]
         self.controller.update.assert_has_calls(
             calls, any_order=True)
-        self.assertEqual(3, self.controller.update.call_count)
+        self.assertEqual(2, self.controller.update.call_count)
         self.nb_api.subscriber.register_topic.assert_called_once()
 
     def test_check_topology_info(self):
@@ -215,13 +216,10 @@ class TestTopology(test_app_base.DFAppTestBase):
         self.controller.update_floatingip = mock.Mock()
         self._reset_refresher()
 
-        # Verify the db sync will work for topology
+        # Verify the db sync will work for topology. fake_logic_switch1 is
+        # cached in its current version, and skipped.
         self.controller.run_sync()
-        update_calls = [
-            mock.call(test_app_base.fake_logic_switch1),
-            mock.call(test_app_base.fake_local_port1)
-        ]
-        self.controller.update.assert_has_calls(update_calls, any_order=True)
-        self.assertEqual(2, self.controller.update.call_count)
+        self.controller.update.assert_called_once_with(
+            test_app_base.fake_local_port1)
         self.assertFalse(self.controller.update_lrouter.called)
         self.assertFalse(self.controller.update_floatingip.called)
@@ -0,0 +1,117 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import shutil
+import tempfile
+
+import mock
+from oslo_serialization import jsonutils
+
+from dragonflow.common import tracing
+from dragonflow import conf as cfg
+from dragonflow.db import api_nb
+from dragonflow.db import db_store2
+from dragonflow.db.models import l2
+from dragonflow.db import pub_sub_api
+from dragonflow.tests import base as tests_base
+
+
+class TestTracing(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestTracing, self).setUp()
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.sink_path = os.path.join(tempdir, 'trace.log')
+        cfg.CONF.set_override('trace_sink_path', self.sink_path, group='df')
+        self.addCleanup(self._close_sink)
+
+        self.api_nb = api_nb.NbApi(
+            db_driver=mock.Mock(),
+            use_pubsub=True,
+            is_neutron_server=True
+        )
+        self.api_nb.publisher = mock.Mock()
+        self.api_nb.enable_selective_topo_dist = True
+
+    @staticmethod
+    def _close_sink():
+        if tracing._sink is not None:
+            tracing._sink.close()
+        tracing._sink = None
+        tracing._sink_path = None
+
+    def _get_stages(self):
+        with open(self.sink_path) as sink:
+            return [jsonutils.loads(line)['stage'] for line in sink]
+
+    def test_trace_id_carried_in_update(self):
+        with tracing.trace(tracing.new_trace_id()) as trace_id:
+            self.api_nb._send_db_change_event('lport', 'key', 'create',
+                                              'value', 'topic')
+        self.assertIsNone(tracing.get_trace_id())
+        update, = self.api_nb.publisher.send_event.call_args[0]
+        self.assertEqual(trace_id, update.to_dict()['trace_id'])
+
+        subscriber = mock.Mock()
+        callback = mock.Mock()
+        subscriber.db_changes_callback = callback
+        with mock.patch.object(pub_sub_api, 'unpack_messages',
+                               return_value=[update.to_dict()]):
+            pub_sub_api.SubscriberAgentBase._handle_incoming_event(
+                subscriber, None)
+        callback.assert_called_once_with('lport', 'key', 'create', 'value',
+                                         'topic', trace_id=trace_id)
+
+    def test_untraced_update(self):
+        self.api_nb._send_db_change_event('lport', 'key', 'create',
+                                          'value', 'topic')
+        update, = self.api_nb.publisher.send_event.call_args[0]
+        self.assertNotIn('trace_id', update.to_dict())
+        self.assertFalse(os.path.exists(self.sink_path))
+
+    def test_stages_recorded(self):
+        self.api_nb.apply_db_change = mock.Mock()
+        with tracing.trace(tracing.new_trace_id()) as trace_id:
+            self.api_nb._send_db_change_event('lport', 'key', 'create',
+                                              'value', 'topic')
+        self.api_nb.db_change_callback('lport', 'key', 'create', 'value',
+                                       'topic', trace_id=trace_id)
+        self.api_nb._process_db_update(self.api_nb._queue.get(), mock.Mock())
+        self.assertEqual(
+            [tracing.NB_WRITE, tracing.RECEIVED, tracing.APPLIED],
+            self._get_stages())
+
+    def test_local_created_recorded(self):
+        lports = {}
+        db_store = mock.Mock()
+        db_store.get_one.side_effect = lambda lport: lports.get(lport.id)
+        mock.patch.object(db_store2, 'get_instance',
+                          return_value=db_store).start()
+
+        def apply_db_change(table, key, action, value):
+            lport = l2.LogicalPort(id=key)
+            lport.is_local = True
+            lports[key] = lport
+
+        self.api_nb.apply_db_change = mock.Mock(side_effect=apply_db_change)
+        for action in ('create', 'set'):
+            with tracing.trace(tracing.new_trace_id()) as trace_id:
+                self.api_nb.db_change_callback('lport', 'key', action,
+                                               'value', 'topic',
+                                               trace_id=trace_id)
+            self.api_nb._process_db_update(self.api_nb._queue.get(),
+                                           mock.Mock())
+        # Recorded only when the port becomes local
+        self.assertEqual(
+            [tracing.RECEIVED, tracing.APPLIED, tracing.LOCAL_CREATED,
+             tracing.RECEIVED, tracing.APPLIED],
+            self._get_stages())
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import mock
+from oslo_config import cfg
 
 from dragonflow.db import db_common
 from dragonflow.db.pubsub_drivers import zmq_pubsub_driver
@@ -78,3 +79,37 @@ class TestZMQPubSub(tests_base.BaseTestCase):
         result = self.ZMQSubscriberAgent.unregister_topic('teststring')
         self.assertNotIn(b'teststring', self.ZMQSubscriberAgent.topic_list)
         self.assertIsNone(result)
+
+    def test_publish_batch(self):
+        cfg.CONF.set_override('publisher_batch_size', 2, group='df')
+        cfg.CONF.set_override('publisher_batch_compression', 'zlib',
+                              group='df')
+        updates = [
+            db_common.DbUpdate('table', 'key1', 'create', 'value1',
+                               topic='topic1'),
+            db_common.DbUpdate('table', 'key2', 'create', 'value2',
+                               topic='topic2'),
+            db_common.DbUpdate('table', 'key3', 'set', 'value3',
+                               topic='topic1'),
+            db_common.DbUpdate('table', 'key4', 'delete', 'key4',
+                               topic='topic1'),
+        ]
+        self.ZMQPublisherAgent.send_events(updates)
+
+        socket = self.ZMQPublisherAgent.socket
+        sent = [args[0][0] for args in socket.send_multipart.call_args_list]
+        # Updates are sent in order, and only consecutive ones are batched
+        self.assertEqual([b'topic1', b'topic2', b'topic1'],
+                         [topic for topic, _data in sent])
+
+        callback = mock.Mock()
+        self.ZMQSubscriberAgent.db_changes_callback = callback
+        for _topic, data in sent:
+            self.ZMQSubscriberAgent._handle_incoming_event(data)
+        callback.assert_has_calls([
+            mock.call('table', 'key1', 'create', 'value1', 'topic1'),
+            mock.call('table', 'key2', 'create', 'value2', 'topic2'),
+            mock.call('table', 'key3', 'set', 'value3', 'topic1'),
+            mock.call('table', 'key4', 'delete', 'key4', 'topic1'),
+        ])
+        self.assertEqual(4, callback.call_count)
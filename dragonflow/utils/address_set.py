@@ -0,0 +1,130 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import netaddr
+
+
+_WIDTH_BY_VERSION = {4: 32, 6: 128}
+
+
+class AddressSet(object):
+    '''A set of host addresses, aggregated into the minimal list of CIDRs
+    (the same CIDRs as netaddr.IPSet.iter_cidrs()).
+
+    The CIDRs are the full nodes of a binary prefix trie, whose parent is not
+    full. Only these nodes are stored, as (version, prefixlen, network)
+    tuples. Adding or removing an address touches only the nodes on its path
+    in the trie, and returns the CIDRs added to and removed from the
+    aggregation, so that callers can update their flows incrementally.
+    '''
+
+    def __init__(self, addresses=()):
+        self._prefixes = set()
+        self._size = 0
+        self.add(addresses)
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, address):
+        return self._find_prefix(*self._get_key(address)) is not None
+
+    @staticmethod
+    def _get_key(address):
+        address = netaddr.IPAddress(address)
+        return address.version, int(address)
+
+    @staticmethod
+    def _to_cidr(prefix):
+        version, prefixlen, network = prefix
+        width = _WIDTH_BY_VERSION[version]
+        return netaddr.IPNetwork(
+            (network << (width - prefixlen), prefixlen), version=version)
+
+    def _find_prefix(self, version, value):
+        '''Return the stored prefix containing the address, if any'''
+        width = _WIDTH_BY_VERSION[version]
+        for prefixlen in range(width, -1, -1):
+            prefix = (version, prefixlen, value >> (width - prefixlen))
+            if prefix in self._prefixes:
+                return prefix
+
+    def _add_one(self, version, value, added, removed):
+        if self._find_prefix(version, value) is not None:
+            return
+        self._size += 1
+        prefixlen = _WIDTH_BY_VERSION[version]
+        # Merge with full siblings, up to the first non full one
+        while prefixlen > 0:
+            sibling = (version, prefixlen, value ^ 1)
+            if sibling not in self._prefixes:
+                break
+            self._prefixes.remove(sibling)
+            self._record(sibling, removed, added)
+            prefixlen -= 1
+            value >>= 1
+        prefix = (version, prefixlen, value)
+        self._prefixes.add(prefix)
+        self._record(prefix, added, removed)
+
+    def _remove_one(self, version, value, added, removed):
+        prefix = self._find_prefix(version, value)
+        if prefix is None:
+            return
+        self._size -= 1
+        self._prefixes.remove(prefix)
+        self._record(prefix, removed, added)
+        # Split the prefix into the siblings of the path to the address
+        width = _WIDTH_BY_VERSION[version]
+        for prefixlen in range(prefix[1] + 1, width + 1):
+            node = value >> (width - prefixlen)
+            sibling = (version, prefixlen, node ^ 1)
+            self._prefixes.add(sibling)
+            self._record(sibling, added, removed)
+
+    @staticmethod
+    def _record(prefix, changes, opposite_changes):
+        # A prefix both added and removed during one update is unchanged
+        if prefix in opposite_changes:
+            opposite_changes.remove(prefix)
+        else:
+            changes.add(prefix)
+
+    def update(self, addresses_to_add=(), addresses_to_remove=()):
+        '''Add and remove addresses.
+
+        Returns a tuple (added_cidrs, removed_cidrs) of the sets of
+        netaddr.IPNetwork added to and removed from the aggregation.
+        '''
+        added = set()
+        removed = set()
+        for address in addresses_to_add:
+            self._add_one(*self._get_key(address), added=added,
+                          removed=removed)
+        for address in addresses_to_remove:
+            self._remove_one(*self._get_key(address), added=added,
+                             removed=removed)
+        return ({self._to_cidr(prefix) for prefix in added},
+                {self._to_cidr(prefix) for prefix in removed})
+
+    def add(self, addresses):
+        return self.update(addresses_to_add=addresses)
+
+    def remove(self, addresses):
+        return self.update(addresses_to_remove=addresses)
+
+    def iter_cidrs(self):
+        return sorted(self._to_cidr(prefix) for prefix in self._prefixes)
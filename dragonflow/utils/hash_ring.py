@@ -0,0 +1,68 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import bisect
+import hashlib
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest(), 16)
+
+
+class HashRing(object):
+    '''A consistent hash ring, mapping keys (strings) to nodes (strings)
+
+    Each node is placed at several points (replicas) on the ring, and a key
+    belongs to the first node point that follows the key's hash. Adding or
+    removing a node only moves the keys of the ring segments it gains or
+    loses, and any two rings with the same nodes map keys identically.
+
+    >>> ring = HashRing(['tcp://10.0.0.1:8866', 'tcp://10.0.0.2:8866'])
+    >>> ring.get_node('tenant1')
+    'tcp://10.0.0.1:8866'
+    '''
+
+    def __init__(self, nodes=(), replicas=64):
+        self._replicas = replicas
+        self._nodes = set()
+        self._hashes = []
+        self._hash_to_node = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self):
+        return frozenset(self._nodes)
+
+    def add_node(self, node):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self._replicas):
+            point = _hash('{0}-{1}'.format(node, i))
+            self._hash_to_node[point] = node
+            bisect.insort(self._hashes, point)
+
+    def remove_node(self, node):
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        for i in range(self._replicas):
+            point = _hash('{0}-{1}'.format(node, i))
+            del self._hash_to_node[point]
+            del self._hashes[bisect.bisect_left(self._hashes, point)]
+
+    def get_node(self, key):
+        '''Return the node owning key, or None if the ring is empty'''
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._hash_to_node[self._hashes[index]]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the cost of maintaining the aggregated addresses of a security
+group one address at a time, with netaddr's IPSet as the SG app did before
+(union, then diff of iter_cidrs), and with dragonflow's AddressSet.
+
+Sequential addresses are added one by one, and then removed one by one,
+and each step computes the CIDRs added and removed.
+
+    python tools/address_set_benchmark.py [-n NUMBER] [--first ADDRESS]
+"""
+
+import argparse
+import time
+
+import netaddr
+
+from dragonflow.utils import address_set
+
+
+def _get_cidr_difference(cidr_set, new_cidr_set):
+    old_cidrs = set(cidr_set.iter_cidrs())
+    new_cidrs = set(new_cidr_set.iter_cidrs())
+    return new_cidrs - old_cidrs, old_cidrs - new_cidrs
+
+
+def run_ipset(addresses):
+    cidr_set = netaddr.IPSet()
+    for address in addresses:
+        new_cidr_set = cidr_set | netaddr.IPSet([address])
+        _get_cidr_difference(cidr_set, new_cidr_set)
+        cidr_set = new_cidr_set
+    added = cidr_set.iter_cidrs()
+    for address in addresses:
+        new_cidr_set = cidr_set - netaddr.IPSet([address])
+        _get_cidr_difference(cidr_set, new_cidr_set)
+        cidr_set = new_cidr_set
+    return added
+
+
+def run_address_set(addresses):
+    cidr_set = address_set.AddressSet()
+    for address in addresses:
+        cidr_set.add([address])
+    added = cidr_set.iter_cidrs()
+    for address in addresses:
+        cidr_set.remove([address])
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=10000,
+                        help='Number of addresses')
+    parser.add_argument('--first', default='10.0.0.0',
+                        help='First of the sequential addresses')
+    args = parser.parse_args()
+
+    first = netaddr.IPAddress(args.first)
+    addresses = [first + i for i in range(args.number)]
+    results = {}
+    print('%-12s %12s' % ('set', 'time (s)'))
+    for name, run in (('IPSet', run_ipset),
+                      ('AddressSet', run_address_set)):
+        start = time.time()
+        results[name] = run(addresses)
+        print('%-12s %12.2f' % (name, time.time() - start))
+    if results['IPSet'] != results['AddressSet']:
+        print('The aggregated CIDRs differ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the proactive L3 flows installed for the ports of a router
+subnet, with a flow per host, and with a flow per subnet (see the
+proactive_derived_mac_prefix option of the [df_l3_app] section).
+
+The router port and the ports are processed by L3ProactiveApp, and the flow
+mods it sends are serialized, but not sent to a switch. The time is that of
+building and serializing them.
+
+    python tools/l3_proactive_benchmark.py [-n NUMBER] [--cidr CIDR]
+"""
+
+import argparse
+import time
+
+import netaddr
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+from dragonflow import conf as cfg
+from dragonflow.controller.common import constants as const
+from dragonflow.controller import l3_proactive_app
+from dragonflow.db.models import l2
+from dragonflow.db.models import l3
+
+MAC_PREFIX = 'fa:16'
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+
+class _Api(object):
+    '''Stands for RyuDFAdapter, and counts the flow mods sent to the
+    proactive L3 lookup table
+    '''
+
+    def __init__(self):
+        self.datapath = _Datapath()
+        self.flows = 0
+        self.bytes = 0
+
+    def register_table_handler(self, table_id, handler):
+        pass
+
+    def send_msg(self, msg):
+        msg.xid = 0
+        msg.serialize()
+        if msg.table_id == const.L3_PROACTIVE_LOOKUP_TABLE:
+            self.flows += 1
+            self.bytes += len(msg.buf)
+
+
+def _make_objects(cidr, number):
+    network = netaddr.IPNetwork(cidr)
+    lswitch = l2.LogicalSwitch(id='lswitch1', unique_key=1,
+                               topic='tenant1')
+    router_port = l3.LogicalRouterPort(
+        id='router_port1', topic='tenant1', lswitch=lswitch.id,
+        mac='fa:16:3e:00:00:01',
+        network='{}/{}'.format(network[1], network.prefixlen))
+    base_mac = int(netaddr.EUI(MAC_PREFIX + ':00:00:00:00'))
+    lports = []
+    for i, ip in enumerate(network.iter_hosts()):
+        if len(lports) == number:
+            break
+        if ip == network[1]:
+            # The router port
+            continue
+        lport = l2.LogicalPort(
+            id='lport%d' % i, topic='tenant1', lswitch=lswitch.id,
+            unique_key=i + 2, ips=[ip],
+            macs=[netaddr.EUI(base_mac | int(ip))])
+        # Set by the controller for the ports it handles
+        lport.local_network_id = lswitch.unique_key
+        lports.append(lport)
+    return lswitch, router_port, lports
+
+
+def run(mac_prefix, lswitch, router_port, lports):
+    cfg.CONF.set_override('proactive_derived_mac_prefix', mac_prefix,
+                          group='df_l3_app')
+    api = _Api()
+    app = l3_proactive_app.L3ProactiveApp(api)
+    parser = api.datapath.ofproto_parser
+    start = time.time()
+    app._add_subnet_send_to_route(parser.OFPMatch(), lswitch.unique_key,
+                                  router_port)
+    for lport in lports:
+        app._add_port(lport)
+    return api.flows, api.bytes, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=10000,
+                        help='Number of ports')
+    parser.add_argument('--cidr', default='10.0.0.0/16',
+                        help='CIDR of the router subnet')
+    args = parser.parse_args()
+    cfg.CONF([], project='dragonflow')
+
+    lswitch, router_port, lports = _make_objects(args.cidr, args.number)
+    print('%d ports in %s' % (len(lports), args.cidr))
+    print('%-10s %10s %12s %10s' % ('mode', 'flows', 'bytes', 'time (s)'))
+    for name, mac_prefix in (('per-host', ''), ('subnet', MAC_PREFIX)):
+        flows, size, elapsed = run(mac_prefix, lswitch, router_port, lports)
+        print('%-10s %10d %12d %10.2f' % (name, flows, size, elapsed))
+
+
+if __name__ == '__main__':
+    main()
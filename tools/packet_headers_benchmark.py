@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the cost of reading packet-in headers with ryu's full packet
+parsing, and with dragonflow's PacketHeaders.
+
+Packets are read from the given pcap files, e.g. captured with
+'tcpdump -w dhcp.pcap -i tap... udp port 67', or else generated DHCP
+discover, ARP request and ICMP echo packets are used.
+
+    python tools/packet_headers_benchmark.py [-n NUMBER] [PCAP ...]
+"""
+
+import argparse
+import timeit
+
+from ryu.lib.packet import arp
+from ryu.lib.packet import dhcp
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import icmp
+from ryu.lib.packet import in_proto
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import packet
+from ryu.lib.packet import udp
+from ryu.lib import pcaplib
+from ryu.ofproto import ether
+
+from dragonflow.controller.common import packet_headers
+
+SRC_MAC = 'fa:16:3e:8c:2e:b3'
+BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+
+
+def _serialize(*protocols):
+    pkt = packet.Packet()
+    for protocol in protocols:
+        pkt.add_protocol(protocol)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def generate_packets():
+    options = dhcp.options(option_list=[dhcp.option(
+        dhcp.DHCP_MESSAGE_TYPE_OPT, b'\x01', 1)])
+    return {
+        'dhcp': _serialize(
+            ethernet.ethernet(dst=BROADCAST_MAC, src=SRC_MAC),
+            ipv4.ipv4(src='0.0.0.0', dst='255.255.255.255',
+                      proto=in_proto.IPPROTO_UDP),
+            udp.udp(src_port=68, dst_port=67),
+            dhcp.dhcp(op=dhcp.DHCP_BOOT_REQUEST, chaddr=SRC_MAC,
+                      options=options)),
+        'arp': _serialize(
+            ethernet.ethernet(dst=BROADCAST_MAC, src=SRC_MAC,
+                              ethertype=ether.ETH_TYPE_ARP),
+            arp.arp(opcode=arp.ARP_REQUEST, src_mac=SRC_MAC,
+                    src_ip='10.0.0.5', dst_ip='10.0.0.1')),
+        'icmp': _serialize(
+            ethernet.ethernet(dst=BROADCAST_MAC, src=SRC_MAC),
+            ipv4.ipv4(src='10.0.0.5', dst='10.0.0.1',
+                      proto=in_proto.IPPROTO_ICMP),
+            icmp.icmp(type_=icmp.ICMP_ECHO_REQUEST, data=icmp.echo())),
+    }
+
+
+def read_packets(paths):
+    packets = {}
+    for path in paths:
+        with open(path, 'rb') as pcap:
+            for i, (_, data) in enumerate(pcaplib.Reader(pcap)):
+                packets['%s#%d' % (path, i)] = bytes(data)
+    return packets
+
+
+def parse_full(data):
+    pkt = packet.Packet(data)
+    pkt_ip = pkt.get_protocol(ipv4.ipv4)
+    if pkt_ip is not None:
+        return pkt_ip.proto, pkt_ip.dst
+    pkt_arp = pkt.get_protocol(arp.arp)
+    if pkt_arp is not None:
+        return pkt_arp.opcode, pkt_arp.dst_ip
+    return None
+
+
+def parse_headers(data):
+    headers = packet_headers.PacketHeaders(data)
+    if headers.is_ipv4:
+        return headers.ip_proto, headers.ip_dst
+    if headers.is_arp:
+        return headers.arp_opcode, headers.arp_dst_ip
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=10000,
+                        help='Number of parses of each packet')
+    parser.add_argument('pcap', nargs='*', help='Captured packets')
+    args = parser.parse_args()
+
+    packets = read_packets(args.pcap) if args.pcap else generate_packets()
+    print('%-20s %12s %12s %8s' % ('packet', 'full (us)', 'headers (us)',
+                                   'speedup'))
+    for name, data in sorted(packets.items()):
+        if parse_full(data) != parse_headers(data):
+            print('%-20s headers differ from the full parse' % (name,))
+            continue
+        full = timeit.timeit(lambda: parse_full(data), number=args.number)
+        fast = timeit.timeit(lambda: parse_headers(data),
+                             number=args.number)
+        print('%-20s %12.2f %12.2f %7.1fx' % (
+            name, full * 1e6 / args.number, fast * 1e6 / args.number,
+            full / fast))
+
+
+if __name__ == '__main__':
+    main()